@@ -0,0 +1,176 @@
+import os
+import atexit
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Writes that do not have to finish before the reply is sent (flags, new
+# question bank entries) are queued here and run by a few worker threads per
+# process. A task may run more than once, so it must be idempotent; writes
+# whose order matters (chat history) stay on the request thread.
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+BACKGROUND_QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", "1000"))
+BACKGROUND_MAX_ATTEMPTS = int(os.getenv("BACKGROUND_MAX_ATTEMPTS", "3"))
+BACKGROUND_RETRY_DELAY_SECONDS = float(os.getenv("BACKGROUND_RETRY_DELAY_SECONDS", "0.5"))
+BACKGROUND_FLUSH_TIMEOUT_SECONDS = float(os.getenv("BACKGROUND_FLUSH_TIMEOUT_SECONDS", "10"))
+# Threads for the independent stages of a single request (see run_concurrently).
+REQUEST_STAGE_WORKERS = int(os.getenv("REQUEST_STAGE_WORKERS", "8"))
+
+
+def with_app_context(function):
+    """Bind function to the current Flask app, so it can use current_app on another thread.
+
+    Context variables (e.g. the request's metrics labels) are copied too.
+    """
+    if not has_app_context():
+        return function
+    app = current_app._get_current_object()
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        with app.app_context():
+            return context.copy().run(function, *args, **kwargs)
+    return run
+
+
+class BackgroundTasks:
+    """A bounded queue of fire-and-forget tasks owned by one process.
+
+    A task that raises is retried with exponential backoff, up to
+    max_attempts. When the queue is full the task runs on the caller's
+    thread instead of being dropped, so overload slows requests down rather
+    than losing writes.
+    """
+
+    def __init__(self, workers=BACKGROUND_WORKERS, queue_size=BACKGROUND_QUEUE_SIZE,
+                 max_attempts=BACKGROUND_MAX_ATTEMPTS, retry_delay=BACKGROUND_RETRY_DELAY_SECONDS):
+        self.pid = os.getpid()
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "ran_inline": 0, "retries": 0, "failed": 0}
+        for number in range(workers):
+            threading.Thread(target=self._work, name=f"background-{number}", daemon=True).start()
+
+    def submit(self, name, function, *args):
+        task = (name, with_app_context(function), args)
+        with self._lock:
+            self._stats["submitted"] += 1
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            logger.warning(f"Background queue full, running {name} inline")
+            with self._lock:
+                self._stats["ran_inline"] += 1
+            self._run(task)
+
+    def flush(self, timeout=BACKGROUND_FLUSH_TIMEOUT_SECONDS):
+        """Wait until every queued task has finished; False if timeout ran out first."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            try:
+                self._run(task)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, task):
+        name, function, args = task
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                function(*args)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Background task {name} failed after {attempt} attempts: {e}")
+                    with self._lock:
+                        self._stats["failed"] += 1
+                    return
+                logger.warning(f"Background task {name} failed (attempt {attempt}), retrying: {e}")
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+
+_background_tasks = None
+_executor_pid = None
+_executors_lock = threading.Lock()
+_process_executors = {}
+
+
+def _ensure_executors():
+    global _background_tasks, _executor_pid
+    # Threads do not survive fork(), so each gunicorn worker starts its own.
+    if _executor_pid != os.getpid():
+        with _executors_lock:
+            if _executor_pid != os.getpid():
+                _background_tasks = BackgroundTasks()
+                _executor_pid = os.getpid()
+
+
+def get_process_executor(name, workers):
+    """This process's thread pool called name, started with workers threads on first use.
+
+    A pool inherited across fork() has no threads, so each process (e.g.
+    each gunicorn worker) gets its own.
+    """
+    pid, executor = _process_executors.get(name, (None, None))
+    if pid != os.getpid():
+        with _executors_lock:
+            pid, executor = _process_executors.get(name, (None, None))
+            if pid != os.getpid():
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+                _process_executors[name] = (os.getpid(), executor)
+    return executor
+
+
+def get_background_tasks():
+    _ensure_executors()
+    return _background_tasks
+
+
+def submit_background(name, function, *args):
+    get_background_tasks().submit(name, function, *args)
+
+
+def get_background_stats():
+    return get_background_tasks().stats()
+
+
+def run_concurrently(*calls):
+    """Run (function, *args) tuples in parallel and return their results in order.
+
+    The first call runs on the caller's thread; exceptions propagate.
+    """
+    executor = get_process_executor("request-stage", REQUEST_STAGE_WORKERS)
+    futures = [executor.submit(with_app_context(function), *args) for function, *args in calls[1:]]
+    first_function, *first_args = calls[0]
+    results = [first_function(*first_args)]
+    return results + [future.result() for future in futures]
+
+
+@atexit.register
+def _flush_at_exit():
+    if _background_tasks is not None and _executor_pid == os.getpid():
+        if not _background_tasks.flush():
+            logger.warning("Background tasks still queued at exit were dropped")
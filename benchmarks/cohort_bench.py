@@ -0,0 +1,160 @@
+"""Cohort analytics: per-student queries vs one cohort query vs the cache.
+
+Usage (from the repository root, with Postgres and Redis from docker-compose):
+    python -m benchmarks.cohort_bench [--tests 100000] [--students 2000] [--grades 8]
+        [--schools 10] [--repeat 5]
+
+Creates Users, Students, TestScores and studentrollups as temporary tables,
+which shadow the real ones on this connection only and are dropped at the
+end, and fills them with --tests quiz results spread over a year. For one
+grade it then times:
+  per-student  the members lookup plus one scores_over_time query per student,
+               aggregated in Python; what a teacher's view costs today, minus
+               the HTTP round trips
+  cohort       score_summary and student_standings, one statement each
+  cached       the same through the Redis cache (a version check and a GET)
+Finally one more test is stored for a student of the grade, to show that the
+next request misses the cache and sees it.
+"""
+import argparse
+import statistics
+import time
+from config.db_config import db_connection
+from config.redis_config import get_redis_client
+from services.cohort_analytics import (Cohort, score_summary, student_standings, cached_analytics, cache_key,
+                                       cohort_version, members_query, get_cohort_cache_stats)
+from services.student_rollups import rebuild_users, record_test
+
+SCHEMA = """
+    CREATE TEMP TABLE Users (UserID INT PRIMARY KEY, first_name VARCHAR(255), last_name VARCHAR(255));
+    CREATE TEMP TABLE Students (StudentID SERIAL PRIMARY KEY, UserID INT, Grade VARCHAR(10), School VARCHAR(255));
+    CREATE INDEX ON Students (Grade, UserID);
+    CREATE INDEX ON Students (School, UserID);
+    CREATE TEMP TABLE TestScores (
+        TestID SERIAL PRIMARY KEY, UserID INT, Score INT, TotalQuestions INT, CorrectAnswers INT,
+        IncorrectAnswers INT, AreasWellDone TEXT, AreasToImprove TEXT, TestDate TIMESTAMP
+    );
+    CREATE INDEX ON TestScores (UserID, TestDate);
+    CREATE TEMP TABLE studentrollups (
+        UserID INT PRIMARY KEY, test_count INT NOT NULL DEFAULT 0, correct_total BIGINT NOT NULL DEFAULT 0,
+        incorrect_total BIGINT NOT NULL DEFAULT 0, score_total BIGINT NOT NULL DEFAULT 0, best_score INT,
+        worst_score INT, last_test_date TIMESTAMP, last_testid INT,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Each student has a skill level and improves a little over the year.
+FILL = """
+    SELECT setseed(0.42);
+    INSERT INTO Users SELECT g, 'Student', g::text FROM generate_series(1, %(students)s) g;
+    INSERT INTO Students (UserID, Grade, School)
+    SELECT g, (g %% %(grades)s + 1)::text, 'School ' || (g %% %(schools)s + 1)
+    FROM generate_series(1, %(students)s) g;
+    INSERT INTO TestScores (UserID, Score, TotalQuestions, CorrectAnswers, IncorrectAnswers, TestDate)
+    SELECT userid, correct, 10, correct, 10 - correct, testdate
+    FROM (
+        SELECT userid, testdate,
+               LEAST(10, GREATEST(0, round(3 + userid %% 5 + 2 * random()
+                                           + 2 * EXTRACT(EPOCH FROM testdate - TIMESTAMP '2025-09-01') / 31536000)))::int
+                   AS correct
+        FROM (
+            SELECT 1 + floor(random() * %(students)s)::int AS userid,
+                   TIMESTAMP '2025-09-01' + random() * INTERVAL '365 days' AS testdate
+            FROM generate_series(1, %(tests)s)
+        ) drawn
+    ) scored;
+"""
+
+
+def build_dataset(connection, args):
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEMA)
+        cursor.execute(FILL, vars(args))
+    connection.commit()
+    rebuild_users(connection, range(1, args.students + 1))
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE Users; ANALYZE Students; ANALYZE TestScores; ANALYZE studentrollups;")
+    connection.commit()
+
+
+def per_student(cursor, cohort):
+    """Score percentiles the way a client would get them from the per-user endpoints."""
+    members, params = members_query(cohort)
+    cursor.execute(members, params)
+    percents = []
+    for (userid,) in cursor.fetchall():
+        cursor.execute("SELECT testdate, score FROM testscores WHERE userid = %s ORDER BY testdate ASC", (userid,))
+        percents.extend(score * 10 for _, score in cursor.fetchall())
+    return statistics.quantiles(percents, n=10) if len(percents) > 1 else []
+
+
+def timed_runs(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started)
+    return statistics.mean(durations) * 1000, max(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tests", type=int, default=100000)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--grades", type=int, default=8)
+    parser.add_argument("--schools", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    redis_client = get_redis_client()
+    cohort = Cohort("1", None, None, None)
+    with db_connection() as connection:
+        started = time.perf_counter()
+        build_dataset(connection, args)
+        print(f"{args.tests} tests for {args.students} students built in {time.perf_counter() - started:.1f} s")
+
+        with connection.cursor() as cursor:
+            summary = score_summary(cursor, cohort)
+            print(f"grade {cohort.grade}: {summary['students']} students, {summary['tests']} tests, "
+                  f"median {summary['percentiles']['p50']}%, {len(summary['trend']['points'])} weekly points")
+
+            def cached(kind, compute):
+                return cached_analytics(cursor, redis_client, f"bench-{kind}", cohort, compute)
+
+            runs = [
+                ("per-student", lambda: per_student(cursor, cohort)),
+                ("cohort", lambda: (score_summary(cursor, cohort), student_standings(cursor, cohort))),
+                ("cached", lambda: (cached("summary", lambda c: score_summary(c, cohort)),
+                                    cached("students", lambda c: student_standings(c, cohort)))),
+            ]
+            print(f"{'method':>12} {'mean ms':>9} {'max ms':>9}")
+            for name, run in runs:
+                if name == "cached":
+                    run()
+                mean, worst = timed_runs(run, args.repeat)
+                print(f"{name:>12} {mean:>9.2f} {worst:>9.2f}")
+
+            # Student number --grades is in grade 1.
+            versions = [cohort_version(cursor, cohort)]
+            misses = get_cohort_cache_stats()["misses"]
+            cursor.execute("INSERT INTO TestScores (UserID, Score, TotalQuestions, CorrectAnswers, IncorrectAnswers, "
+                           "TestDate) VALUES (%s, 10, 10, 10, 0, TIMESTAMP '2026-08-31') RETURNING TestID",
+                           (args.grades,))
+            record_test(cursor, args.grades, cursor.fetchone()[0], "2026-08-31", 10, 10, 0)
+            after = cached("summary", lambda c: score_summary(c, cohort))
+            missed = get_cohort_cache_stats()["misses"] - misses
+            print(f"after one new test: cache {'missed' if missed else 'HIT (stale)'}, "
+                  f"{after['tests']} tests (was {summary['tests']})")
+
+            versions.append(cohort_version(cursor, cohort))
+            redis_client.delete(*[cache_key(f"bench-{kind}", cohort, version)
+                                  for kind in ("summary", "students") for version in versions])
+        connection.rollback()
+        # The pooled connection outlives this block; drop the shadowing tables.
+        with connection.cursor() as cursor:
+            cursor.execute("DISCARD TEMP")
+        connection.commit()
+
+
+if __name__ == "__main__":
+    main()
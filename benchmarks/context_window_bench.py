@@ -0,0 +1,95 @@
+"""Prompt size of full chat history vs the token-budgeted context window.
+
+Usage (from the repository root):
+    python -m benchmarks.context_window_bench [--turns 10,50,200] [--ms-per-1k-tokens 40]
+
+Replays synthetic conversations turn by turn through the same folding and
+budgeting logic as context_window.build_chat_context, with an in-memory
+history and a local stand-in for the summarising LLM, so no database, Redis
+or API key is needed. For every turn it measures the history tokens that
+would be sent and the time spent building the context, and models LLM
+prompt-processing latency as proportional to prompt tokens.
+"""
+import argparse
+import random
+import time
+from langchain_core.messages import HumanMessage, AIMessage
+from context_window import (
+    CHAT_CONTEXT_MAX_TOKENS,
+    CHAT_CONTEXT_RECENT_TURNS,
+    CHAT_SUMMARY_MAX_WORDS,
+    count_message_tokens,
+    fit_to_budget,
+    plan_summary_fold,
+    summary_message,
+)
+
+WORDS = ("arduino sensor voltage circuit resistor current breadboard led motor servo loop "
+         "variable code pin digital analog signal ground battery wire switch program test "
+         "light sound robot input output value read write serial monitor board").split()
+
+
+def synthetic_message(rng, word_count):
+    return " ".join(rng.choice(WORDS) for _ in range(word_count)).capitalize() + "."
+
+
+def synthetic_conversation(turns, seed=7):
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(turns):
+        messages.append(HumanMessage(content=synthetic_message(rng, rng.randint(8, 30))))
+        messages.append(AIMessage(content=synthetic_message(rng, rng.randint(60, 180))))
+    return messages
+
+
+def fake_summarize(summary, messages):
+    words = ((summary or "") + " " + " ".join(message.content for message in messages)).split()
+    return " ".join(words[-CHAT_SUMMARY_MAX_WORDS:])
+
+
+def replay(messages, max_tokens, recent_turns):
+    summary, summary_upto = None, 0
+    full_tokens = windowed_tokens = summarizer_calls = 0
+    build_seconds = 0.0
+    for turn_end in range(0, len(messages), 2):
+        history = messages[:turn_end]
+        full_tokens += count_message_tokens(history)
+
+        started = time.perf_counter()
+        fold = plan_summary_fold(summary_upto, len(history), recent_turns)
+        if fold:
+            summary = fake_summarize(summary, history[fold[0]:fold[1]])
+            summary_upto = fold[1]
+            summarizer_calls += 1
+        window = history[max(summary_upto, len(history) - 4 * recent_turns):]
+        context = [summary_message(summary)] if summary else []
+        context += fit_to_budget(window, max_tokens, count_message_tokens(context))
+        build_seconds += time.perf_counter() - started
+        windowed_tokens += count_message_tokens(context)
+    return full_tokens, windowed_tokens, summarizer_calls, build_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", default="10,50,200", help="comma-separated conversation lengths")
+    parser.add_argument("--max-tokens", type=int, default=CHAT_CONTEXT_MAX_TOKENS)
+    parser.add_argument("--recent-turns", type=int, default=CHAT_CONTEXT_RECENT_TURNS)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=40.0,
+                        help="modelled LLM prompt-processing cost")
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'full tok/turn':>14} {'window tok/turn':>16} {'reduction':>10} "
+          f"{'full ms':>8} {'window ms':>10} {'summaries':>10} {'build ms/turn':>14}")
+    for turns in (int(value) for value in args.turns.split(",")):
+        messages = synthetic_conversation(turns)
+        full, windowed, calls, build_seconds = replay(messages, args.max_tokens, args.recent_turns)
+        full_avg, windowed_avg = full / turns, windowed / turns
+        reduction = 1 - windowed / full if full else 0.0
+        print(f"{turns:>6} {full_avg:>14.0f} {windowed_avg:>16.0f} {reduction:>9.0%} "
+              f"{full_avg * args.ms_per_1k_tokens / 1000:>8.1f} "
+              f"{windowed_avg * args.ms_per_1k_tokens / 1000:>10.1f} "
+              f"{calls:>10} {build_seconds * 1000 / turns:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
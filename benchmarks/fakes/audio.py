@@ -0,0 +1,15 @@
+import io
+import wave
+
+SAMPLE_RATE = 16000
+
+
+def silent_wav(seconds, sample_rate=SAMPLE_RATE):
+    """Silent 16-bit mono WAV audio lasting the given number of seconds."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\0\0" * int(sample_rate * seconds))
+    return buffer.getvalue()
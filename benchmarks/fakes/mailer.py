@@ -0,0 +1,25 @@
+"""A no-op SendGrid client, so load tests never send email.
+
+install() replaces SendGridAPIClient.send; emails/send_email_config.py
+builds its client per call, so this can run before or after main is imported.
+"""
+from collections import deque
+from sendgrid import SendGridAPIClient
+
+# The most recent messages, for inspection after a run.
+sent_messages = deque(maxlen=100)
+
+
+class FakeResponse:
+    status_code = 202
+    body = b""
+    headers = {}
+
+
+def fake_send(self, message):
+    sent_messages.append(message)
+    return FakeResponse()
+
+
+def install():
+    SendGridAPIClient.send = fake_send
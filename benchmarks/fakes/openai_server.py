@@ -0,0 +1,272 @@
+"""A local stand-in for the OpenAI API with configurable latency.
+
+Usage (from the repository root):
+    python -m benchmarks.fakes.openai_server [--port 8555] [--latency-ms 800]
+        [--jitter-ms 200] [--slow-share 0.05] [--slow-ms 8000]
+
+Then point the app or a benchmark at it with
+OPENAI_BASE_URL=http://127.0.0.1:8555/v1 (read by the openai client that
+ChatOpenAI, OpenAIEmbeddings and the whisper client use). Serves
+/v1/chat/completions (plain and streamed), /v1/embeddings and
+/v1/audio/transcriptions. Chat replies match what each of the app's prompts
+expects; embeddings are deterministic per text. A --slow-share of requests takes
+--slow-ms instead of the usual latency, to reproduce a long upstream tail.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 1536
+STREAM_CHUNK_CHARS = 12
+STREAM_CHUNK_DELAY_SECONDS = 0.01
+
+
+class FakeLatency:
+    def __init__(self, latency_ms=800, jitter_ms=200, slow_share=0.0, slow_ms=8000, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_share = slow_share
+        self.slow_ms = slow_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Seconds to wait before answering one request."""
+        with self._lock:
+            if self._random.random() < self.slow_share:
+                return self.slow_ms / 1000
+            return max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+
+def count_tokens(text):
+    # Close enough to real tokenization for usage accounting in benchmarks.
+    return max(1, len(text) // 4)
+
+
+SAMPLE_QUESTIONS = [
+    "What is a resistor?",
+    "How do I make an LED blink?",
+    "What is Ohm's law?",
+    "How does a breadboard work?",
+    "What is the difference between analog and digital signals?",
+    "How do I control a servo motor?",
+]
+
+
+def message_text(message):
+    content = message.get("content", "")
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def chat_reply(messages, response_format=None):
+    """The assistant message content for a chat request.
+
+    Recognizes the app's prompts (quiz generation, answer grading one at a
+    time or in a batch, quiz feedback, history summaries) and answers each
+    in the format its caller parses; anything else gets the chat JSON envelope.
+    """
+    text = "\n".join(message_text(message) for message in messages)
+    question = next((message_text(message) for message in reversed(messages) if message.get("role") == "user"), "")
+    if "Generate 10 quiz questions" in text:
+        rng = random.Random(text)
+        pairs = [(rng.randint(2, 50), rng.randint(2, 50)) for _ in range(10)]
+        return json.dumps([{"question": f"What is {a} + {b}?", "answer": str(a + b)} for a, b in pairs])
+    if "Grade each of the numbered quiz answers" in text:
+        graded = re.findall(r"Answer (\d+):\nQuestion: .*\nStudent's Answer: (.*)\nCorrect Answer: (.*)", text)
+        return json.dumps({"grades": [
+            {"number": int(number), "correct": student.strip().lower() == correct.strip().lower()}
+            for number, student, correct in graded
+        ]})
+    if "Is the student's answer correct?" in text:
+        student = re.search(r"Student's Answer: (.*)", text)
+        correct = re.search(r"Correct Answer: (.*)", text)
+        same = student and correct and student.group(1).strip().lower() == correct.group(1).strip().lower()
+        return "True" if same else "False"
+    if (response_format or {}).get("type") == "json_object" and "areas well done" in text:
+        return json.dumps({"areas_well_done": ["Addition facts"], "areas_to_improve": ["Carrying digits"]})
+    if "running summary" in text:
+        return "The student asked about basic electronics and got short explanations."
+    return json.dumps({
+        "is_unsafe_for_k_12_children": False,
+        "response": f"Here is a short answer about: {question[:200]}",
+    })
+
+
+def fake_embedding(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        self.server.count_request(self.path)
+        handlers = {
+            "/v1/chat/completions": self.chat_completions,
+            "/v1/embeddings": self.embeddings,
+            "/v1/audio/transcriptions": self.transcriptions,
+        }
+        handler = handlers.get(self.path.split("?", 1)[0])
+        if handler is None:
+            self.send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+            return
+        handler(body)
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def chat_completions(self, body):
+        request = json.loads(body)
+        messages = request.get("messages", [])
+        content = chat_reply(messages, request.get("response_format"))
+        prompt_tokens = sum(count_tokens(str(message.get("content", ""))) for message in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": count_tokens(content),
+            "total_tokens": prompt_tokens + count_tokens(content),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model") or "fake-model"
+        time.sleep(self.server.latency.sample())
+
+        if not request.get("stream"):
+            self.send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None, **extra):
+            return dict({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }, **extra)
+
+        self.send_event(chunk({"role": "assistant", "content": ""}))
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            time.sleep(STREAM_CHUNK_DELAY_SECONDS)
+            self.send_event(chunk({"content": content[start:start + STREAM_CHUNK_CHARS]}))
+        self.send_event(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self.send_event(dict(chunk({}), choices=[], usage=usage))
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def send_event(self, payload):
+        self.send_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def embeddings(self, body):
+        request = json.loads(body)
+        texts = request["input"]
+        if isinstance(texts, str):
+            texts = [texts]
+        time.sleep(self.server.latency.sample() / 10)
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(text if isinstance(text, str) else json.dumps(text))
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(count_tokens(str(text)) for text in texts)
+        self.send_json({
+            "object": "list",
+            "data": data,
+            "model": request.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+    def transcriptions(self, body):
+        # The uploaded audio only picks which sample question was "heard".
+        time.sleep(self.server.latency.sample() / 2)
+        digest = hashlib.sha256(body).digest()
+        self.send_json({"text": SAMPLE_QUESTIONS[digest[0] % len(SAMPLE_QUESTIONS)]})
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency = latency
+        self.request_counts = {}
+        self._lock = threading.Lock()
+
+    def count_request(self, path):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_fake_openai(port=0, latency=None):
+    """Serve on a background thread; returns the server (see .base_url)."""
+    server = FakeOpenAIServer(("127.0.0.1", port), latency or FakeLatency())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8555)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--slow-share", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=8000)
+    args = parser.parse_args()
+
+    latency = FakeLatency(args.latency_ms, args.jitter_ms, args.slow_share, args.slow_ms)
+    server = FakeOpenAIServer(("127.0.0.1", args.port), latency)
+    print(f"Fake OpenAI API on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
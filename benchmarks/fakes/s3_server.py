@@ -0,0 +1,103 @@
+"""An in-memory stand-in for the S3 object API used by cms.py.
+
+Usage (from the repository root):
+    python -m benchmarks.fakes.s3_server [--port 8556]
+
+Supports PUT, GET, HEAD and DELETE of objects with path-style addressing
+(http://host:port/<bucket>/<key>); point a boto3 client at it with
+endpoint_url and Config(s3={"addressing_style": "path"}).
+Any credentials are accepted.
+"""
+import argparse
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+NOT_FOUND = (b'<?xml version="1.0" encoding="UTF-8"?>'
+             b"<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>")
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def object_key(self):
+        return unquote(urlsplit(self.path).path).lstrip("/")
+
+    def send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self.server.put(self.object_key(), body, self.headers.get("Content-Type", "binary/octet-stream"), etag)
+        self.send(200, headers={"ETag": etag})
+
+    def do_GET(self):
+        stored = self.server.get(self.object_key())
+        if stored is None:
+            self.send(404, NOT_FOUND, {"Content-Type": "application/xml"})
+            return
+        body, content_type, etag = stored
+        self.send(200, body, {"Content-Type": content_type, "ETag": etag})
+
+    do_HEAD = do_GET
+
+    def do_DELETE(self):
+        self.server.delete(self.object_key())
+        self.send(204)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, FakeS3Handler)
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, body, content_type, etag):
+        with self._lock:
+            self._objects[key] = (body, content_type, etag)
+
+    def get(self, key):
+        with self._lock:
+            return self._objects.get(key)
+
+    def delete(self, key):
+        with self._lock:
+            self._objects.pop(key, None)
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_s3(port=0):
+    """Serve on a background thread; returns the server (see .endpoint_url)."""
+    server = FakeS3Server(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8556)
+    args = parser.parse_args()
+    server = FakeS3Server(("127.0.0.1", args.port))
+    print(f"Fake S3 on {server.endpoint_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""A stand-in for the Azure speech synthesizer that main.py builds at import.
+
+install() replaces azure.cognitiveservices.speech.SpeechSynthesizer, so it
+must run before main is imported. Synthesis sleeps for a latency that grows
+with the text and returns silent 16 kHz mono WAV audio of a plausible length.
+"""
+import os
+import threading
+import time
+import azure.cognitiveservices.speech as speechsdk
+from benchmarks.fakes.audio import silent_wav
+
+FAKE_SPEECH_BASE_MS = float(os.getenv("FAKE_SPEECH_BASE_MS", "150"))
+FAKE_SPEECH_MS_PER_CHAR = float(os.getenv("FAKE_SPEECH_MS_PER_CHAR", "1"))
+SPOKEN_CHARS_PER_SECOND = 15
+
+
+class FakeSynthesisResult:
+    def __init__(self, audio_data):
+        self.audio_data = audio_data
+        self.reason = speechsdk.ResultReason.SynthesizingAudioCompleted
+        self.cancellation_details = None
+
+
+class FakeFuture:
+    def __init__(self, text):
+        self._text = text
+        self._result = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._result is None:
+                time.sleep((FAKE_SPEECH_BASE_MS + FAKE_SPEECH_MS_PER_CHAR * len(self._text)) / 1000)
+                self._result = FakeSynthesisResult(silent_wav(len(self._text) / SPOKEN_CHARS_PER_SECOND))
+            return self._result
+
+
+class FakeSpeechSynthesizer:
+    def __init__(self, speech_config=None, audio_config=None):
+        pass
+
+    def speak_text_async(self, text):
+        return FakeFuture(text)
+
+
+def install():
+    speechsdk.SpeechSynthesizer = FakeSpeechSynthesizer
+    # The real AudioOutputConfig opens the output file; nothing is written here.
+    speechsdk.audio.AudioOutputConfig = lambda *args, **kwargs: None
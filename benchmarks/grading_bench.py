@@ -0,0 +1,85 @@
+"""Quiz completion latency with sequential, parallel, batch and incremental grading.
+
+Usage (from the repository root, with Redis from docker-compose; no API key needed):
+    python -m benchmarks.grading_bench [--quizzes 5] [--latency-ms 800] [--jitter-ms 200]
+        [--concurrency 4] [--think-ms 2000]
+
+Starts the fake OpenAI server (benchmarks/fakes/openai_server.py) and times
+services.quiz.calculate_score_and_feedback, the work done when a student
+answers the last question, for ten answers per quiz. Reports completion
+latency and the upstream chat calls per quiz for each grading mode. In the
+incremental mode the first nine answers arrive --think-ms apart and are
+graded in the background, as handle_quiz_answer does; only the final step
+is timed.
+"""
+import argparse
+import random
+import statistics
+import time
+from langchain_openai import ChatOpenAI
+from llm_gateway import LLMGateway
+from services import grading
+from services.quiz import calculate_score_and_feedback
+from config.redis_config import get_redis_client
+from benchmarks.fakes.openai_server import FakeLatency, start_fake_openai
+
+
+def make_answers(rng, count=10, correct_share=0.7):
+    answers = []
+    for _ in range(count):
+        a, b = rng.randint(2, 50), rng.randint(2, 50)
+        correct = str(a + b)
+        answers.append({
+            "question": f"What is {a} + {b}?",
+            "student_answer": correct if rng.random() < correct_share else "I don't know",
+            "correct_answer": correct,
+        })
+    return answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quizzes", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, default=grading.QUIZ_GRADING_CONCURRENCY)
+    parser.add_argument("--think-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    grading.QUIZ_GRADING_CONCURRENCY = args.concurrency
+    server = start_fake_openai(latency=FakeLatency(args.latency_ms, args.jitter_ms, seed=5))
+    llm = LLMGateway(ChatOpenAI(base_url=server.base_url, api_key="fake", model="fake-model", max_retries=0))
+
+    print(f"{args.quizzes} quizzes of 10 answers, LLM latency {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, "
+          f"concurrency {args.concurrency}")
+    print(f"{'mode':>12} {'mean s':>8} {'max s':>8} {'calls/quiz':>11} {'score agrees':>13}")
+    redis_client = get_redis_client()
+    for mode in grading.GRADING_MODES[::-1] + ("incremental",):
+        rng = random.Random(3)
+        durations = []
+        agree = 0
+        calls_before = server.request_counts.get("/v1/chat/completions", 0)
+        for number in range(args.quizzes):
+            answers = make_answers(rng)
+            grades = None
+            if mode == "incremental":
+                quiz_id = f"grading-bench-{number}"
+                for index, item in enumerate(answers[:-1]):
+                    grading.grade_in_background(redis_client, quiz_id, index, item, llm)
+                    time.sleep(args.think_ms / 1000)
+            started = time.perf_counter()
+            if mode == "incremental":
+                grades = grading.load_grades(redis_client, quiz_id, len(answers))
+                grading.clear_grades(redis_client, quiz_id)
+            score, *_ = calculate_score_and_feedback(answers, llm, grading_mode=None if mode == "incremental" else mode,
+                                                     grades=grades)
+            durations.append(time.perf_counter() - started)
+            agree += score == sum(item["student_answer"] == item["correct_answer"] for item in answers)
+        calls = server.request_counts.get("/v1/chat/completions", 0) - calls_before
+        print(f"{mode:>12} {statistics.mean(durations):>8.2f} {max(durations):>8.2f} "
+              f"{calls / args.quizzes:>11.1f} {agree:>10}/{args.quizzes}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Latency and hit quality of lexical, vector and hybrid retrieval.
+
+Usage (from the repository root, after create_pdf_vector_store/split-pdf.py;
+needs OPENAI_API_KEY for the vector and fused paths):
+    python -m benchmarks.hybrid_retrieval_bench [--k 3]
+
+Runs a fixed set of questions about the Physical Computing PDF through the
+BM25 index alone, the vector store alone (uncached embedding call included)
+and the hybrid retriever. A question counts as a hit when its expected
+keyword appears in the top chunk (hit@1) or any of the top k chunks (hit@k).
+"""
+import argparse
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv, find_dotenv
+from langchain_openai import OpenAIEmbeddings
+from lexical_index import BM25Index
+from retrieval import (
+    ChromaRetriever,
+    HybridRetriever,
+    LEXICAL_PATH,
+    LEXICAL_INDEX_FILE,
+    is_lexical_fast_path,
+)
+
+load_dotenv(find_dotenv())
+
+# (question, keyword expected in a relevant chunk)
+QUESTIONS = [
+    ("What is an Arduino?", "arduino"),
+    ("What does a resistor do in a circuit?", "resistor"),
+    ("How do I use a breadboard?", "breadboard"),
+    ("How do I make an LED blink?", "led"),
+    ("What is Ohm's law?", "ohm"),
+    ("What is the difference between analog and digital signals?", "analog"),
+    ("How does pulse width modulation work?", "pwm"),
+    ("How do I control a servo motor?", "servo"),
+    ("What is a potentiometer?", "potentiometer"),
+    ("How do I read a button press?", "button"),
+    ("What is a sensor?", "sensor"),
+    ("What does the setup function do?", "setup"),
+    ("What is the loop function for?", "loop"),
+    ("How do I print values to the serial monitor?", "serial"),
+    ("What is voltage?", "voltage"),
+    ("What is electrical current?", "current"),
+    ("How do I connect a photoresistor?", "photo"),
+    ("What is a variable in programming?", "variable"),
+    ("What is ground in a circuit?", "ground"),
+    ("How do I use a piezo buzzer to make sound?", "piezo"),
+]
+
+
+def evaluate(name, search, k):
+    latencies, hits_at_1, hits_at_k = [], 0, 0
+    for question, keyword in QUESTIONS:
+        started = time.perf_counter()
+        matches = search(question, k)
+        latencies.append(time.perf_counter() - started)
+        contents = [match.content.lower() for match in matches]
+        hits_at_1 += bool(contents) and keyword in contents[0]
+        hits_at_k += any(keyword in content for content in contents)
+    count = len(QUESTIONS)
+    print(f"{name:>10} {np.mean(latencies) * 1000:>9.1f} {np.percentile(latencies, 95) * 1000:>9.1f} "
+          f"{hits_at_1 / count:>7.0%} {hits_at_k / count:>7.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    lexical_index = BM25Index.load(os.path.join(LEXICAL_PATH, LEXICAL_INDEX_FILE))
+    vector = ChromaRetriever(OpenAIEmbeddings(model="text-embedding-3-small"))
+    hybrid = HybridRetriever(vector, lexical_index)
+
+    fast_path = sum(is_lexical_fast_path(hybrid.search_lexical(question, 10)) for question, _ in QUESTIONS)
+    print(f"{len(QUESTIONS)} questions, k={args.k}, lexical fast path taken for {fast_path}")
+    print(f"{'mode':>10} {'mean ms':>9} {'p95 ms':>9} {'hit@1':>7} {'hit@k':>7}")
+    evaluate("lexical", hybrid.search_lexical, args.k)
+    evaluate("vector", lambda question, k: vector.search(question, k=k), args.k)
+    evaluate("hybrid", lambda question, k: hybrid.search(question, k=k), args.k)
+
+
+if __name__ == "__main__":
+    main()
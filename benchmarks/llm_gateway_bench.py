@@ -0,0 +1,100 @@
+"""Tail latency and upstream load with and without the LLM gateway.
+
+Usage (from the repository root; no API key needed):
+    python -m benchmarks.llm_gateway_bench [--requests 300] [--concurrency 16]
+        [--duplicate-share 0.3] [--slow-share 0.05] [--deadline 5]
+
+Starts the fake OpenAI server (benchmarks/fakes/openai_server.py) with a slow
+tail and sends the same workload through ChatOpenAI directly, through the
+gateway, and through the gateway with hedging. A share of the requests repeat
+a few hot questions at the same time, which single-flight coalesces.
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from llm_gateway import LLMGateway
+from benchmarks.fakes.openai_server import FakeLatency, start_fake_openai
+
+HOT_QUESTIONS = [
+    "What is a resistor?",
+    "How do I make an LED blink?",
+    "What is Ohm's law?",
+    "What does a breadboard do?",
+    "How does a servo work?",
+]
+
+
+def make_workload(count, duplicate_share, seed=7):
+    rng = random.Random(seed)
+    return [
+        rng.choice(HOT_QUESTIONS) if rng.random() < duplicate_share else f"Question number {i}: what is {i} + {i}?"
+        for i in range(count)
+    ]
+
+
+def run(model, workload, concurrency):
+    def call(question):
+        started = time.perf_counter()
+        try:
+            model.invoke([HumanMessage(content=question)])
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, workload))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duplicate-share", type=float, default=0.3)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=60)
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=4000)
+    parser.add_argument("--deadline", type=float, default=5)
+    parser.add_argument("--hedge-min-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    latency = FakeLatency(args.latency_ms, args.jitter_ms, args.slow_share, args.slow_ms, seed=11)
+    server = start_fake_openai(latency=latency)
+    model = ChatOpenAI(base_url=server.base_url, api_key="fake", model="fake-model", max_retries=0)
+    workload = make_workload(args.requests, args.duplicate_share)
+
+    hedged = LLMGateway(model, deadline=args.deadline, hedging=True, hedge_min_delay=args.hedge_min_ms / 1000)
+    # Hedging needs a latency history before it knows what "slow" is.
+    run(hedged, make_workload(50, 0.0, seed=3), args.concurrency)
+    warmup_stats = hedged.stats.snapshot()
+
+    modes = [
+        ("direct", model),
+        ("gateway", LLMGateway(model, deadline=args.deadline)),
+        ("gateway+hedge", hedged),
+    ]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.duplicate_share:.0%} duplicates, "
+          f"{args.slow_share:.0%} slow ({args.slow_ms:.0f} ms), deadline {args.deadline:g}s")
+    print(f"{'mode':>14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'upstream':>9} {'errors':>7} "
+          f"{'coalesced':>10} {'hedged':>7} {'hedge wins':>11}")
+    for name, runnable in modes:
+        upstream_before = server.request_counts.get("/v1/chat/completions", 0)
+        results = run(runnable, workload, args.concurrency)
+        upstream = server.request_counts.get("/v1/chat/completions", 0) - upstream_before
+        latencies = np.array([seconds for seconds, _ in results]) * 1000
+        errors = sum(error is not None for _, error in results)
+        stats = runnable.stats.snapshot() if isinstance(runnable, LLMGateway) else {}
+        if runnable is hedged:
+            stats = {key: stats[key] - warmup_stats[key] for key in ("coalesced", "hedged", "hedge_wins")}
+        print(f"{name:>14} {np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 95):>8.0f} "
+              f"{np.percentile(latencies, 99):>8.0f} {upstream:>9} {errors:>7} "
+              f"{stats.get('coalesced', '-'):>10} {stats.get('hedged', '-'):>7} {stats.get('hedge_wins', '-'):>11}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
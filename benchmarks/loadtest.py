@@ -0,0 +1,227 @@
+"""Drive a running server with a realistic request mix and report latency per endpoint.
+
+Usage (from the repository root, against benchmarks.loadtest_app or any
+deployment you are allowed to load):
+    python -m benchmarks.loadtest [--base-url http://127.0.0.1:8000]
+        [--duration 60] [--users 16] [--mix chat_text=50,chat_stream=10,fullvoice=10,analytics=30]
+        [--quiz-flows 3]
+
+The mixed phase runs --users virtual users for --duration seconds. Each one
+keeps a chat going for a few turns before starting a new one. Quiz flows
+(/quiz followed by ten answers) run afterwards, one at a time, because every
+request currently acts as the same hard-coded quiz user and a quiz in
+progress turns all chat messages into quiz answers. Reports requests/sec and
+p50/p95/p99 latency per endpoint; a non-2xx status or a connection error
+counts as an error.
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+import requests
+from benchmarks.fakes.audio import silent_wav
+
+QUESTIONS = [
+    "What is a resistor?",
+    "How do I make an LED blink with an Arduino?",
+    "What is Ohm's law?",
+    "How does a breadboard work?",
+    "What does a potentiometer do?",
+    "How do I read a button press?",
+    "What is the difference between analog and digital signals?",
+    "How do I control a servo motor?",
+    "What is pulse width modulation?",
+    "Why do LEDs need a resistor?",
+]
+ANALYTICS_PATHS = [
+    "/users/{user_id}/testscores",
+    "/users/{user_id}/correct_incorrect_totals",
+    "/users/{user_id}/performance_per_test",
+    "/users/{user_id}/correct_incorrect_over_time",
+    "/users/{user_id}/number_of_tests",
+    "/users/{user_id}/scores_over_time",
+    "/users/{user_id}/dashboard",
+    "/users/{user_id}/summary",
+    "/cohorts/summary?grade=5",
+]
+QUIZ_USER_ID = 12345
+TURNS_PER_CHAT = 5
+QUIZ_QUESTION = re.compile(r"What is (\d+) \+ (\d+)\?")
+REQUEST_TIMEOUT_SECONDS = 130
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, label, seconds, ok):
+        with self._lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+    def report(self, title, elapsed):
+        print(f"\n{title} ({elapsed:.1f}s)")
+        print(f"{'endpoint':<44} {'count':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        total = 0
+        for label in sorted(self.latencies):
+            latencies = np.array(self.latencies[label]) * 1000
+            total += len(latencies)
+            print(f"{label:<44} {len(latencies):>6} {len(latencies) / elapsed:>7.2f} "
+                  f"{np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 95):>8.0f} "
+                  f"{np.percentile(latencies, 99):>8.0f} {self.errors[label]:>7}")
+        print(f"{'total':<44} {total:>6} {total / elapsed:>7.2f}")
+
+
+class VirtualUser:
+    def __init__(self, number, base_url, recorder, rng):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.rng = rng
+        self.email = f"loadtest-{number}@example.com"
+        self.session = requests.Session()
+        self.chat_id = None
+        self.turns = 0
+        self.audio = silent_wav(2)
+
+    def request(self, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=REQUEST_TIMEOUT_SECONDS, **kwargs)
+            ok = response.ok
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(label, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    def next_chat_id(self):
+        if self.turns >= TURNS_PER_CHAT:
+            self.chat_id, self.turns = None, 0
+        self.turns += 1
+        return self.chat_id
+
+    def remember_chat(self, response):
+        if response is not None and self.chat_id is None:
+            self.chat_id = response.json().get("chat_id")
+
+    def chat_text(self):
+        payload = {"userMessage": self.rng.choice(QUESTIONS), "userEmail": self.email, "chat_id": self.next_chat_id()}
+        self.remember_chat(self.request("POST /chat/text", "POST", "/chat/text", json=payload))
+
+    def chat_stream(self):
+        payload = {"userMessage": self.rng.choice(QUESTIONS), "userEmail": self.email, "chat_id": self.next_chat_id()}
+        started = time.perf_counter()
+        first_token = None
+        ok = False
+        try:
+            with self.session.post(self.base_url + "/chat/text/stream", json=payload, stream=True,
+                                   timeout=REQUEST_TIMEOUT_SECONDS) as response:
+                ok = response.ok
+                for line in response.iter_lines(decode_unicode=True):
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - started
+                    if line.startswith("data:") and self.chat_id is None and '"chat_id"' in line:
+                        self.chat_id = int(re.search(r'"chat_id": (\d+)', line).group(1))
+        except requests.RequestException:
+            ok = False
+        self.recorder.record("POST /chat/text/stream", time.perf_counter() - started, ok)
+        if first_token is not None:
+            self.recorder.record("POST /chat/text/stream (first token)", first_token, True)
+
+    def fullvoice(self):
+        data = {"userEmail": self.email}
+        chat_id = self.next_chat_id()
+        if chat_id:
+            data["chat_id"] = chat_id
+        files = {"file": ("audio.wav", self.audio, "audio/wav")}
+        self.remember_chat(self.request("POST /chat/fullvoice", "POST", "/chat/fullvoice", data=data, files=files))
+
+    def analytics(self):
+        if self.rng.random() < 0.2:
+            self.request("GET /chat/history", "GET", "/chat/history", params={"userEmail": self.email})
+            return
+        path = self.rng.choice(ANALYTICS_PATHS)
+        self.request(f"GET {path.replace('{user_id}', '<userid>')}", "GET", path.format(user_id=QUIZ_USER_ID))
+
+    def quiz_flow(self, correct_share=0.7):
+        response = self.request("POST /chat/text (quiz start)", "POST", "/chat/text",
+                                json={"userMessage": "/quiz", "userEmail": self.email})
+        for number in range(10):
+            if response is None:
+                return
+            reply = response.json().get("reply", "")
+            match = QUIZ_QUESTION.search(reply)
+            answer = int(match.group(1)) + int(match.group(2)) if match else 0
+            # Wrong answers differ from one question to the next; the same
+            # answer twice in quick succession counts as a double submission.
+            if self.rng.random() > correct_share:
+                answer += self.rng.randint(1, 9)
+            answer = str(answer)
+            label = "POST /chat/text (quiz finish)" if number == 9 else "POST /chat/text (quiz answer)"
+            response = self.request(label, "POST", "/chat/text",
+                                    json={"userMessage": answer, "userEmail": self.email})
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def run_mixed_phase(args, mix, recorder):
+    deadline = time.monotonic() + args.duration
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+
+    def loop(number):
+        rng = random.Random(args.seed + number)
+        user = VirtualUser(number, args.base_url, recorder, rng)
+        while time.monotonic() < deadline:
+            getattr(user, rng.choices(scenarios, weights)[0])()
+
+    threads = [threading.Thread(target=loop, args=(number,)) for number in range(args.users)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--mix", default="chat_text=50,chat_stream=10,fullvoice=10,analytics=30")
+    parser.add_argument("--quiz-flows", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    unknown = [name for name in mix if name not in ("chat_text", "chat_stream", "fullvoice", "analytics")]
+    if unknown:
+        parser.error(f"Unknown scenarios in --mix: {', '.join(unknown)}")
+
+    recorder = Recorder()
+    elapsed = run_mixed_phase(args, mix, recorder)
+    recorder.report(f"Mixed phase: {args.users} users, mix {args.mix}", elapsed)
+
+    if args.quiz_flows:
+        recorder = Recorder()
+        user = VirtualUser(0, args.base_url, recorder, random.Random(args.seed))
+        started = time.monotonic()
+        for _ in range(args.quiz_flows):
+            user.quiz_flow()
+        recorder.report(f"Quiz phase: {args.quiz_flows} sequential flows", time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""main:app wired to local stand-ins for every paid or external service.
+
+Usage (from the repository root, with Postgres and Redis from docker-compose
+and migrations applied):
+    gunicorn -w 3 --threads 4 -b 127.0.0.1:8000 benchmarks.loadtest_app:app
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000
+
+OpenAI (chat, embeddings, whisper) and S3 are served by the fakes in
+benchmarks/fakes. Each worker starts its own in-process, unless
+OPENAI_BASE_URL or AWS_ENDPOINT_URL_S3 already point somewhere. Fake LLM
+latency comes from FAKE_OPENAI_LATENCY_MS, FAKE_OPENAI_JITTER_MS,
+FAKE_OPENAI_SLOW_SHARE and FAKE_OPENAI_SLOW_MS. Azure speech synthesis and
+SendGrid are replaced in-process. Postgres and Redis are the real, local ones.
+"""
+import os
+from benchmarks.fakes import mailer, speech
+from benchmarks.fakes.openai_server import FakeLatency, start_fake_openai
+from benchmarks.fakes.s3_server import start_fake_s3
+
+if not os.getenv("OPENAI_BASE_URL"):
+    latency = FakeLatency(
+        float(os.getenv("FAKE_OPENAI_LATENCY_MS", "800")),
+        float(os.getenv("FAKE_OPENAI_JITTER_MS", "200")),
+        float(os.getenv("FAKE_OPENAI_SLOW_SHARE", "0")),
+        float(os.getenv("FAKE_OPENAI_SLOW_MS", "8000")),
+    )
+    os.environ["OPENAI_BASE_URL"] = start_fake_openai(latency=latency).base_url
+if not os.getenv("AWS_ENDPOINT_URL_S3"):
+    os.environ["AWS_ENDPOINT_URL_S3"] = start_fake_s3().endpoint_url
+
+# Placeholders for settings main.py and cms.py read at import; values from
+# .env (loaded by main.py) take precedence and are harmless here because the
+# endpoints above are fakes.
+for name, value in {
+    "OPENAI_API_KEY": "fake",
+    "OPENAI_MODEL_NAME": "fake-model",
+    "SPEECH_KEY": "fake",
+    "SERVICE_REGION": "eastus",
+    "AWS_ACCESS_KEY_ID": "fake",
+    "AWS_SECRET_ACCESS_KEY": "fake",
+    "AWS_REGION": "us-east-1",
+    "AWS_BUCKET_NAME": "questloft-loadtest",
+    "SENDGRID_API_KEY": "fake",
+}.items():
+    os.environ.setdefault(name, value)
+
+speech.install()
+mailer.install()
+
+import boto3
+from botocore.config import Config
+import cms
+from main import app
+
+# localhost has no per-bucket DNS names, so the fake S3 needs path-style URLs.
+cms.s3_client = boto3.client(
+    "s3",
+    endpoint_url=os.environ["AWS_ENDPOINT_URL_S3"],
+    aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+    aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+    region_name=os.environ["AWS_REGION"],
+    config=Config(s3={"addressing_style": "path"}),
+)
@@ -0,0 +1,123 @@
+"""Throughput and false positives of the local moderation pre-filter.
+
+Usage (from the repository root):
+    python -m benchmarks.moderation_bench [--messages 50000]
+
+Messages are drawn from a fixed set of benign questions (plus sentences from
+the BM25 index when create_pdf_vector_store/split-pdf.py has been run) and
+from obfuscated variants of unsafe ones. The Aho-Corasick filter is timed
+against a regex alternation of the same terms over the same normalized text.
+Every benign message the filter blocks is reported as a false positive.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import time
+from moderation import ModerationFilter, normalize, STRETCHED
+from retrieval import LEXICAL_PATH, LEXICAL_INDEX_FILE
+
+BENIGN = [
+    "What is a resistor?",
+    "How do I make an LED blink with an Arduino?",
+    "Can you explain Ohm's law with an example?",
+    "Solve 53x = 106 for x",
+    "What is 5 + 3 * 2?",
+    "How do I kill a process that is using port 3000?",
+    "My class is learning about circuits, where do I start?",
+    "I aced the test, it was the bomb!",
+    "What are the methods of a Python list?",
+    "Who is the heroine of the story we read?",
+    "How does a servo motor work???",
+    "Why does my breadboard circuit get hot",
+    "What's the difference between analog and digital?",
+    "Can you help me with my homework on fractions",
+    "How high can a drone fly?",
+    "I want to build a robot that can dance",
+]
+UNSAFE = [
+    "I want to kill myself",
+    "how do you make a bomb",
+    "send nudes",
+    "where can I buy weed",
+    "this is bullshit",
+    "you are a bitch",
+]
+
+
+def obfuscate(message, rng):
+    choice = rng.randrange(4)
+    if choice == 0:
+        return message.replace("e", "3").replace("a", "@").replace("i", "!")
+    if choice == 1:
+        words = message.split()
+        word = rng.randrange(len(words))
+        words[word] = " ".join(words[word])
+        return " ".join(words)
+    if choice == 2:
+        return re.sub(r"([aeiou])", r"\1\1\1", message, count=1)
+    return message.upper()
+
+
+def load_benign(limit=2000):
+    benign = list(BENIGN)
+    index_path = os.path.join(LEXICAL_PATH, LEXICAL_INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as index_file:
+            chunks = json.load(index_file)["chunks"]
+        sentences = [sentence.strip() for chunk in chunks for sentence in chunk["content"].split(".")]
+        benign += [sentence for sentence in sentences if len(sentence) > 20][:limit]
+    return benign
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--unsafe-share", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    moderation_filter = ModerationFilter.load()
+    benign = load_benign()
+    messages = []
+    for _ in range(args.messages):
+        if rng.random() < args.unsafe_share:
+            messages.append((obfuscate(rng.choice(UNSAFE), rng), True))
+        else:
+            messages.append((rng.choice(benign), False))
+
+    patterns = sorted(moderation_filter.terms, key=len, reverse=True)
+    alternation = re.compile("|".join(re.escape(pattern) for pattern in patterns))
+
+    started = time.perf_counter()
+    results = [moderation_filter.check(message) for message, _ in messages]
+    automaton_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for message, _ in messages:
+        variants = [normalize(message)]
+        if STRETCHED.search(message.casefold()):
+            variants.append(normalize(message, squeeze=True))
+        for variant in variants:
+            if alternation.search(" " + variant + " "):
+                break
+    regex_seconds = time.perf_counter() - started
+
+    caught = sum(result is not None for result, (_, unsafe) in zip(results, messages) if unsafe)
+    unsafe_count = sum(unsafe for _, unsafe in messages)
+    false_positives = sorted({message for result, (message, unsafe) in zip(results, messages)
+                              if result is not None and not unsafe})
+
+    print(f"{len(moderation_filter.terms)} terms, {len(benign)} benign texts, {args.messages} messages")
+    print(f"{'matcher':>14} {'msgs/sec':>10} {'us/msg':>8}")
+    for name, seconds in (("aho-corasick", automaton_seconds), ("regex", regex_seconds)):
+        print(f"{name:>14} {args.messages / seconds:>10.0f} {seconds / args.messages * 1e6:>8.1f}")
+    print(f"unsafe caught: {caught}/{unsafe_count}")
+    print(f"benign texts blocked (false positives): {len(false_positives)}")
+    for message in false_positives:
+        print(f"  {message!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Query latency, per-worker RSS and recall of the Chroma and FAISS backends.
+
+Usage (from the repository root, after create_pdf_vector_store/split-pdf.py):
+    python -m benchmarks.retrieval_bench [--queries 500] [--k 5] [--noise 0.02]
+
+Query vectors are the stored chunk vectors plus Gaussian noise (a stand-in for
+paraphrased questions), so no embedding API calls are made. Ground truth is an
+exact brute-force search in NumPy. Every backend is loaded and queried in a
+freshly spawned process, so the RSS columns are what one gunicorn worker pays.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import numpy as np
+import psutil
+from retrieval import ChromaRetriever, FaissRetriever, build_faiss_index, save_faiss_store
+
+FAISS_INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+
+def load_store():
+    items = ChromaRetriever(embeddings=None).store.get(include=["embeddings", "documents", "metadatas"])
+    vectors = np.asarray(items["embeddings"], dtype=np.float32)
+    chunks = [
+        {"id": chunk_id, "content": content, "source": metadata["source"]}
+        for chunk_id, content, metadata in zip(items["ids"], items["documents"], items["metadatas"])
+    ]
+    return vectors, chunks
+
+
+def make_queries(vectors, count, noise, seed=7):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), size=count)]
+    queries = picked + rng.normal(0, noise, size=picked.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, queries, k):
+    distances = (queries ** 2).sum(1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(1)[None, :]
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def measure_backend(backend, path, queries, truth_contents, k, results):
+    process = psutil.Process(os.getpid())
+    rss_before = process.memory_info().rss
+    if backend == "chroma":
+        retriever = ChromaRetriever(embeddings=None)
+    else:
+        retriever = FaissRetriever(embeddings=None, path=path)
+    # One warm-up query so lazily loaded pages count towards RSS.
+    retriever.search(None, k=k, embedding=queries[0].tolist())
+    rss_loaded = process.memory_info().rss
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth_contents):
+        started = time.perf_counter()
+        found = retriever.search(None, k=k, embedding=query.tolist())
+        latencies.append(time.perf_counter() - started)
+        hits += len({match.content for match in found} & expected)
+    results.put({
+        "backend": backend,
+        "p50_ms": np.percentile(latencies, 50) * 1000,
+        "p95_ms": np.percentile(latencies, 95) * 1000,
+        "rss_mb": rss_loaded / 2 ** 20,
+        "rss_delta_mb": (rss_loaded - rss_before) / 2 ** 20,
+        "recall": hits / (len(queries) * k),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.02)
+    args = parser.parse_args()
+
+    vectors, chunks = load_store()
+    queries = make_queries(vectors, args.queries, args.noise)
+    truth = exact_top_k(vectors, queries, args.k)
+    truth_contents = [{chunks[i]["content"] for i in row} for row in truth]
+    print(f"{len(vectors)} chunks, {vectors.shape[1]} dimensions, {args.queries} queries, k={args.k}")
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        backends = [("chroma", None)]
+        for index_type in FAISS_INDEX_TYPES:
+            path = os.path.join(directory, index_type)
+            save_faiss_store(build_faiss_index(vectors, index_type), chunks, path)
+            backends.append((f"faiss-{index_type}", path))
+
+        print(f"{'backend':>12} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8} {'load MB':>8} {'recall':>7}")
+        for backend, path in backends:
+            worker = context.Process(target=measure_backend,
+                                     args=(backend, path, queries, truth_contents, args.k, results))
+            worker.start()
+            row = results.get()
+            worker.join()
+            print(f"{row['backend']:>12} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} "
+                  f"{row['rss_mb']:>8.1f} {row['rss_delta_mb']:>8.1f} {row['recall']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,197 @@
 from langchain_core.messages import HumanMessage, AIMessage
+from psycopg2.extras import execute_values
 from config.db_config import get_db_connection
+from config.redis_config import get_redis_client
+from pagination import encode_cursor, decode_time_cursor
+from metrics import timed
 import json
+import logging
+import os
+import redis
 
-def serialize_chat_history(chat_history):
-    return [
-        {
-            "type": type(message).__name__,
-            "content": message.content
-        }
-        for message in chat_history
-    ]
+# Recent messages of active chats are cached in a Redis list per chat. Postgres
+# stays the source of truth: writes go to Postgres first and are then pushed to
+# the cached list, and the list only ever holds the newest
+# CHAT_CACHE_MAX_MESSAGES messages of the chat, without gaps. Pushes and the
+# populate after a cache miss are Lua scripts checked against the newest pushed
+# seq, so rows read before a concurrent write never hide that write.
+CHAT_CACHE_TTL_SECONDS = int(os.getenv("CHAT_CACHE_TTL_SECONDS", "1800"))
+CHAT_CACHE_MAX_MESSAGES = int(os.getenv("CHAT_CACHE_MAX_MESSAGES", "100"))
 
+CHAT_LIST_PAGE_SIZE = 10
+CHAT_LIST_MAX_PAGE_SIZE = 50
+CHAT_TRANSCRIPT_PAGE_SIZE = 50
+CHAT_TRANSCRIPT_MAX_PAGE_SIZE = 200
+CHAT_TITLE_MAX_CHARS = 80
+CHAT_PREVIEW_MAX_CHARS = 200
 
-def deserialize_chat_history(serialized_history):
-    message_classes = {
-        "HumanMessage": HumanMessage,
-        "AIMessage": AIMessage,
-    }
-    chat_history_r = [
-        message_classes[message["type"]](content=message["content"])
-        for message in serialized_history
-    ]
-    return chat_history_r
+logger = logging.getLogger(__name__)
+
+# Role stored in chatmessages.Role, as reported by BaseMessage.type.
+MESSAGE_CLASSES_BY_ROLE = {
+    "human": HumanMessage,
+    "ai": AIMessage,
+}
+
+
+def chat_cache_key(chat_id):
+    return f"chat:{chat_id}:rows"
+
+
+def chat_cache_next_key(chat_id):
+    return f"chat:{chat_id}:next"
+
+
+def chat_summary_cache_key(chat_id):
+    return f"chat:{chat_id}:summary"
+
+
+def encode_cached_message(seq, role, content):
+    return json.dumps([seq, role, content], separators=(",", ":"))
+
+
+def read_cached_history(chat_id, limit):
+    """Return the last ``limit`` cached (seq, role, content) rows, or None on a cache miss."""
+    if limit is None or limit > CHAT_CACHE_MAX_MESSAGES:
+        return None
+    try:
+        pipeline = get_redis_client().pipeline()
+        pipeline.lrange(chat_cache_key(chat_id), -limit, -1)
+        pipeline.expire(chat_cache_key(chat_id), CHAT_CACHE_TTL_SECONDS)
+        cached, _ = pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Chat cache read failed for chat {chat_id}: {e}")
+        return None
+    # An empty list means the key does not exist (Redis has no empty lists).
+    if not cached:
+        return None
+    return [tuple(json.loads(item)) for item in cached]
+
+
+# KEYS: the cached list and its next-seq marker. ARGV: TTL, the seq after the
+# newest row read from Postgres, then the encoded rows. The marker holds the
+# seq after the newest message pushed by any writer, so rows read before a
+# concurrent write committed are never cached over it.
+POPULATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local next_seq = tonumber(redis.call('GET', KEYS[2]))
+if next_seq and next_seq > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS: the cached list and its next-seq marker. ARGV: TTL, the list's maximum
+# length, the seq of the first new message, then the encoded messages. The
+# messages are appended only to a cached list ending right before them; a
+# list that is missing messages or got ahead of them is dropped instead.
+PUSH_SCRIPT = """
+local first_seq = tonumber(ARGV[3])
+local next_seq = first_seq + #ARGV - 3
+if next_seq > (tonumber(redis.call('GET', KEYS[2])) or 0) then
+    redis.call('SET', KEYS[2], next_seq, 'EX', ARGV[1])
+end
+local last = redis.call('LINDEX', KEYS[1], -1)
+if not last then
+    return 0
+end
+if cjson.decode(last)[1] ~= first_seq - 1 then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 4))
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def populate_cached_history(chat_id, rows):
+    """Cache rows read from Postgres, unless the chat is cached or a newer message was pushed meanwhile."""
+    if not rows:
+        return
+    rows = rows[-CHAT_CACHE_MAX_MESSAGES:]
+    try:
+        script = get_redis_client().register_script(POPULATE_SCRIPT)
+        script(keys=[chat_cache_key(chat_id), chat_cache_next_key(chat_id)],
+               args=[CHAT_CACHE_TTL_SECONDS, rows[-1][0] + 1, *[encode_cached_message(*row) for row in rows]])
+    except redis.RedisError as e:
+        logger.warning(f"Chat cache populate failed for chat {chat_id}: {e}")
 
-# The chat history row in database is created when we get the chat id
-def update_user_history(chat_id, chat_history):
-    serialized_history = serialize_chat_history(chat_history)
+
+def push_cached_messages(chat_id, rows):
+    """Append freshly committed messages to the cached list, if it is cached."""
+    key = chat_cache_key(chat_id)
+    try:
+        # Chats that are not cached are left alone; the next read repopulates
+        # them from Postgres.
+        script = get_redis_client().register_script(PUSH_SCRIPT)
+        script(keys=[key, chat_cache_next_key(chat_id)],
+               args=[CHAT_CACHE_TTL_SECONDS, CHAT_CACHE_MAX_MESSAGES, rows[0][0],
+                     *[encode_cached_message(*row) for row in rows]])
+    except redis.RedisError as e:
+        logger.warning(f"Chat cache write failed for chat {chat_id}: {e}")
+        try:
+            # Never leave a cached list that is missing committed messages.
+            get_redis_client().delete(key)
+        except redis.RedisError:
+            pass
+
+
+# The chat history row in database is created when we get the chat id.
+# Only the new messages of a turn are written; earlier ones are never rewritten.
+@timed("history_save")
+def append_chat_messages(chat_id, new_messages):
+    if not new_messages:
+        return
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            update_query = """
-                    UPDATE chathistories
-                    SET chathistory = %s, last_message_time = NOW()
-                    WHERE chatid = %s;
-                    """
-            cursor.execute(update_query, (json.dumps(serialized_history), chat_id))
+            # Bumping the counter locks the chat row, so concurrent turns on the
+            # same chat get distinct, gapless sequence numbers. The list fields
+            # shown by /chat/history are kept current in the same statement.
+            first_question = next((message.content for message in new_messages if message.type == "human"), None)
+            cursor.execute(
+                """
+                UPDATE chathistories
+                SET message_count = message_count + %s,
+                    last_message_time = NOW(),
+                    title = COALESCE(title, %s),
+                    last_message_preview = %s
+                WHERE chatid = %s
+                RETURNING message_count;
+                """,
+                (
+                    len(new_messages),
+                    first_question[:CHAT_TITLE_MAX_CHARS] if first_question else None,
+                    new_messages[-1].content[:CHAT_PREVIEW_MAX_CHARS],
+                    chat_id
+                )
+            )
+            result = cursor.fetchone()
+            if not result:
+                print(f"Chat {chat_id} does not exist, messages not saved")
+                connection.rollback()
+                return
+            first_seq = result[0] - len(new_messages)
+            execute_values(
+                cursor,
+                "INSERT INTO chatmessages (chatid, seq, role, content) VALUES %s;",
+                [(chat_id, first_seq + i, message.type, message.content) for i, message in enumerate(new_messages)]
+            )
         connection.commit()
     except Exception as e:
+        # Raised so a background retry can try the whole turn again.
         print(f"Error adding chat history: {e}")
         connection.rollback()
+        raise
     finally:
         connection.close()
+    push_cached_messages(chat_id, [(first_seq + i, message.type, message.content) for i, message in enumerate(new_messages)])
 
 def get_chatid_from_database(user_email):
     connection = get_db_connection()
@@ -49,11 +200,11 @@ def get_chatid_from_database(user_email):
         with connection.cursor() as cursor:
             cursor.execute(
                 """
-                INSERT INTO ChatHistories (Username, ChatHistory)
-                VALUES (%s, %s)
+                INSERT INTO ChatHistories (Username)
+                VALUES (%s)
                 RETURNING chatid;
                 """,
-                (user_email, json.dumps([]))
+                (user_email,)
             )
             chatid = cursor.fetchone()[0]
         connection.commit()
@@ -65,47 +216,207 @@ def get_chatid_from_database(user_email):
         return chatid
 
 
-def retrive_chat_history_db(chat_id):
+# The last `limit` (seq, role, content) rows of the chat (all of them when limit
+# is None), oldest first. Served from the Redis cache when the chat is cached.
+def get_recent_chat_rows(chat_id, limit=None):
+    cached_rows = read_cached_history(chat_id, limit)
+    if cached_rows is not None:
+        return cached_rows
+
+    # On a miss, read enough to fill the cache, not just this request's window.
+    fetch_limit = None if limit is None else max(limit, CHAT_CACHE_MAX_MESSAGES)
     connection = get_db_connection()
-    des_history = []
+    rows = []
     try:
         with connection.cursor() as cursor:
-            query = "SELECT chathistory FROM chathistories WHERE chatid = %s;"
-            cursor.execute(query, (chat_id,))
-            result = cursor.fetchone()
-            if result:
-                des_history = deserialize_chat_history(result[0])
+            query = """
+                SELECT seq, role, content FROM (
+                    SELECT seq, role, content FROM chatmessages
+                    WHERE chatid = %s
+                    ORDER BY seq DESC
+                    LIMIT %s
+                ) recent
+                ORDER BY seq;
+            """
+            cursor.execute(query, (chat_id, fetch_limit))
+            rows = cursor.fetchall()
         connection.commit()
     except Exception as e:
         print(f"Error retrieving chat history: {e}")
         connection.rollback()
+        return []
     finally:
         connection.close()
-        return des_history
-    
 
-def get_all_user_history(username):
+    populate_cached_history(chat_id, rows)
+    if limit is not None:
+        rows = rows[-limit:]
+    return rows
+
+
+# Messages with start_seq <= seq < end_seq, oldest first. Always read from Postgres.
+def get_chat_rows_between(chat_id, start_seq, end_seq):
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT chathistory, chatid FROM chathistories WHERE Username = %s ORDER BY last_message_time DESC LIMIT 10;", (username,))
-            history = cursor.fetchall()
-        return history
+            cursor.execute(
+                "SELECT seq, role, content FROM chatmessages WHERE chatid = %s AND seq >= %s AND seq < %s ORDER BY seq;",
+                (chat_id, start_seq, end_seq)
+            )
+            return cursor.fetchall()
     except Exception as e:
-        print(f"Error retrieving chathistory messages: {e}")
+        print(f"Error retrieving chat messages: {e}")
         return []
     finally:
         connection.close()
 
-def get_history_of_chat_id(chat_id):
+
+# Returns (summary, summary_upto) for the chat: the rolling summary of its
+# first summary_upto messages.
+def get_chat_summary(chat_id):
+    key = chat_summary_cache_key(chat_id)
+    try:
+        cached = get_redis_client().hgetall(key)
+        if cached:
+            return cached[b"summary"].decode("utf-8") or None, int(cached[b"upto"])
+    except redis.RedisError as e:
+        logger.warning(f"Chat summary cache read failed for chat {chat_id}: {e}")
+
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT chathistory FROM chathistories WHERE chatid = %s", (chat_id, ))
-            history = cursor.fetchone()
-        return history
+            cursor.execute("SELECT summary, summary_upto FROM chathistories WHERE chatid = %s;", (chat_id,))
+            result = cursor.fetchone()
+    except Exception as e:
+        print(f"Error retrieving chat summary: {e}")
+        return None, 0
+    finally:
+        connection.close()
+    summary, summary_upto = result if result else (None, 0)
+    cache_chat_summary(chat_id, summary, summary_upto)
+    return summary, summary_upto
+
+
+def cache_chat_summary(chat_id, summary, summary_upto):
+    key = chat_summary_cache_key(chat_id)
+    try:
+        pipeline = get_redis_client().pipeline()
+        pipeline.hset(key, mapping={"summary": summary or "", "upto": summary_upto})
+        pipeline.expire(key, CHAT_CACHE_TTL_SECONDS)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Chat summary cache write failed for chat {chat_id}: {e}")
+
+
+def save_chat_summary(chat_id, summary, summary_upto):
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            # Only ever move the summary forward, in case two turns fold at once.
+            cursor.execute(
+                """
+                UPDATE chathistories
+                SET summary = %s, summary_upto = %s
+                WHERE chatid = %s AND summary_upto < %s;
+                """,
+                (summary, summary_upto, chat_id, summary_upto)
+            )
+            updated = cursor.rowcount
+        connection.commit()
+    except Exception as e:
+        print(f"Error saving chat summary: {e}")
+        connection.rollback()
+        return
+    finally:
+        connection.close()
+    if updated:
+        cache_chat_summary(chat_id, summary, summary_upto)
+
+
+# One page of a user's chats for the sidebar, most recently active first.
+# Returns (chats, next_cursor); next_cursor is None on the last page.
+def get_all_user_history(username, limit=CHAT_LIST_PAGE_SIZE, cursor=None):
+    conditions = ["Username = %s"]
+    params = [username]
+    if cursor:
+        conditions.append("(last_message_time, chatid) < (%s, %s)")
+        params.extend(decode_time_cursor(cursor))
+    params.append(limit + 1)
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(
+                f"""
+                SELECT chatid, title, last_message_preview, message_count, last_message_time
+                FROM chathistories
+                WHERE {' AND '.join(conditions)}
+                ORDER BY last_message_time DESC, chatid DESC
+                LIMIT %s;
+                """,
+                params
+            )
+            rows = db_cursor.fetchall()
+    except Exception as e:
+        print(f"Error retrieving chathistory messages: {e}")
+        return [], None
+    finally:
+        connection.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][4].isoformat(), rows[-1][0])
+    chats = [
+        {
+            "chat_id": chat_id,
+            "title": title,
+            "last_message_preview": preview,
+            "message_count": message_count,
+            "last_message_time": last_message_time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for chat_id, title, preview, message_count, last_message_time in rows
+    ]
+    return chats, next_cursor
+
+# A range of one chat's transcript: up to `limit` messages before seq `before`
+# (the newest ones when before is None), oldest first. Returns None if the chat
+# does not exist.
+def get_history_of_chat_id(chat_id, before=None, limit=CHAT_TRANSCRIPT_PAGE_SIZE):
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT title, message_count FROM chathistories WHERE chatid = %s", (chat_id, ))
+            chat = cursor.fetchone()
+            if chat is None:
+                return None
+            title, message_count = chat
+            if before is None:
+                before = message_count
+            cursor.execute(
+                """
+                SELECT seq, role, content FROM chatmessages
+                WHERE chatid = %s AND seq < %s
+                ORDER BY seq DESC
+                LIMIT %s
+                """,
+                (chat_id, before, limit)
+            )
+            rows = cursor.fetchall()[::-1]
     except Exception as e:
         print(f"Error retrieving chathistory for the given Chat ID: {e}")
-        return []
+        return None
     finally:
-        connection.close()
\ No newline at end of file
+        connection.close()
+    first_seq = rows[0][0] if rows else before
+    return {
+        "chat_id": int(chat_id),
+        "title": title,
+        "message_count": message_count,
+        "messages": [
+            {"seq": seq, "type": MESSAGE_CLASSES_BY_ROLE[role].__name__, "content": content}
+            for seq, role, content in rows
+        ],
+        # Pass as `before` to fetch the preceding page; None once at the start.
+        "next_before": first_seq if first_seq > 0 else None,
+    }
@@ -4,7 +4,8 @@ import boto3
 import os
 from datetime import datetime
 import uuid
-from config.db_config import get_db_connection
+from config.db_config import db_connection
+from metrics import stage
 
 cms = Blueprint('cms', __name__)
 # CORS(cms, resources={
@@ -38,27 +39,27 @@ def upload_document():
         file_extension = os.path.splitext(file.filename)[1]
         s3_key = f"documents/{str(uuid.uuid4())}{file_extension}"
         
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=file_content,
-            ContentType=file.content_type,
-            ServerSideEncryption='AES256'
-        )
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO documents (title, filename, s3_key, size, tags, content_type, description, upload_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id, upload_date;
-        """, (title, file.filename, s3_key, len(file_content), tags, file.content_type, description, datetime.utcnow()))
-        
-        document_id, upload_date = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        with stage("s3_put_object"):
+            s3_client.put_object(
+                Bucket=BUCKET_NAME,
+                Key=s3_key,
+                Body=file_content,
+                ContentType=file.content_type,
+                ServerSideEncryption='AES256'
+            )
+        
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute("""
+                INSERT INTO documents (title, filename, s3_key, size, tags, content_type, description, upload_date)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, upload_date;
+            """, (title, file.filename, s3_key, len(file_content), tags, file.content_type, description, datetime.utcnow()))
+
+            document_id, upload_date = cur.fetchone()
+            conn.commit()
+            cur.close()
         
         return jsonify({
             'id': document_id,
@@ -77,27 +78,25 @@ def upload_document():
 @cms.route('/documents/<int:document_id>/download-url', methods=['GET'])
 def get_download_url(document_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("SELECT s3_key FROM documents WHERE id = %s", (document_id,))
-        result = cur.fetchone()
-        
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT s3_key FROM documents WHERE id = %s", (document_id,))
+            result = cur.fetchone()
+            cur.close()
+
         if not result:
             return jsonify({'error': 'Document not found'}), 404
             
         s3_key = result[0]
-        url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': BUCKET_NAME,
-                'Key': s3_key
-            },
-            ExpiresIn=3600
-        )
-        
-        cur.close()
-        conn.close()
+        with stage("s3_presign"):
+            url = s3_client.generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': BUCKET_NAME,
+                    'Key': s3_key
+                },
+                ExpiresIn=3600
+            )
         return jsonify({'download_url': url})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -105,28 +104,27 @@ def get_download_url(document_id):
 @cms.route('/documents', methods=['GET'])
 def list_documents():
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT id, title, filename, size, upload_date, tags, content_type, description 
-            FROM documents 
-            ORDER BY upload_date DESC
-        """)
-        
-        documents = [{
-            'id': doc[0],
-            'title': doc[1],
-            'filename': doc[2],
-            'size': doc[3],
-            'upload_date': doc[4].isoformat(),
-            'tags': doc[5],
-            'content_type': doc[6],
-            'description': doc[7]
-        } for doc in cur.fetchall()]
-        
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute("""
+                SELECT id, title, filename, size, upload_date, tags, content_type, description 
+                FROM documents 
+                ORDER BY upload_date DESC
+            """)
+
+            documents = [{
+                'id': doc[0],
+                'title': doc[1],
+                'filename': doc[2],
+                'size': doc[3],
+                'upload_date': doc[4].isoformat(),
+                'tags': doc[5],
+                'content_type': doc[6],
+                'description': doc[7]
+            } for doc in cur.fetchall()]
+
+            cur.close()
         return jsonify(documents)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -134,29 +132,29 @@ def list_documents():
 @cms.route('/documents/<int:document_id>', methods=['DELETE'])
 def delete_document(document_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("SELECT s3_key FROM documents WHERE id = %s", (document_id,))
-        result = cur.fetchone()
-        
-        if not result:
-            return jsonify({'error': 'Document not found'}), 404
-            
-        s3_key = result[0]
-        
-        # Delete from S3
-        s3_client.delete_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key
-        )
-        
-        # Delete from database
-        cur.execute("DELETE FROM documents WHERE id = %s", (document_id,))
-        conn.commit()
-        
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute("SELECT s3_key FROM documents WHERE id = %s", (document_id,))
+            result = cur.fetchone()
+
+            if not result:
+                return jsonify({'error': 'Document not found'}), 404
+
+            s3_key = result[0]
+
+            # Delete from S3
+            with stage("s3_delete_object"):
+                s3_client.delete_object(
+                    Bucket=BUCKET_NAME,
+                    Key=s3_key
+                )
+
+            # Delete from database
+            cur.execute("DELETE FROM documents WHERE id = %s", (document_id,))
+            conn.commit()
+
+            cur.close()
         
         return jsonify({'message': 'Document deleted successfully'})
     except Exception as e:
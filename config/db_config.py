@@ -1,35 +1,288 @@
 import psycopg2
 import os
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
 from dotenv import load_dotenv
+from metrics import stage
 
 # Load environment variables from .env file
 load_dotenv(override=True)
+
+logger = logging.getLogger(__name__)
+
+# Pool sizing is per process, so with gunicorn the total number of server
+# connections is roughly workers * DB_POOL_MAX_SIZE.
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE_SECONDS = float(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PING_AFTER_SECONDS = float(os.getenv("DB_POOL_PING_AFTER_SECONDS", "30"))
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+def _connect():
+    db_host = os.getenv("DB_HOST")
+    db_name = os.getenv("DB_NAME")
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
+    db_port = os.getenv("DB_PORT", "5432")  # PostgreSQL default port
+
+    # Ensure no environment variable is missing
+    if not all([db_host, db_name, db_user, db_password]):
+        raise EnvironmentError("One or more required environment variables are missing.")
+
+    # Establish the database connection using environment variables
+    return psycopg2.connect(
+        host=db_host,
+        database=db_name,
+        user=db_user,
+        password=db_password,
+        port=db_port
+    )
+
+
+class _PooledEntry:
+    __slots__ = ("connection", "created_at", "last_used")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of psycopg2 connections owned by one process.
+
+    Checkouts wait up to ``timeout`` seconds for a free slot, idle connections
+    are pinged before reuse and connections older than ``recycle`` seconds are
+    replaced.
+    """
+
+    def __init__(self, connect=_connect, max_size=DB_POOL_MAX_SIZE, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE_SECONDS, ping_after=DB_POOL_PING_AFTER_SECONDS):
+        self.pid = os.getpid()
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._idle = deque()
+        self._in_use = {}
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "connections_discarded": 0,
+            "checkout_seconds_total": 0.0,
+            "checkout_seconds_max": 0.0,
+        }
+
+    def checkout(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        entry = None
+        with self._condition:
+            waited = False
+            while not self._idle and len(self._in_use) >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._condition.wait(remaining)
+            if waited:
+                self._stats["waits"] += 1
+            if self._idle:
+                entry = self._idle.pop()
+            # Reserve the slot before doing any network I/O outside the lock.
+            reservation = entry if entry is not None else object()
+            self._in_use[id(reservation)] = reservation
+
+        try:
+            entry = self._prepare(entry)
+        except Exception:
+            with self._condition:
+                self._in_use.pop(id(reservation), None)
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._in_use.pop(id(reservation), None)
+            self._in_use[id(entry.connection)] = entry
+            elapsed = time.monotonic() - started
+            self._stats["checkouts"] += 1
+            self._stats["checkout_seconds_total"] += elapsed
+            self._stats["checkout_seconds_max"] = max(self._stats["checkout_seconds_max"], elapsed)
+        return entry.connection
+
+    def _prepare(self, entry):
+        now = time.monotonic()
+        if entry is not None:
+            if entry.connection.closed or now - entry.created_at > self.recycle:
+                self._close_quietly(entry.connection)
+                self._count("connections_recycled")
+                entry = None
+            elif now - entry.last_used > self.ping_after and not self._ping(entry.connection):
+                self._close_quietly(entry.connection)
+                self._count("connections_discarded")
+                entry = None
+        if entry is None:
+            entry = _PooledEntry(self._connect())
+            self._count("connections_created")
+            logger.debug("Opened new database connection (pid %s)", self.pid)
+        return entry
+
+    def checkin(self, connection, discard=False):
+        with self._condition:
+            entry = self._in_use.get(id(connection))
+        if entry is None:
+            return
+        if not discard and not connection.closed:
+            try:
+                # Never hand out a connection with an open or aborted transaction.
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or connection.closed:
+            self._close_quietly(connection)
+            entry = None
+        else:
+            entry.last_used = time.monotonic()
+        # The slot stays taken until the connection is back in _idle or gone, so
+        # a waiter woken here can never open one beyond max_size.
+        with self._condition:
+            self._in_use.pop(id(connection), None)
+            if entry is None:
+                self._stats["connections_discarded"] += 1
+            else:
+                self._idle.append(entry)
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats["in_use"] = len(self._in_use)
+            stats["idle"] = len(self._idle)
+            stats["max_size"] = self.max_size
+        return stats
+
+    def close_all(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._close_quietly(entry.connection)
+
+    def _count(self, key):
+        with self._condition:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _ping(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+class PooledConnection:
+    """Proxy around a pooled psycopg2 connection.
+
+    Behaves like the underlying connection, except that ``close()`` returns it
+    to the pool instead of tearing down the socket. As with psycopg2, a
+    ``with`` block on it commits or rolls back the transaction but does not
+    release the connection; use ``db_connection()`` for that.
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    # Special methods are looked up on the type, so __getattr__ does not cover them.
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._connection.__exit__(exc_type, exc_value, traceback)
+
+    def close(self):
+        self.release()
+
+    def release(self, discard=False):
+        if not self._released:
+            self._released = True
+            self._pool.checkin(self._connection, discard=discard)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    # A pool inherited across fork() shares sockets with the parent, so every
+    # process (e.g. each gunicorn worker) builds its own on first use. The
+    # inherited connections are deliberately not closed: closing them would
+    # terminate the parent's server sessions.
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
+
 def get_db_connection():
     try:
-        db_host = os.getenv("DB_HOST")
-        db_name = os.getenv("DB_NAME")
-        db_user = os.getenv("DB_USER")
-        db_password = os.getenv("DB_PASSWORD")
-        db_port = os.getenv("DB_PORT", "5432")  # PostgreSQL default port
-
-        # Ensure no environment variable is missing
-        if not all([db_host, db_name, db_user, db_password]):
-            raise EnvironmentError("One or more required environment variables are missing.")
-
-        # Establish the database connection using environment variables
-        connection = psycopg2.connect(
-            host=db_host,
-            database=db_name,
-            user=db_user,
-            password=db_password,
-            port=db_port
-        )
-        print("Database connection successful")
-        return connection
-
+        pool = get_pool()
+        with stage("db_checkout"):
+            connection = pool.checkout()
+        return PooledConnection(pool, connection)
     except psycopg2.DatabaseError as e:
         print(f"Database connection failed: {e}")
         raise
     except EnvironmentError as e:
         print(f"Environment variable error: {e}")
         raise
+
+
+@contextmanager
+def db_connection():
+    """Check a connection out of the pool for the duration of a ``with`` block."""
+    connection = get_db_connection()
+    discard = False
+    try:
+        yield connection
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        connection.release(discard=discard)
@@ -4,3 +4,10 @@ from typing import List
 class Feedback(BaseModel):
     areas_well_done: List[str] = Field(default_factory=list, description="Summary of areas where the student performed well.")
     areas_to_improve: List[str] = Field(default_factory=list, description="Summary of areas where the student can improve.")
+
+class AnswerGrade(BaseModel):
+    number: int = Field(description="Number of the answer, as given in the prompt.")
+    correct: bool = Field(description="Whether the student's answer is correct.")
+
+class GradedAnswers(BaseModel):
+    grades: List[AnswerGrade] = Field(default_factory=list, description="One grade per answer.")
@@ -0,0 +1,23 @@
+import os
+import redis
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv(override=True)
+
+redis_host = os.getenv("REDISHOST", "localhost")
+redis_port = os.getenv("REDISPORT", 6379)
+redis_user = os.getenv("REDISUSER", None)
+redis_password = os.getenv("REDISPASSWORD", None)
+redis_url = os.getenv("REDIS_URL", None)
+
+# redis-py connection pools reconnect after fork, so one client per module is
+# safe to share between gunicorn workers.
+if redis_url:
+    redis_client = redis.StrictRedis.from_url(redis_url)
+else:
+    redis_client = redis.StrictRedis(host=redis_host, port=redis_port, db=0)
+
+
+def get_redis_client():
+    return redis_client
@@ -0,0 +1,127 @@
+import os
+import logging
+from functools import lru_cache
+import tiktoken
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import SystemMessage
+from chat_history_helpers import (
+    MESSAGE_CLASSES_BY_ROLE,
+    get_recent_chat_rows,
+    get_chat_rows_between,
+    get_chat_summary,
+    save_chat_summary,
+)
+from metrics import stage
+
+# Token budget for the conversation history sent with each question
+# (summary plus verbatim messages; the system prompt and question are extra).
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "3000"))
+# Number of most recent question/answer turns always kept verbatim. Older
+# turns are folded into the rolling summary in batches of this size, so at
+# most 2 * CHAT_CONTEXT_RECENT_TURNS turns are ever read per request. Keep
+# 4 * CHAT_CONTEXT_RECENT_TURNS <= CHAT_CACHE_MAX_MESSAGES so they come from Redis.
+CHAT_CONTEXT_RECENT_TURNS = int(os.getenv("CHAT_CONTEXT_RECENT_TURNS", "6"))
+CHAT_SUMMARY_MAX_WORDS = int(os.getenv("CHAT_SUMMARY_MAX_WORDS", "150"))
+# Rough per-message overhead of the chat format (role markers, separators).
+TOKENS_PER_MESSAGE = 4
+
+logger = logging.getLogger(__name__)
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You maintain a running summary of a conversation between a K-12 student and questy, "
+               "the AI Chatbot for Thinkabit Labs. Keep the facts, topics and open questions the "
+               "assistant needs to continue the conversation. Reply with the summary text only, "
+               "in at most {max_words} words."),
+    ("human", "Current summary:\n{summary}\n\nNew messages to fold in:\n{transcript}")
+])
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name=None):
+    try:
+        return tiktoken.encoding_for_model(model_name or "")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model_name=None):
+    return len(get_encoding(model_name or os.getenv("OPENAI_MODEL_NAME")).encode(text))
+
+
+def count_message_tokens(messages, model_name=None):
+    return sum(count_tokens(message.content, model_name) + TOKENS_PER_MESSAGE for message in messages)
+
+
+def plan_summary_fold(summary_upto, message_count, recent_turns=CHAT_CONTEXT_RECENT_TURNS):
+    """Return the (start_seq, end_seq) range to fold into the summary, or None.
+
+    Nothing is folded until more than two windows of unsummarised messages
+    have accumulated; then everything but the last window is folded at once.
+    This keeps summarisation to one LLM call every ``recent_turns`` turns.
+    """
+    verbatim_messages = recent_turns * 2
+    if message_count - summary_upto > 2 * verbatim_messages:
+        return summary_upto, message_count - verbatim_messages
+    return None
+
+
+def fit_to_budget(messages, max_tokens, reserved_tokens=0, model_name=None):
+    """Drop the oldest messages until the rest fit in ``max_tokens``.
+
+    The newest message is always kept, even if it alone exceeds the budget.
+    """
+    budget = max_tokens - reserved_tokens
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        cost = count_tokens(message.content, model_name) + TOKENS_PER_MESSAGE
+        if kept and used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def summary_message(summary):
+    return SystemMessage(content=f"Summary of the earlier conversation: {summary}")
+
+
+def summarize_messages(llm, summary, rows):
+    transcript = "\n".join(f"{'Student' if role == 'human' else 'Assistant'}: {content}" for _, role, content in rows)
+    chain = summary_prompt | llm
+    res = chain.invoke({
+        "summary": summary or "(none yet)",
+        "transcript": transcript,
+        "max_words": CHAT_SUMMARY_MAX_WORDS,
+    })
+    return res.content.strip()
+
+
+def build_chat_context(llm, chat_id, max_tokens=CHAT_CONTEXT_MAX_TOKENS, recent_turns=CHAT_CONTEXT_RECENT_TURNS):
+    """Return the history messages to send with the next question of a chat.
+
+    That is the rolling summary of older turns (if any) followed by as many of
+    the newest messages as fit in ``max_tokens``.
+    """
+    with stage("history_load"):
+        summary, summary_upto = get_chat_summary(chat_id)
+        rows = get_recent_chat_rows(chat_id, limit=4 * recent_turns)
+    message_count = rows[-1][0] + 1 if rows else 0
+
+    fold = plan_summary_fold(summary_upto, message_count, recent_turns)
+    if fold:
+        start_seq, end_seq = fold
+        try:
+            summary = summarize_messages(llm, summary, get_chat_rows_between(chat_id, start_seq, end_seq))
+            summary_upto = end_seq
+            save_chat_summary(chat_id, summary, summary_upto)
+        except Exception as e:
+            # Keep the old summary; the unsummarised turns stay verbatim and
+            # the token budget below still bounds the prompt.
+            logger.warning(f"Failed to update summary for chat {chat_id}: {e}")
+
+    messages = [MESSAGE_CLASSES_BY_ROLE[role](content=content) for seq, role, content in rows if seq >= summary_upto]
+    context = [summary_message(summary)] if summary else []
+    reserved_tokens = count_message_tokens(context)
+    return context + fit_to_budget(messages, max_tokens, reserved_tokens)
@@ -4,18 +4,46 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from dotenv import load_dotenv, find_dotenv
 from langchain_community.vectorstores import Chroma
+import hashlib
+import os
+import sys
+
+# Run as a script from the repository root; make the repo modules importable.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embedding_cache import CachedEmbeddings, SqliteEmbeddingStore
+from retrieval import build_faiss_index, save_faiss_store, save_lexical_index, FAISS_INDEX_TYPE
 
 load_dotenv(find_dotenv())
 
 CHROMA_PATH = "vector-store-chroma"
 DATA_PATH = "data"
-
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# Read by helpers.py; answers cached against an older version are ignored.
+INGEST_VERSION_FILE = os.path.join(CHROMA_PATH, "ingest_version")
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Chunk embeddings survive re-ingestion, so rebuilding a store only pays
+# for chunks whose text changed.
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding-cache.sqlite3")
+
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(model=EMBEDDING_MODEL),
+    EMBEDDING_MODEL,
+    SqliteEmbeddingStore(EMBEDDING_CACHE_PATH)
+)
 
 def main():
     documents = load_documents()
     chunks = split_documents(documents)
-    add_to_chroma(chunks)
+    db = add_to_chroma(chunks)
+    items = db.get(include=["embeddings", "documents", "metadatas"])
+    if not items["ids"]:
+        print("No documents to index")
+        return
+    stored_chunks = [
+        {"id": chunk_id, "content": content, "source": metadata["source"]}
+        for chunk_id, content, metadata in zip(items["ids"], items["documents"], items["metadatas"])
+    ]
+    add_to_faiss(items["embeddings"], stored_chunks)
+    add_to_lexical_index(stored_chunks)
 
 
 def load_documents():
@@ -74,8 +102,30 @@ def add_to_chroma(chunks: list[Document]):
         print(f"Adding new documents: {len(new_chunks)}")
         new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
         db.add_documents(new_chunks, ids=new_chunk_ids)
+        existing_ids.update(new_chunk_ids)
     else:
         print("No new documents to add")
 
+    if len(new_chunks) or not os.path.exists(INGEST_VERSION_FILE):
+        write_ingest_version(existing_ids)
+    return db
+
+# The FAISS store and the BM25 index are rebuilt from what is stored in Chroma,
+# so every backend serves exactly the same chunks and nothing is embedded twice.
+def add_to_faiss(vectors, chunks):
+    index = build_faiss_index(vectors, FAISS_INDEX_TYPE)
+    save_faiss_store(index, chunks)
+    print(f"FAISS {FAISS_INDEX_TYPE} index built with {len(chunks)} chunks")
+
+def add_to_lexical_index(chunks):
+    save_lexical_index(chunks)
+    print(f"BM25 index built with {len(chunks)} chunks")
+
+def write_ingest_version(chunk_ids):
+    version = hashlib.sha1("\n".join(sorted(chunk_ids)).encode("utf-8")).hexdigest()[:16]
+    with open(INGEST_VERSION_FILE, "w") as version_file:
+        version_file.write(version)
+    print(f"Vector store version: {version}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,13 +1,11 @@
-from helpers import get_answer_from_question, get_close_vector_text
-from langchain_openai import ChatOpenAI
-import os
-from dotenv import load_dotenv, find_dotenv
+from main import app, llm
+from helpers import get_answer_from_question
+from chat_history_helpers import get_chatid_from_database
 
-load_dotenv(find_dotenv())
+DEMO_USER_EMAIL = "demo@example.com"
 
-
-llm = ChatOpenAI(api_key=os.environ.get("OPENAI_API_KEY"),
-                 model=os.environ.get("OPENAI_MODEL_NAME"))
-
-ans = get_answer_from_question(llm, "What is the fermi paradox?")
-print(ans)
\ No newline at end of file
+# helpers log through current_app, so the demo runs inside the app context.
+with app.app_context():
+    chat_id = get_chatid_from_database(DEMO_USER_EMAIL)
+    ans, chat_history = get_answer_from_question(llm, "What is the fermi paradox?", chat_id, DEMO_USER_EMAIL)
+    print(ans)
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+import redis
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_LOCAL_SIZE = 2048
+EMBEDDING_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+
+def normalize_query(text):
+    # The cache key of a query: queries that differ only in case or spacing
+    # share the embedding of whichever spelling was embedded first. The model
+    # itself always sees the text as the user typed it.
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(model_name, text):
+    return "emb:" + hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_vector(raw):
+    return np.frombuffer(raw, dtype=np.float32).tolist()
+
+
+class RedisEmbeddingStore:
+    """Embeddings shared by all workers, kept in Redis with a TTL."""
+
+    def __init__(self, client, ttl=EMBEDDING_CACHE_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    def get_many(self, keys):
+        try:
+            return self.client.mget(keys)
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return [None] * len(keys)
+
+    def set_many(self, items):
+        try:
+            pipeline = self.client.pipeline()
+            for key, raw in items:
+                pipeline.set(key, raw, ex=self.ttl)
+            pipeline.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+
+class SqliteEmbeddingStore:
+    """Embeddings persisted in a local SQLite file, for offline scripts."""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+        return [found.get(key) for key in keys]
+
+    def set_many(self, items):
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", items)
+            self._connection.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an Embeddings object with an in-process LRU and a shared store.
+
+    Lookups go local LRU -> shared store -> the wrapped model, and results are
+    written back to both tiers, so a repeated text never reaches the network.
+    """
+
+    def __init__(self, embeddings, model_name, store=None, local_size=EMBEDDING_CACHE_LOCAL_SIZE):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.local_size = local_size
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"local_hits": 0, "store_hits": 0, "misses": 0}
+
+    def embed_query(self, text):
+        return self._embed([text], [normalize_query(text)],
+                           lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        return self._embed(texts, texts, self.embeddings.embed_documents)
+
+    def _embed(self, texts, key_texts, compute):
+        keys = [cache_key(self.model_name, text) for text in key_texts]
+        vectors = [self._local_get(key) for key in keys]
+        local_hits = sum(vector is not None for vector in vectors)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        store_hits = 0
+        if missing and self.store is not None:
+            for i, raw in zip(missing, self.store.get_many([keys[i] for i in missing])):
+                if raw is not None:
+                    vectors[i] = decode_vector(raw)
+                    self._local_put(keys[i], vectors[i])
+                    store_hits += 1
+            missing = [i for i in missing if vectors[i] is None]
+
+        if missing:
+            computed = compute([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                self._local_put(keys[i], vector)
+            if self.store is not None:
+                self.store.set_many([(keys[i], encode_vector(vectors[i])) for i in missing])
+
+        with self._lock:
+            self.stats["local_hits"] += local_hits
+            self.stats["store_hits"] += store_hits
+            self.stats["misses"] += len(missing)
+        return vectors
+
+    def _local_get(self, key):
+        with self._lock:
+            vector = self._local.get(key)
+            if vector is not None:
+                self._local.move_to_end(key)
+            return vector
+
+    def _local_put(self, key, vector):
+        with self._lock:
+            self._local[key] = vector
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
@@ -6,11 +6,24 @@ from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv, find_dotenv
 import azure.cognitiveservices.speech as speechsdk
 import base64
+import os
+import time
+import uuid
+from collections import namedtuple
 from datetime import datetime
 from config.db_config import get_db_connection
 from pydantic import BaseModel, Field
-from chat_history_helpers import update_user_history, retrive_chat_history_db
-from langchain_community.vectorstores import Chroma
+from chat_history_helpers import append_chat_messages
+from context_window import build_chat_context
+from background_tasks import run_concurrently, submit_background
+from moderation import check_message, reply_for
+import semantic_cache
+from semantic_cache import SEMANTIC_CACHE_ENABLED
+from embedding_cache import CachedEmbeddings, RedisEmbeddingStore
+from config.redis_config import get_redis_client
+from retrieval import get_retriever, CHROMA_PATH, LEXICAL_FAST_PATH_SCORE
+from response_stream import ResponseFieldStream
+from metrics import stage, timed
 from flask import current_app
 
 prompt = """
@@ -32,32 +45,94 @@ class JsonInformation(BaseModel):
     response: str = Field(description="Response to the message")
 json_parser = JsonOutputParser(pydantic_object=JsonInformation)
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-vector_store = Chroma(persist_directory="vector-store-chroma", embedding_function=embeddings)
+EMBEDDING_MODEL = "text-embedding-3-small"
 
-def add_flagged_message(auth0_user_id, message):
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def read_vector_store_version():
+    # Written by create_pdf_vector_store/split-pdf.py whenever the store changes.
+    try:
+        with open(os.path.join(CHROMA_PATH, "ingest_version")) as version_file:
+            return version_file.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(model=EMBEDDING_MODEL),
+    EMBEDDING_MODEL,
+    RedisEmbeddingStore(get_redis_client())
+)
+VECTOR_STORE_VERSION = read_vector_store_version()
+
+@timed("flag_insert")
+def add_flagged_message(auth0_user_id, message, source="llm", matched_term=None, request_key=None,
+                        current_time=None):
+    """Insert a flag; a second call with the same request_key is a no-op, so retries are safe."""
+    current_time = current_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
             cursor.execute(
                 """
-                INSERT INTO flags (auth0_user_id, message, timestamp)
-                VALUES (%s, %s, %s);
+                INSERT INTO flags (auth0_user_id, message, timestamp, source, matched_term, request_key)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (request_key) DO NOTHING;
                 """,
-                (auth0_user_id, message, current_time)
+                (auth0_user_id, message, current_time, source, matched_term, request_key)
             )
         connection.commit()
         current_app.logger.debug(f"Flagged message added for auth0_user_id: {auth0_user_id}")
     except Exception as e:
         current_app.logger.debug(f"Error adding flagged message: {e}")
         connection.rollback()
+        raise
     finally:
         connection.close()
 
-def get_answer_from_question(llm, question, chat_id, auth0_user_id):
-    context = get_close_vector_text(question)
-    chat_history = retrive_chat_history_db(chat_id)
+def flag_in_background(auth0_user_id, message, source="llm", matched_term=None):
+    # The key and time are fixed before the first attempt, so a retry inserts the same flag at most once.
+    submit_background("flag message", add_flagged_message, auth0_user_id, message, source, matched_term,
+                      str(uuid.uuid4()), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+def save_turn(chat_id, chat_history, question, answer):
+    new_messages = [HumanMessage(content=question), AIMessage(content=answer)]
+    chat_history.extend(new_messages)
+    # Saved before replying: the next turn of the chat may arrive as soon as
+    # this one is answered and must see it, in order.
+    append_chat_messages(chat_id, new_messages)
+    return answer, str(chat_history)
+
+def answer_blocked_question(question, auth0_user_id):
+    """The canned reply for a question the local pre-filter blocks, else None."""
+    match = check_message(question)
+    if match is None:
+        return None
+    current_app.logger.info(f"Pre-filter blocked a message ({match.category}: {match.term})")
+    flag_in_background(auth0_user_id, question, "prefilter", match.term)
+    return reply_for(match)
+
+def retrieve_context(question):
+    # With the semantic cache on, embed once and reuse it for retrieval.
+    embedding = None
+    if SEMANTIC_CACHE_ENABLED:
+        with stage("embedding"):
+            embedding = embeddings.embed_query(question)
+    return embedding, get_close_vector_text(question, embedding)
+
+PreparedAnswer = namedtuple("PreparedAnswer", ["chain", "inputs", "chat_history", "embedding", "cache_scope", "cached_answer"])
+
+def prepare_answer(llm, question, chat_id):
+    """Retrieval, chat context and the semantic cache lookup: everything before the LLM call."""
+    (embedding, context), chat_history = run_concurrently(
+        (retrieve_context, question),
+        (build_chat_context, llm, chat_id),
+    )
+
+    # Only first-turn questions are cached: later answers depend on the history.
+    cache_scope = None
+    cached_answer = None
+    if SEMANTIC_CACHE_ENABLED and not chat_history:
+        cache_scope = semantic_cache.encode_scope(context[1] if context else None)
+        cached_answer = semantic_cache.lookup(embedding, cache_scope, VECTOR_STORE_VERSION)
+
     template = ChatPromptTemplate.from_messages([
         ("system", prompt),
         MessagesPlaceholder(variable_name="chat_history"),
@@ -65,34 +140,97 @@ def get_answer_from_question(llm, question, chat_id, auth0_user_id):
     ])
 
     chain = template | llm
-
-    res = chain.invoke({
+    inputs = {
         "context": context,
         "question": question,
         "chat_history": chat_history
-    })
+    }
+    return PreparedAnswer(chain, inputs, chat_history, embedding, cache_scope, cached_answer)
+
+def finish_answer(prepared, question, chat_id, auth0_user_id, content, latency_ms):
+    """Parse the model's JSON reply, flag or cache it, and save the turn."""
     parsed_response = ""
     res_to_return = ""
     try:
-        parsed_response = json_parser.parse(res.content)
+        with stage("response_parse"):
+            parsed_response = json_parser.parse(content)
         current_app.logger.debug(f"Parsed response: {parsed_response}")
 
         if parsed_response['is_unsafe_for_k_12_children']:
-            add_flagged_message(auth0_user_id, question)
-        chat_history.append(HumanMessage(content=question))
-        chat_history.append(AIMessage(content=parsed_response['response']))
+            flag_in_background(auth0_user_id, question)
+        elif prepared.cache_scope is not None:
+            semantic_cache.store(prepared.embedding, prepared.cache_scope, VECTOR_STORE_VERSION, question,
+                                 parsed_response['response'], latency_ms)
         res_to_return = parsed_response['response']
-        
-    except:
-        parsed_response = res.content
-        chat_history.append(HumanMessage(content=question))
-        chat_history.append(AIMessage(content=res.content))
+
+    except Exception as e:
+        parsed_response = content
         res_to_return = parsed_response
         current_app.logger.debug(f"Error in get_answer_from_question: {e}")
-    
-    update_user_history(chat_id, chat_history)
-    return res_to_return, str(chat_history)
 
+    return save_turn(chat_id, prepared.chat_history, question, res_to_return)
+
+def get_answer_from_question(llm, question, chat_id, auth0_user_id):
+    # Clear-cut unsafe questions never reach retrieval or the LLM.
+    blocked_reply = answer_blocked_question(question, auth0_user_id)
+    if blocked_reply is not None:
+        return save_turn(chat_id, [], question, blocked_reply)
+
+    prepared = prepare_answer(llm, question, chat_id)
+    if prepared.cached_answer is not None:
+        return save_turn(chat_id, prepared.chat_history, question, prepared.cached_answer)
+
+    started = time.perf_counter()
+    res = prepared.chain.invoke(prepared.inputs)
+    latency_ms = (time.perf_counter() - started) * 1000
+    return finish_answer(prepared, question, chat_id, auth0_user_id, res.content, latency_ms)
+
+def stream_ready_answer(chat_id, chat_history, question, answer, started):
+    """Events for an answer that did not need the LLM (pre-filter or semantic cache)."""
+    answer, _ = save_turn(chat_id, chat_history, question, answer)
+    elapsed_ms = round((time.perf_counter() - started) * 1000)
+    yield "token", {"text": answer}
+    yield "done", {"reply": answer, "ttft_ms": elapsed_ms, "total_ms": elapsed_ms}
+
+def stream_answer_from_question(llm, question, chat_id, auth0_user_id):
+    """Like get_answer_from_question, but yields (event, data) pairs for an SSE response.
+
+    "token" events carry the text of the response field as the model
+    generates it. The final "done" event carries the saved reply (which is
+    the raw output if the model did not answer in JSON), the time to the
+    first token and the total time, both measured from the start of the request.
+    """
+    started = time.perf_counter()
+    blocked_reply = answer_blocked_question(question, auth0_user_id)
+    if blocked_reply is not None:
+        yield from stream_ready_answer(chat_id, [], question, blocked_reply, started)
+        return
+    prepared = prepare_answer(llm, question, chat_id)
+    if prepared.cached_answer is not None:
+        yield from stream_ready_answer(chat_id, prepared.chat_history, question, prepared.cached_answer, started)
+        return
+
+    response_field = ResponseFieldStream()
+    content = ""
+    ttft_ms = None
+    llm_started = time.perf_counter()
+    for chunk in prepared.chain.stream(prepared.inputs):
+        content += chunk.content
+        text = response_field.feed(chunk.content)
+        if text:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            yield "token", {"text": text}
+    latency_ms = (time.perf_counter() - llm_started) * 1000
+
+    answer, _ = finish_answer(prepared, question, chat_id, auth0_user_id, content, latency_ms)
+    total_ms = (time.perf_counter() - started) * 1000
+    if ttft_ms is None:
+        ttft_ms = total_ms
+    current_app.logger.info(f"Streamed reply for chat {chat_id}: first token {ttft_ms:.0f} ms, total {total_ms:.0f} ms")
+    yield "done", {"reply": answer, "ttft_ms": round(ttft_ms), "total_ms": round(total_ms)}
+
+@timed("whisper")
 def speech_to_text(client, audio_file):
     try:
         transcription = client.audio.transcriptions.create(
@@ -105,6 +243,7 @@ def speech_to_text(client, audio_file):
         current_app.logger.debug(f"Error during speech-to-text: {e}")
         return "Error during speech-to-text."
 
+@timed("tts")
 def text_to_speech(speech_synthesizer, file_name, text):
     try:
         result = speech_synthesizer.speak_text_async(text).get()
@@ -123,16 +262,19 @@ def text_to_speech(speech_synthesizer, file_name, text):
         current_app.logger.debug(f"Error during text-to-speech: {e}")
         return None
 
-def get_close_vector_text(question):
+def get_close_vector_text(question, embedding=None):
     try:
-        results = vector_store.similarity_search_with_score(question, k=1)
+        with stage("vector_search"):
+            results = get_retriever(embeddings).search(question, k=1, embedding=embedding)
         current_app.logger.debug(f"Vector similarity results: {results}")
-        first_res = results[0]
-        content = first_res[0].page_content
-        source = first_res[0].metadata["source"]
-        source = source[5:]
-        if first_res[1] < 1.5:
-            return content, source
+        match = results[0]
+        source = match.source[5:]
+        # Vector matches need to be close; chunks found only by the keyword
+        # index need a strong lexical score instead.
+        if match.distance is not None and match.distance < 1.5:
+            return match.content, source
+        if match.distance is None and match.lexical_score >= LEXICAL_FAST_PATH_SCORE:
+            return match.content, source
     except Exception as e:
         current_app.logger.debug(f"Error retrieving close vector text: {e}")
         return ""
\ No newline at end of file
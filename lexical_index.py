@@ -0,0 +1,83 @@
+import re
+import json
+import math
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in into is it its me my of on or so
+that the their then there these this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of chunks.
+
+    chunks[i] is a dict with at least "content" and "source"; search results
+    refer to chunks by position.
+    """
+
+    def __init__(self, chunks, postings, doc_lengths, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+        document_count = len(doc_lengths)
+        self.idf = {
+            term: math.log(1 + (document_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, chunks, k1=1.5, b=0.75):
+        postings = defaultdict(list)
+        doc_lengths = []
+        for position, chunk in enumerate(chunks):
+            tokens = tokenize(chunk["content"])
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings[term].append((position, frequency))
+        return cls(chunks, dict(postings), doc_lengths, k1, b)
+
+    def search(self, query, k=10):
+        """Return up to k (position, score, normalized_score) tuples, best first.
+
+        normalized_score divides by the score a document would get if it
+        matched every query term with a very high frequency, so it is
+        comparable across queries (roughly 0..1).
+        """
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not terms:
+            return []
+        scores = defaultdict(float)
+        for term in terms:
+            idf = self.idf[term]
+            for position, frequency in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / self.avg_doc_length
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        max_score = sum(self.idf[term] * (self.k1 + 1) for term in terms)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(position, score, score / max_score) for position, score in ranked]
+
+    def save(self, path):
+        with open(path, "w") as index_file:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "chunks": self.chunks,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+            }, index_file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as index_file:
+            data = json.load(index_file)
+        postings = {term: [tuple(entry) for entry in docs] for term, docs in data["postings"].items()}
+        return cls(data["chunks"], postings, data["doc_lengths"], data["k1"], data["b"])
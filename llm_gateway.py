@@ -0,0 +1,274 @@
+import os
+import json
+import queue
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from langchain_core.runnables import Runnable
+from background_tasks import get_process_executor
+from metrics import record_stage, timed
+
+logger = logging.getLogger(__name__)
+
+# Budget for one call, from the moment it is made until a result is returned.
+# Keep it well under gunicorn's 120s worker timeout.
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+# Hedging sends a second, identical request when the first one is slower than
+# the recent p95 (but at least LLM_HEDGE_MIN_DELAY_SECONDS), and returns
+# whichever answers first. It costs extra tokens, so it is off by default.
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_LATENCY_WINDOW = 500
+LLM_GATEWAY_WORKERS = int(os.getenv("LLM_GATEWAY_WORKERS", "32"))
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when an LLM call does not return within its deadline."""
+
+
+def token_usage(result):
+    """(input_tokens, output_tokens) reported for a model result, or zeros."""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(result, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class GatewayStats:
+    """Counters and windows of recent latencies, shared by a gateway and its derivatives.
+
+    invoke() latencies set the hedge delay. Streams keep their time to first
+    chunk in a window of their own: their total duration includes the
+    caller's time between chunks.
+    """
+
+    def __init__(self, window=LLM_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._first_chunk_latencies = deque(maxlen=window)
+        self._counters = {
+            "calls": 0, "coalesced": 0, "hedged": 0, "hedge_wins": 0,
+            "deadline_exceeded": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0,
+        }
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def record(self, seconds, input_tokens=0, output_tokens=0):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._counters["calls"] += 1
+            self._counters["input_tokens"] += input_tokens
+            self._counters["output_tokens"] += output_tokens
+
+    def record_stream(self, first_chunk_seconds, input_tokens=0, output_tokens=0):
+        with self._lock:
+            if first_chunk_seconds is not None:
+                self._first_chunk_latencies.append(first_chunk_seconds)
+            self._counters["calls"] += 1
+            self._counters["input_tokens"] += input_tokens
+            self._counters["output_tokens"] += output_tokens
+
+    def percentile(self, fraction, min_samples=1, first_chunk=False):
+        with self._lock:
+            latencies = sorted(self._first_chunk_latencies if first_chunk else self._latencies)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counters)
+        for name, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            seconds = self.percentile(fraction)
+            snapshot[name] = round(seconds * 1000, 1) if seconds is not None else None
+        for name, fraction in (("first_chunk_p50_ms", 0.5), ("first_chunk_p95_ms", 0.95)):
+            seconds = self.percentile(fraction, first_chunk=True)
+            snapshot[name] = round(seconds * 1000, 1) if seconds is not None else None
+        return snapshot
+
+
+class SingleFlight:
+    """Lets concurrent identical calls share the first caller's result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def claim(self, key):
+        """Return (future, leader). The leader must call finish(key, ...) exactly once."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def finish(self, key, result=None, error=None):
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+def call_key(binding, input, kwargs):
+    if hasattr(input, "to_messages"):
+        input = input.to_messages()
+    if isinstance(input, list):
+        input = [(getattr(message, "type", None), getattr(message, "content", message)) for message in input]
+    payload = json.dumps([binding, input, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMGateway(Runnable):
+    """Wraps a chat model (or any Runnable) with deadlines, single-flight and hedging.
+
+    Use it wherever the model itself would be used, including in
+    ``prompt | llm`` chains. Every call gets ``deadline`` seconds and raises
+    LLMDeadlineExceeded after that, freeing the request thread even if the
+    upstream request is still running. Identical invoke() calls that overlap
+    in time are sent upstream once. Latency and token usage are recorded in
+    ``stats``.
+    """
+
+    def __init__(self, runnable, deadline=LLM_DEADLINE_SECONDS, hedging=LLM_HEDGING,
+                 stats=None, single_flight=None, binding="model",
+                 hedge_min_delay=LLM_HEDGE_MIN_DELAY_SECONDS):
+        self.runnable = runnable
+        self.deadline = deadline
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self.stats = stats or GatewayStats()
+        self.single_flight = single_flight or SingleFlight()
+        # Distinguishes derived gateways (e.g. structured output) in single-flight keys.
+        self.binding = binding
+
+    def _derive(self, runnable=None, deadline=None, binding=None):
+        return LLMGateway(
+            runnable if runnable is not None else self.runnable,
+            deadline if deadline is not None else self.deadline,
+            self.hedging, self.stats, self.single_flight,
+            binding if binding is not None else self.binding,
+            self.hedge_min_delay,
+        )
+
+    def with_deadline(self, seconds):
+        """The same gateway with a different per-call budget."""
+        return self._derive(deadline=seconds)
+
+    def with_structured_output(self, schema, **kwargs):
+        binding = f"{self.binding}|structured:{getattr(schema, '__name__', schema)}:{sorted(kwargs.items())}"
+        return self._derive(runnable=self.runnable.with_structured_output(schema, **kwargs), binding=binding)
+
+    @timed("llm")
+    def invoke(self, input, config=None, **kwargs):
+        deadline_at = time.monotonic() + self.deadline
+        key = call_key(self.binding, input, kwargs)
+        future, leader = self.single_flight.claim(key)
+        if not leader:
+            self.stats.increment("coalesced")
+            try:
+                return future.result(timeout=max(0.0, deadline_at - time.monotonic()))
+            except FutureTimeoutError:
+                self.stats.increment("deadline_exceeded")
+                raise LLMDeadlineExceeded(f"LLM call exceeded its {self.deadline:g}s deadline") from None
+        try:
+            result = self._call(input, config, kwargs, deadline_at)
+        except Exception as e:
+            self.single_flight.finish(key, error=e)
+            raise
+        self.single_flight.finish(key, result=result)
+        return result
+
+    def _call(self, input, config, kwargs, deadline_at):
+        executor = get_process_executor("llm", LLM_GATEWAY_WORKERS)
+        started = time.monotonic()
+        attempts = [executor.submit(self.runnable.invoke, input, config, **kwargs)]
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None and started + hedge_delay < deadline_at:
+            done, _ = wait(attempts, timeout=hedge_delay)
+            if not done:
+                self.stats.increment("hedged")
+                attempts.append(executor.submit(self.runnable.invoke, input, config, **kwargs))
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                self.stats.increment("deadline_exceeded")
+                raise LLMDeadlineExceeded(f"LLM call exceeded its {self.deadline:g}s deadline")
+            for attempt in done:
+                if attempt.exception() is None:
+                    if attempt is not attempts[0]:
+                        self.stats.increment("hedge_wins")
+                    result = attempt.result()
+                    self.stats.record(time.monotonic() - started, *token_usage(result))
+                    return result
+                error = attempt.exception()
+        self.stats.increment("errors")
+        raise error
+
+    def _hedge_delay(self):
+        if not self.hedging:
+            return None
+        p95 = self.stats.percentile(0.95, min_samples=LLM_HEDGE_MIN_SAMPLES)
+        if p95 is None:
+            return None
+        return max(self.hedge_min_delay, p95)
+
+    def stream(self, input, config=None, **kwargs):
+        """Stream from the wrapped model; the deadline covers the whole stream.
+
+        Streams are neither coalesced nor hedged.
+        """
+        deadline_at = time.monotonic() + self.deadline
+        chunks = queue.Queue()
+        finished = object()
+
+        def produce():
+            try:
+                for chunk in self.runnable.stream(input, config, **kwargs):
+                    chunks.put((chunk, None))
+                chunks.put((finished, None))
+            except Exception as e:
+                chunks.put((None, e))
+
+        get_process_executor("llm", LLM_GATEWAY_WORKERS).submit(produce)
+        started = time.monotonic()
+        first_chunk_seconds = None
+        input_tokens = output_tokens = 0
+        while True:
+            try:
+                chunk, error = chunks.get(timeout=max(0.0, deadline_at - time.monotonic()))
+            except queue.Empty:
+                self.stats.increment("deadline_exceeded")
+                record_stage("llm", time.monotonic() - started, error=True)
+                raise LLMDeadlineExceeded(f"LLM stream exceeded its {self.deadline:g}s deadline") from None
+            if error is not None:
+                self.stats.increment("errors")
+                record_stage("llm", time.monotonic() - started, error=True)
+                raise error
+            if chunk is finished:
+                break
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.monotonic() - started
+            # With stream_usage on, OpenAI reports usage on the last chunk.
+            chunk_input_tokens, chunk_output_tokens = token_usage(chunk)
+            input_tokens += chunk_input_tokens
+            output_tokens += chunk_output_tokens
+            yield chunk
+        self.stats.record_stream(first_chunk_seconds, input_tokens, output_tokens)
+        # Includes the time the caller spent between chunks, e.g. sending them on.
+        record_stage("llm", time.monotonic() - started)
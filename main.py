@@ -1,22 +1,34 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv, find_dotenv
 from openai import OpenAI
 import logging
-import redis
 import azure.cognitiveservices.speech as speechsdk
 import psycopg2
-from psycopg2 import sql
 from authentication.auth_routes import auth_bp
 from services.quiz import start_quiz, handle_quiz_answer
+from services.quiz_session import has_session as has_quiz_session
 from services.quiz_analysis import quiz_analysis_bp
-from config.db_config import get_db_connection
+from services.cohort_analytics import cohort_analytics_bp, get_cohort_cache_stats
+from config.db_config import db_connection, get_pool_stats
+from config.redis_config import get_redis_client
+from services.flags import (search_flagged_messages, parse_date_bound, review_flag, get_flag_stats,
+                            SEARCH_MODES, FLAGS_PAGE_SIZE, FLAGS_MAX_PAGE_SIZE)
+from pagination import parse_limit, parse_seq_cursor
 from cms import cms
+from llm_gateway import LLMGateway, LLMDeadlineExceeded, LLM_DEADLINE_SECONDS
+from background_tasks import get_background_stats
+from services.answer_checker import get_answer_checker_stats
+from semantic_cache import get_semantic_cache_stats
+import metrics
 
-from helpers import speech_to_text, get_answer_from_question, text_to_speech
-from chat_history_helpers import get_chatid_from_database, get_all_user_history, get_history_of_chat_id
+from helpers import speech_to_text, get_answer_from_question, stream_answer_from_question, text_to_speech, embeddings
+from response_stream import format_sse
+from chat_history_helpers import (get_chatid_from_database, get_all_user_history, get_history_of_chat_id,
+                                  CHAT_LIST_PAGE_SIZE, CHAT_LIST_MAX_PAGE_SIZE,
+                                  CHAT_TRANSCRIPT_PAGE_SIZE, CHAT_TRANSCRIPT_MAX_PAGE_SIZE)
 
 
 
@@ -34,35 +46,59 @@ app.logger.setLevel(logging.DEBUG)
 logging.debug("Starting the server Debug")
 app.logger.debug("Starting the server using Flask app logger Debug")
 app.register_blueprint(quiz_analysis_bp)
+app.register_blueprint(cohort_analytics_bp)
 app.register_blueprint(cms, url_prefix='/api')
 
-redis_host = os.getenv("REDISHOST", "localhost")
-redis_port = os.getenv("REDISPORT", 6379)
-redis_user = os.getenv("REDISUSER", None)
-redis_password = os.getenv("REDISPASSWORD", None)
-redis_url = os.getenv("REDIS_URL", None)
-
 user_messages = {}
 
-# Connect to Redis using the environment variables
-if redis_url:
-    redis_client = redis.StrictRedis.from_url(redis_url)
-else:
-    redis_client = redis.StrictRedis(host=redis_host, port=redis_port, db=0)
+redis_client = get_redis_client()
 
 CORS(app, resources={
     r"/*": {  # This will cover all routes
         "origins": ["http://localhost:3000"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Next-Cursor", "Server-Timing"]
     }
 })
 
 app.register_blueprint(auth_bp)
 
 client = OpenAI()
-llm = ChatOpenAI(api_key=os.environ.get("OPENAI_API_KEY"),
-                 model=os.environ.get("OPENAI_MODEL_NAME"))
+# Every LLM call goes through the gateway: deadlines, single-flight, hedging
+# and latency/token stats. The client timeout stops abandoned requests too.
+llm = LLMGateway(ChatOpenAI(api_key=os.environ.get("OPENAI_API_KEY"),
+                            model=os.environ.get("OPENAI_MODEL_NAME"),
+                            timeout=LLM_DEADLINE_SECONDS,
+                            stream_usage=True))
+
+# Stage timings per endpoint at /metrics (Prometheus text format), added up
+# across workers through Redis. The gauges below are read at scrape time.
+metrics.init_app(app, redis_client)
+
+
+def stats_samples(prefix, stats, gauges=()):
+    samples = []
+    for name, value in stats.items():
+        if name in gauges:
+            samples.append((f"{prefix}_{name}", "gauge", {}, value))
+        # Maxima and percentiles cannot be added up across workers.
+        elif value is not None and not name.endswith(("_max", "_ms")):
+            samples.append((f"{prefix}_{name.removesuffix('_total')}_total", "counter", {}, value))
+    return samples
+
+
+def collect_service_metrics():
+    return (stats_samples("questloft_db_pool", get_pool_stats(), gauges=("in_use", "idle", "max_size"))
+            + stats_samples("questloft_background_tasks", get_background_stats(), gauges=("queued",))
+            + stats_samples("questloft_llm", llm.stats.snapshot())
+            + stats_samples("questloft_embedding_cache", embeddings.stats)
+            + stats_samples("questloft_answer_checker", get_answer_checker_stats())
+            + stats_samples("questloft_semantic_cache", get_semantic_cache_stats())
+            + stats_samples("questloft_cohort_cache", get_cohort_cache_stats()))
+
+
+metrics.register_collector(collect_service_metrics)
 
 # For text to speech  ---------------------------
 UPLOAD_FOLDER = './uploads'
@@ -77,6 +113,11 @@ file_config = speechsdk.audio.AudioOutputConfig(filename=file_name)
 speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=file_config)
 # ------------------------------------------------
 
+@app.errorhandler(LLMDeadlineExceeded)
+def handle_llm_deadline(e):
+    app.logger.warning(f"LLM deadline exceeded on {request.path}: {e}")
+    return jsonify({'error': 'The assistant took too long to answer. Please try again.'}), 504
+
 @app.route('/', methods=['GET'])
 def get_status():
     return "Server Running", 200
@@ -84,48 +125,88 @@ def get_status():
 @app.route('/flags', methods=['GET'])
 def get_flagged_messages_api():
     search_term = request.args.get('search', None)
-    connection = get_db_connection()
+    mode = request.args.get('mode', 'substring')
     try:
-        cursor = connection.cursor()
-        if search_term:
-            query = sql.SQL("""
-                SELECT auth0_user_id, message, timestamp
-                FROM flags
-                WHERE auth0_user_id ILIKE %s OR message ILIKE %s OR CAST(timestamp AS TEXT) ILIKE %s
-                ORDER BY timestamp DESC;
-            """)
-            cursor.execute(query, (f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"))
-        else:
-            cursor.execute("""
-                SELECT auth0_user_id, message, timestamp
-                FROM flags
-                ORDER BY timestamp DESC;
-            """)
-        flagged_messages = cursor.fetchall()
-        cursor.close()
+        start = parse_date_bound(request.args.get('from'))
+        end = parse_date_bound(request.args.get('to'), end_of_range=True)
+        limit = parse_limit(request.args.get('limit'), FLAGS_PAGE_SIZE, FLAGS_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f'Invalid search mode: {mode}'}), 400
+
+    try:
+        flagged_messages, next_cursor = search_flagged_messages(
+            search_term, mode, start, end, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error retrieving flagged messages: {e}")
         return jsonify({'error': 'Unable to retrieve flagged messages.'}), 500
-    finally:
-        connection.close()
     result = [
-        {"email": row[0], "message": row[1], "timestamp": row[2].strftime("%Y-%m-%d %H:%M:%S")}
+        {
+            "id": row[0],
+            "email": row[1],
+            "message": row[2],
+            "timestamp": row[3].strftime("%Y-%m-%d %H:%M:%S"),
+            "source": row[4],
+            "matched_term": row[5],
+            "false_positive": row[6],
+        }
         for row in flagged_messages
     ]
-    return jsonify(result), 200
+    response = jsonify(result)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@app.route('/flags/<int:flag_id>/review', methods=['PUT'])
+def review_flagged_message(flag_id):
+    data = request.get_json(silent=True) or {}
+    false_positive = data.get('false_positive')
+    if not isinstance(false_positive, bool):
+        return jsonify({'error': 'false_positive must be true or false.'}), 400
+    try:
+        found = review_flag(flag_id, false_positive)
+    except Exception as e:
+        print(f"Error reviewing flagged message: {e}")
+        return jsonify({'error': 'Unable to review flagged message.'}), 500
+    if not found:
+        return jsonify({'error': 'Flag not found'}), 404
+    return jsonify({'id': flag_id, 'false_positive': false_positive}), 200
+
+@app.route('/flags/stats', methods=['GET'])
+def get_flag_stats_api():
+    try:
+        return jsonify(get_flag_stats()), 200
+    except Exception as e:
+        print(f"Error retrieving flag stats: {e}")
+        return jsonify({'error': 'Unable to retrieve flag stats.'}), 500
 
 @app.route('/chat/history', methods=['GET'])
 def get_chat_history_for_user():
     user_email = request.args.get('userEmail')
-    chat_histories = get_all_user_history(user_email)
-    result = chat_histories
-    return jsonify(result), 200
+    try:
+        limit = parse_limit(request.args.get('limit'), CHAT_LIST_PAGE_SIZE, CHAT_LIST_MAX_PAGE_SIZE)
+        chat_histories, next_cursor = get_all_user_history(user_email, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    response = jsonify(chat_histories)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
 
-@app.route('/chat/history/<chat_id>', methods=["GET"])
+@app.route('/chat/history/<int:chat_id>', methods=["GET"])
 def get_chat_history_for_chat_id(chat_id):
-    chat_history = get_history_of_chat_id(chat_id)
-    result = chat_history
-    return jsonify(result), 200
+    try:
+        limit = parse_limit(request.args.get('limit'), CHAT_TRANSCRIPT_PAGE_SIZE, CHAT_TRANSCRIPT_MAX_PAGE_SIZE)
+        before = parse_seq_cursor(request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    chat_history = get_history_of_chat_id(chat_id, before, limit)
+    if chat_history is None:
+        return jsonify({'error': 'Chat not found'}), 404
+    return jsonify(chat_history), 200
 
 @app.route('/chat/text', methods=['POST'])
 def chat_text():
@@ -136,48 +217,42 @@ def chat_text():
     user_id = "12345" # Need to modify it later
     chat_id = data.get('chat_id')
     chat_id_exists = bool(chat_id)
-    if not chat_id:
-        chat_id = get_chatid_from_database(user_email)
 
     if not user_id:
         return jsonify({'error': 'User ID is required.'}), 400
 
-    connection = get_db_connection()
-    cursor = connection.cursor()
-    cursor.execute("SELECT user_role FROM Users WHERE UserID = %s", (user_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    connection.close()
-    if result:
-        user_role = result[0]
-    else:
-        user_role = None
-
     if user_message.strip() == "/quiz":
         print("User started a quiz")
+        # Only starting a quiz depends on the role, so chat turns skip this lookup.
+        with db_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT u.user_role, s.Grade
+                FROM Users u
+                LEFT JOIN Students s ON s.UserID = u.UserID
+                WHERE u.UserID = %s
+                LIMIT 1
+            """, (user_id,))
+            result = cursor.fetchone()
+            cursor.close()
+        user_role, grade = result if result else (None, None)
         if user_role != "Student":
             return jsonify({'error': 'Only students can start a quiz.'}), 403
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT Grade FROM Students WHERE UserID = %s", (user_id,))
-        result = cursor.fetchone()
-        cursor.close()
-        connection.close()
-        if result:
-            grade = result[0]
+        if grade is not None:
             question = start_quiz(user_id, grade, llm,redis_client)
             return jsonify({"reply": question}), 200
         else:
             return jsonify({'error': 'Student grade not found.'}), 404
     else:
-        session_data = redis_client.get(user_id)
-
-        if session_data:
-            # Handle quiz answer
-            reply = handle_quiz_answer(user_id, user_message,llm,redis_client)
+        # Answers the quiz in progress, if any, in the same Redis round trip.
+        reply = handle_quiz_answer(user_id, user_message,llm,redis_client)
+        if reply is not None:
             return jsonify({"reply": reply}), 200
         else:
+            if not chat_id:
+                chat_id = get_chatid_from_database(user_email)
             answer = "Unable to get answers"
+            chat_history = ""
             if user_message:
                 answer, chat_history = get_answer_from_question(llm, user_message, chat_id, user_email)
             response = {"reply": answer, "chat_history": chat_history}
@@ -185,6 +260,41 @@ def chat_text():
                 response["chat_id"] = chat_id
             return jsonify(response), 200
 
+@app.route('/chat/text/stream', methods=['POST'])
+def chat_text_stream():
+    """Same request as /chat/text, answered as server-sent events.
+
+    Events: "chat" (only for a new chat, carries chat_id), "token" (a piece
+    of the reply), then "done" (the full reply, ttft_ms and total_ms) or
+    "error". Quiz messages are answered with the plain /chat/text JSON.
+    """
+    data = request.get_json()
+    user_message = data.get('userMessage')
+    user_email = data.get('userEmail')
+    user_id = "12345" # Need to modify it later
+    if not user_message:
+        return jsonify({'error': 'userMessage is required.'}), 400
+    if user_message.strip() == "/quiz" or has_quiz_session(redis_client, user_id):
+        return chat_text()
+
+    chat_id = data.get('chat_id')
+    chat_id_exists = bool(chat_id)
+    if not chat_id:
+        chat_id = get_chatid_from_database(user_email)
+
+    def events():
+        if not chat_id_exists:
+            yield format_sse("chat", {"chat_id": chat_id})
+        try:
+            for event, payload in stream_answer_from_question(llm, user_message, chat_id, user_email):
+                yield format_sse(event, payload)
+        except Exception as e:
+            app.logger.error(f"Streaming reply failed for chat {chat_id}: {e}")
+            yield format_sse("error", {"error": "Unable to get answers"})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/chat/voice', methods=['POST'])
 def chat_voice():
     if 'file' not in request.files:
@@ -201,7 +311,7 @@ def chat_voice():
     try:        
         converted_text = speech_to_text(client=client, audio_file = ('audio.wav', audio_file, 'audio/wav'))
         if converted_text and len(converted_text) > 5:
-            answer = get_answer_from_question(llm, converted_text, chat_id, user_email)
+            answer, _ = get_answer_from_question(llm, converted_text, chat_id, user_email)
         # Use this to test the frontend, to have a sample response without using whisper
         # answer = "Take this sample message to make the UI"
         # converted_text = "hello there"
@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+import redis
+from flask import Response, request
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Adds a Server-Timing header with the stages of each request (visible in the
+# browser's network panel). Off by default: it reveals internal timings.
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() == "true"
+# Each worker publishes its metrics to Redis this often, so /metrics (served
+# by whichever worker gets the scrape) can add up every worker.
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_KEY_PREFIX = "metrics:worker:"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "questloft_http_requests_total": ("counter", "HTTP requests by endpoint, blueprint, method and status."),
+    "questloft_http_request_duration_seconds": ("histogram", "HTTP request duration, including streamed bodies."),
+    "questloft_stage_duration_seconds": ("histogram", "Duration of one stage of request handling."),
+    "questloft_stage_errors_total": ("counter", "Stages that raised an exception."),
+}
+
+# Labels of the request being handled, and the Server-Timing entries it has
+# collected. Copied into background tasks (see background_tasks.with_app_context),
+# so deferred work is attributed to the endpoint that queued it.
+_request_labels = contextvars.ContextVar("metrics_request_labels", default=None)
+_request_timings = contextvars.ContextVar("metrics_request_timings", default=None)
+
+
+class Registry:
+    """Counters and histograms of one process, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, seconds):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def snapshot(self):
+        """A JSON-serializable copy; bucket counts are per bucket, not cumulative."""
+        with self._lock:
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [
+                    [name, list(labels), list(buckets), total, count]
+                    for (name, labels), (buckets, total, count) in self._histograms.items()
+                ],
+            }
+
+
+_registry = Registry()
+_registry_pid = os.getpid()
+_registry_lock = threading.Lock()
+_collectors = []
+
+
+def get_registry():
+    global _registry, _registry_pid
+    # Counts inherited across fork() belong to the parent; start from zero and
+    # start this process's flusher thread.
+    if _registry_pid != os.getpid():
+        with _registry_lock:
+            if _registry_pid != os.getpid():
+                _registry = Registry()
+                _registry_pid = os.getpid()
+                _flusher_started.clear()
+    _start_flusher()
+    return _registry
+
+
+def register_collector(collector):
+    """Add a function returning (name, type, labels, value) samples, read at flush and scrape time.
+
+    Samples from each worker are summed, so collectors should report totals
+    (in-use connections, tokens used), not averages or percentiles.
+    """
+    _collectors.append(collector)
+
+
+def current_labels():
+    labels = _request_labels.get()
+    if labels is not None:
+        return labels
+    return {"endpoint": "background", "blueprint": "none"}
+
+
+def record_stage(stage_name, seconds, error=False):
+    if not METRICS_ENABLED:
+        return
+    labels = dict(current_labels(), stage=stage_name)
+    registry = get_registry()
+    registry.observe("questloft_stage_duration_seconds", labels, seconds)
+    if error:
+        registry.inc("questloft_stage_errors_total", labels)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage_name, seconds))
+
+
+@contextmanager
+def stage(stage_name):
+    """Time the enclosed block as one stage of the current request."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_stage(stage_name, time.perf_counter() - started, error)
+
+
+def timed(stage_name):
+    """Decorator form of stage()."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def blueprint_label(blueprint):
+    if not blueprint:
+        return "main"
+    return blueprint[:-3] if blueprint.endswith("_bp") else blueprint
+
+
+def _before_request():
+    rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    _request_labels.set({"endpoint": rule, "blueprint": blueprint_label(request.blueprint)})
+    _request_timings.set([])
+    request.environ["metrics.started"] = time.perf_counter()
+
+
+def _after_request(response):
+    labels = _request_labels.get()
+    started = request.environ.get("metrics.started")
+    if labels is None or started is None:
+        return response
+    method = request.method
+    status = str(response.status_code)
+
+    def record_request():
+        registry = get_registry()
+        registry.inc("questloft_http_requests_total", dict(labels, method=method, status=status))
+        registry.observe("questloft_http_request_duration_seconds", labels, time.perf_counter() - started)
+
+    # Runs once the body has been sent, so streamed responses count in full.
+    response.call_on_close(record_request)
+
+    if METRICS_SERVER_TIMING:
+        totals = {}
+        for stage_name, seconds in _request_timings.get() or []:
+            totals[stage_name] = totals.get(stage_name, 0.0) + seconds
+        totals["app"] = time.perf_counter() - started
+        response.headers["Server-Timing"] = ", ".join(
+            f"{stage_name};dur={seconds * 1000:.1f}" for stage_name, seconds in totals.items()
+        )
+    return response
+
+
+def collect_samples():
+    samples = []
+    for collector in _collectors:
+        try:
+            samples.extend(collector())
+        except Exception as e:
+            logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+    return [[name, kind, sorted(labels.items()), value] for name, kind, labels, value in samples]
+
+
+def worker_snapshot():
+    snapshot = get_registry().snapshot()
+    snapshot["samples"] = collect_samples()
+    return snapshot
+
+
+_flusher_started = threading.Event()
+_redis_client = None
+
+
+def _worker_key():
+    return f"{METRICS_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            _redis_client.set(_worker_key(), json.dumps(worker_snapshot()), ex=int(METRICS_FLUSH_SECONDS * 3) + 1)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to publish metrics: {e}")
+
+
+def _start_flusher():
+    if _redis_client is None or _flusher_started.is_set():
+        return
+    with _registry_lock:
+        if not _flusher_started.is_set():
+            _flusher_started.set()
+            threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+
+
+def merge_snapshots(snapshots):
+    counters, histograms, samples = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+        for name, kind, labels, value in snapshot.get("samples", []):
+            key = (name, kind, tuple(map(tuple, labels)))
+            samples[key] = samples.get(key, 0) + value
+    return counters, histograms, samples
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def render(counters, histograms, samples):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    families = {}
+    for (name, labels), value in sorted(counters.items()):
+        families.setdefault((name, "counter"), []).append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        family = families.setdefault((name, "histogram"), [])
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+            cumulative += bucket
+            family.append(f"{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+        family.append(f'{name}_bucket{format_labels(labels, le="+Inf")} {count}')
+        family.append(f"{name}_sum{format_labels(labels)} {total}")
+        family.append(f"{name}_count{format_labels(labels)} {count}")
+    for (name, kind, labels), value in sorted(samples.items()):
+        families.setdefault((name, kind), []).append(f"{name}{format_labels(labels)} {value}")
+    for (name, kind), family in sorted(families.items()):
+        help_text = HELP.get(name, (kind, name.replace("_", " ")))[1]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(family)
+    return "\n".join(lines) + "\n"
+
+
+def metrics_endpoint():
+    snapshots = [worker_snapshot()]
+    own_key = _worker_key()
+    if _redis_client is not None:
+        try:
+            keys = [key for key in _redis_client.scan_iter(match=f"{METRICS_KEY_PREFIX}*", count=100)
+                    if (key.decode() if isinstance(key, bytes) else key) != own_key]
+            for raw in _redis_client.mget(keys) if keys else []:
+                if raw:
+                    snapshots.append(json.loads(raw))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to read worker metrics, serving this worker only: {e}")
+    return Response(render(*merge_snapshots(snapshots)), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app, redis_client=None):
+    """Time every request and serve GET /metrics. Pass redis_client to add up all workers."""
+    global _redis_client
+    if not METRICS_ENABLED:
+        return
+    _redis_client = redis_client
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint, methods=["GET"])
@@ -0,0 +1,21 @@
+-- Columns and tables the application code already reads and writes.
+
+-- chat_history_helpers.update_user_history / get_all_user_history
+ALTER TABLE chathistories ADD COLUMN IF NOT EXISTS last_message_time TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP;
+
+-- helpers.add_flagged_message writes auth0_user_id and never sets email.
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS auth0_user_id VARCHAR(255);
+ALTER TABLE flags ALTER COLUMN email DROP NOT NULL;
+UPDATE flags SET auth0_user_id = email WHERE auth0_user_id IS NULL;
+
+-- authentication/auth_routes.request_admin_approval / list_approvals
+ALTER TABLE Students ADD COLUMN IF NOT EXISTS School VARCHAR(255);
+ALTER TABLE Parents ADD COLUMN IF NOT EXISTS ChildEmail VARCHAR(255);
+
+CREATE TABLE IF NOT EXISTS Teachers (
+  TeacherID SERIAL PRIMARY KEY,
+  UserID INT,
+  School VARCHAR(255),
+  Expertise VARCHAR(255),
+  FOREIGN KEY (UserID) REFERENCES Users(UserID) ON DELETE CASCADE
+);
@@ -0,0 +1,27 @@
+-- Secondary indexes for the queries on the request path.
+
+-- get_all_user_history: WHERE Username = ? ORDER BY last_message_time DESC LIMIT 10
+CREATE INDEX IF NOT EXISTS idx_chathistories_username_last_message
+    ON chathistories (Username, last_message_time DESC);
+
+-- quiz_analysis: WHERE userid = ? [ORDER BY testdate]
+CREATE INDEX IF NOT EXISTS idx_testscores_userid_testdate
+    ON TestScores (UserID, TestDate);
+
+-- auth_routes: lookups and updates by auth0_user_id. Not UNIQUE because
+-- existing deployments may already hold duplicates.
+CREATE INDEX IF NOT EXISTS idx_users_auth0_user_id
+    ON Users (auth0_user_id);
+
+-- list_approvals: WHERE is_approved = FALSE, a small and shrinking subset.
+CREATE INDEX IF NOT EXISTS idx_users_pending_approval
+    ON Users (UserID) WHERE is_approved = FALSE;
+
+-- list_approvals joins and the per-user role/grade lookups.
+CREATE INDEX IF NOT EXISTS idx_students_userid ON Students (UserID);
+CREATE INDEX IF NOT EXISTS idx_teachers_userid ON Teachers (UserID);
+CREATE INDEX IF NOT EXISTS idx_parents_userid ON Parents (UserID);
+
+-- /flags: ORDER BY timestamp DESC
+CREATE INDEX IF NOT EXISTS idx_flags_timestamp
+    ON flags (timestamp DESC);
@@ -0,0 +1,20 @@
+-- Indexed search and keyset pagination for GET /flags.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Substring search (ILIKE '%term%') on message and user id.
+CREATE INDEX IF NOT EXISTS idx_flags_message_trgm
+    ON flags USING GIN (message gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_flags_auth0_user_id_trgm
+    ON flags USING GIN (auth0_user_id gin_trgm_ops);
+
+-- Word search (mode=fulltext).
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS message_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(message, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_flags_message_tsv
+    ON flags USING GIN (message_tsv);
+
+-- Stable sort for keyset pagination; supersedes idx_flags_timestamp.
+CREATE INDEX IF NOT EXISTS idx_flags_timestamp_id
+    ON flags (timestamp DESC, id DESC);
+DROP INDEX IF EXISTS idx_flags_timestamp;
@@ -0,0 +1,40 @@
+-- One row per chat message instead of a JSON blob rewritten on every turn.
+
+ALTER TABLE chathistories ADD COLUMN IF NOT EXISTS message_count INT NOT NULL DEFAULT 0;
+ALTER TABLE chathistories ALTER COLUMN ChatHistory DROP NOT NULL;
+
+CREATE TABLE IF NOT EXISTS chatmessages (
+    ChatID INT NOT NULL,
+    Seq INT NOT NULL,
+    Role VARCHAR(16) NOT NULL,
+    Content TEXT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ChatID, Seq),
+    FOREIGN KEY (ChatID) REFERENCES chathistories(ChatID) ON DELETE CASCADE
+);
+
+-- Backfill from the serialized histories written by the old code:
+-- [{"type": "HumanMessage" | "AIMessage", "content": "..."}, ...]
+INSERT INTO chatmessages (ChatID, Seq, Role, Content, created_at)
+SELECT
+    c.ChatID,
+    m.ordinality - 1,
+    CASE m.value->>'type' WHEN 'HumanMessage' THEN 'human' ELSE 'ai' END,
+    COALESCE(m.value->>'content', ''),
+    COALESCE(c.last_message_time, CURRENT_TIMESTAMP)
+FROM chathistories c
+CROSS JOIN LATERAL jsonb_array_elements(c.ChatHistory::jsonb) WITH ORDINALITY AS m(value, ordinality)
+WHERE c.ChatHistory LIKE '[%'
+ON CONFLICT (ChatID, Seq) DO NOTHING;
+
+UPDATE chathistories c
+SET message_count = counts.message_count
+FROM (
+    SELECT ChatID, MAX(Seq) + 1 AS message_count
+    FROM chatmessages
+    GROUP BY ChatID
+) counts
+WHERE c.ChatID = counts.ChatID;
+
+-- The ChatHistory column is no longer written; it is kept until the new
+-- storage has been verified in production and can be dropped later.
@@ -0,0 +1,6 @@
+-- Rolling summary of the older part of long chats (see context_window.py).
+-- summary_upto is the number of leading messages (seq < summary_upto) folded
+-- into summary.
+
+ALTER TABLE chathistories ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE chathistories ADD COLUMN IF NOT EXISTS summary_upto INT NOT NULL DEFAULT 0;
@@ -0,0 +1,32 @@
+-- Per-chat fields for the /chat/history sidebar list, maintained on write by
+-- chat_history_helpers.append_chat_messages.
+
+ALTER TABLE chathistories ADD COLUMN IF NOT EXISTS title VARCHAR(200);
+ALTER TABLE chathistories ADD COLUMN IF NOT EXISTS last_message_preview VARCHAR(300);
+
+UPDATE chathistories c
+SET title = LEFT(first_question.content, 80)
+FROM (
+    SELECT DISTINCT ON (ChatID) ChatID, Content
+    FROM chatmessages
+    WHERE Role = 'human'
+    ORDER BY ChatID, Seq
+) first_question
+WHERE c.ChatID = first_question.ChatID AND c.title IS NULL;
+
+UPDATE chathistories c
+SET last_message_preview = LEFT(last_message.content, 200)
+FROM (
+    SELECT DISTINCT ON (ChatID) ChatID, Content
+    FROM chatmessages
+    ORDER BY ChatID, Seq DESC
+) last_message
+WHERE c.ChatID = last_message.ChatID AND c.last_message_preview IS NULL;
+
+-- Keyset pagination sorts on (last_message_time, ChatID), which must not be NULL.
+UPDATE chathistories SET last_message_time = CURRENT_TIMESTAMP WHERE last_message_time IS NULL;
+ALTER TABLE chathistories ALTER COLUMN last_message_time SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_chathistories_username_last_message_chatid
+    ON chathistories (Username, last_message_time DESC, ChatID DESC);
+DROP INDEX IF EXISTS idx_chathistories_username_last_message;
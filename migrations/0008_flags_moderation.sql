@@ -0,0 +1,10 @@
+-- Where each flag came from and how a reviewer judged it, so the local
+-- pre-filter (moderation.py) can be measured against the LLM's own check.
+
+-- 'llm' (is_unsafe_for_k_12_children) or 'prefilter' (config/moderation_terms.txt).
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS source VARCHAR(16) NOT NULL DEFAULT 'llm';
+-- The term-list entry that matched, for prefilter flags.
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS matched_term VARCHAR(100);
+-- NULL until reviewed; TRUE when the message was not actually unsafe.
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS false_positive BOOLEAN;
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS reviewed_at TIMESTAMP;
@@ -0,0 +1,26 @@
+-- Pre-generated quiz questions per grade (see services/question_bank.py), so
+-- starting a quiz is one query instead of an LLM generation.
+
+CREATE TABLE IF NOT EXISTS quizquestions (
+    id SERIAL PRIMARY KEY,
+    grade VARCHAR(10) NOT NULL,
+    topic VARCHAR(100) NOT NULL DEFAULT 'general',
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    -- sha256 of the normalised question text; duplicates are dropped on insert.
+    question_hash CHAR(64) NOT NULL,
+    usage_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (grade, question_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_quizquestions_grade_usage
+    ON quizquestions (grade, usage_count);
+
+-- Which questions each student has been given, so quizzes avoid repeats.
+CREATE TABLE IF NOT EXISTS quizquestionusage (
+    userid INT NOT NULL,
+    questionid INT NOT NULL REFERENCES quizquestions (id) ON DELETE CASCADE,
+    used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (userid, questionid)
+);
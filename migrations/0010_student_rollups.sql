@@ -0,0 +1,28 @@
+-- Per-student totals over TestScores (see services/student_rollups.py), kept
+-- up to date in the same transaction as each new score so the analytics
+-- endpoints read one row instead of aggregating every test.
+-- The average score is score_total / test_count.
+
+CREATE TABLE IF NOT EXISTS studentrollups (
+    UserID INT PRIMARY KEY,
+    test_count INT NOT NULL DEFAULT 0,
+    correct_total BIGINT NOT NULL DEFAULT 0,
+    incorrect_total BIGINT NOT NULL DEFAULT 0,
+    score_total BIGINT NOT NULL DEFAULT 0,
+    best_score INT,
+    worst_score INT,
+    last_test_date TIMESTAMP WITHOUT TIME ZONE,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (UserID) REFERENCES Users(UserID) ON DELETE CASCADE
+);
+
+-- Backfill from the scores stored so far; python -m migrations.rebuild_rollups
+-- does the same on demand.
+INSERT INTO studentrollups (UserID, test_count, correct_total, incorrect_total, score_total,
+                            best_score, worst_score, last_test_date)
+SELECT UserID, COUNT(*), COALESCE(SUM(CorrectAnswers), 0), COALESCE(SUM(IncorrectAnswers), 0),
+       COALESCE(SUM(Score), 0), MAX(Score), MIN(Score), MAX(TestDate)
+FROM TestScores
+WHERE UserID IS NOT NULL
+GROUP BY UserID
+ON CONFLICT (UserID) DO NOTHING;
@@ -0,0 +1,17 @@
+-- Cohort analytics (see services/cohort_analytics.py): find a grade's or a
+-- school's students without scanning Students, and tell from the rollups
+-- whether a cohort has new tests since its cached result.
+
+CREATE INDEX IF NOT EXISTS idx_students_grade_userid ON Students (Grade, UserID);
+CREATE INDEX IF NOT EXISTS idx_students_school_userid ON Students (School, UserID);
+
+ALTER TABLE studentrollups ADD COLUMN IF NOT EXISTS last_testid INT;
+
+UPDATE studentrollups r
+SET last_testid = latest.last_testid
+FROM (
+    SELECT UserID, MAX(TestID) AS last_testid
+    FROM TestScores
+    GROUP BY UserID
+) latest
+WHERE r.UserID = latest.UserID;
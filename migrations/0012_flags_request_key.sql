@@ -0,0 +1,8 @@
+-- Flags are written in the background and retried on failure; a retry after
+-- a commit whose acknowledgement was lost must not insert the flag twice.
+-- Each flag carries a key chosen before the first attempt. Rows written
+-- before this migration have none, which the unique index allows.
+
+ALTER TABLE flags ADD COLUMN IF NOT EXISTS request_key UUID;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_flags_request_key ON flags (request_key);
@@ -0,0 +1,108 @@
+"""Check that the request-path queries are served by an index.
+
+Usage (from the repository root, after running migrations):
+    python -m migrations.check_indexes
+
+Every query below mirrors one issued by an endpoint. It is EXPLAINed with
+sequential scans disabled for the transaction, so the check is meaningful on
+small development databases where the planner would otherwise prefer a seq
+scan anyway: if a Seq Scan still shows up, no usable index exists. Exits
+non-zero when any query falls back to a sequential scan.
+"""
+import sys
+import logging
+from config.db_config import db_connection
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (endpoint, SQL, parameters)
+ENDPOINT_QUERIES = [
+    ("GET /chat/history",
+     "SELECT chatid, title, last_message_preview, message_count, last_message_time FROM chathistories "
+     "WHERE Username = %s ORDER BY last_message_time DESC, chatid DESC LIMIT 11",
+     ("student@example.com",)),
+    ("POST /chat/text (history window)",
+     "SELECT seq, role, content FROM chatmessages WHERE chatid = %s ORDER BY seq DESC LIMIT 50",
+     (1,)),
+    ("GET /users/<userid>/testscores",
+     "SELECT * FROM testscores WHERE userid = %s",
+     (12345,)),
+    ("GET /users/<userid>/scores_over_time",
+     "SELECT testdate, score FROM testscores WHERE userid = %s ORDER BY testdate ASC",
+     (12345,)),
+    ("GET /users/<userid>/summary",
+     "SELECT test_count, correct_total, incorrect_total FROM studentrollups WHERE userid = %s",
+     (12345,)),
+    ("GET /cohorts/summary (cohort version)",
+     "SELECT MAX(r.last_testid), SUM(r.test_count) FROM studentrollups r "
+     "WHERE r.UserID IN (SELECT DISTINCT UserID FROM Students WHERE UserID IS NOT NULL AND Grade = %s)",
+     ("5",)),
+    ("GET /cohorts/summary?school=",
+     "SELECT t.UserID, t.TestDate, t.Score FROM TestScores t "
+     "JOIN (SELECT DISTINCT UserID FROM Students WHERE UserID IS NOT NULL AND School = %s) m ON m.UserID = t.UserID",
+     ("Sample School",)),
+    ("POST /chat/text (quiz start)",
+     "SELECT q.id FROM quizquestions q "
+     "LEFT JOIN quizquestionusage u ON u.questionid = q.id AND u.userid = %s "
+     "WHERE q.grade = %s",
+     (12345, "5")),
+    ("GET /users/<userid>/dashboard",
+     "SELECT testid, score, totalquestions, correctanswers, incorrectanswers, testdate FROM testscores "
+     "WHERE userid = %s ORDER BY testdate ASC, testid ASC",
+     (12345,)),
+    ("GET /auth/validateUser",
+     "SELECT is_approved, user_role FROM users WHERE auth0_user_id = %s",
+     ("auth0|sample_user_12345",)),
+    ("GET /auth/listApprovals",
+     "SELECT u.auth0_user_id FROM users u "
+     "LEFT JOIN students s ON u.UserID = s.UserID "
+     "LEFT JOIN teachers t ON u.UserID = t.UserID "
+     "LEFT JOIN parents p ON u.UserID = p.UserID "
+     "WHERE u.is_approved = FALSE",
+     ()),
+    ("GET /flags",
+     "SELECT id, auth0_user_id, message, timestamp, source, matched_term, false_positive FROM flags "
+     "ORDER BY timestamp DESC, id DESC LIMIT 51",
+     ()),
+    ("GET /flags?search=",
+     "SELECT id FROM flags WHERE (auth0_user_id ILIKE %s OR message ILIKE %s) "
+     "ORDER BY timestamp DESC, id DESC LIMIT 51",
+     ("%arduino%", "%arduino%")),
+    ("GET /flags?mode=fulltext&search=",
+     "SELECT id FROM flags WHERE message_tsv @@ websearch_to_tsquery('english', %s) "
+     "ORDER BY timestamp DESC, id DESC LIMIT 51",
+     ("arduino",)),
+]
+
+
+def find_seq_scans(plan):
+    """Return the relation names scanned sequentially anywhere in a plan tree."""
+    scans = []
+    if plan.get("Node Type") == "Seq Scan":
+        scans.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        scans.extend(find_seq_scans(child))
+    return scans
+
+
+def check_queries(queries=ENDPOINT_QUERIES):
+    failures = []
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            for endpoint, query, params in queries:
+                cursor.execute("SET LOCAL enable_seqscan = off;")
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cursor.fetchone()[0][0]["Plan"]
+                seq_scans = find_seq_scans(plan)
+                if seq_scans:
+                    failures.append((endpoint, seq_scans))
+                    logger.error(f"{endpoint}: sequential scan on {', '.join(seq_scans)}")
+                else:
+                    logger.info(f"{endpoint}: index scan")
+                connection.rollback()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check_queries() else 0)
@@ -0,0 +1,111 @@
+"""Apply the numbered SQL files in this directory in order.
+
+Usage (from the repository root):
+    python -m migrations.migrate            # apply pending migrations
+    python -m migrations.migrate --status   # list applied and pending ones
+
+Each file NNNN_name.sql runs in its own transaction and is recorded in the
+schema_version table, so running the command again is a no-op.
+"""
+import os
+import re
+import sys
+import logging
+from config.db_config import db_connection
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_([\w-]+)\.sql$")
+# Arbitrary constant shared by every process running migrations.
+MIGRATION_LOCK_ID = 4815162342
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for file_name in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, file_name)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version numbers found.")
+    return migrations
+
+
+def ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def get_applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_version;")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def run_migrations():
+    applied_now = []
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            # Serialise concurrent runners (e.g. several containers starting at once).
+            cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        try:
+            with connection.cursor() as cursor:
+                ensure_version_table(cursor)
+                connection.commit()
+                applied = get_applied_versions(cursor)
+
+            for version, name, path in discover_migrations():
+                if version in applied:
+                    continue
+                with open(path) as sql_file:
+                    statements = sql_file.read()
+                logger.info(f"Applying migration {version:04d}_{name}")
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(statements)
+                        cursor.execute(
+                            "INSERT INTO schema_version (version, name) VALUES (%s, %s);",
+                            (version, name)
+                        )
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    logger.error(f"Migration {version:04d}_{name} failed, rolled back.")
+                    raise
+                applied_now.append(version)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+            connection.commit()
+
+    if applied_now:
+        logger.info(f"Applied {len(applied_now)} migration(s).")
+    else:
+        logger.info("Database schema is up to date.")
+    return applied_now
+
+
+def print_status():
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            ensure_version_table(cursor)
+            connection.commit()
+            applied = get_applied_versions(cursor)
+    for version, name, _ in discover_migrations():
+        state = "applied" if version in applied else "pending"
+        print(f"{version:04d}_{name}: {state}")
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv[1:]:
+        print_status()
+    else:
+        run_migrations()
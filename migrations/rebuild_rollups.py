@@ -0,0 +1,30 @@
+"""Recompute the studentrollups table from TestScores.
+
+Usage (from the repository root, after running migrations):
+    python -m migrations.rebuild_rollups                    # every student
+    python -m migrations.rebuild_rollups --user 12 --user 34
+
+Migration 0010 backfills the table once and quizzes keep it current after
+that; run this after editing or importing TestScores rows by hand. It is
+safe to run while the app is serving quizzes.
+"""
+import argparse
+import logging
+from services.student_rollups import rebuild, REBUILD_BATCH_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", type=int, action="append", dest="user_ids",
+                        help="rebuild only this student's rollup (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+    args = parser.parse_args()
+    rebuilt = rebuild(args.user_ids, batch_size=args.batch_size)
+    logger.info(f"Rebuilt rollups for {rebuilt} students.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+import re
+import logging
+import unicodedata
+from collections import deque, namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Screen messages locally before they reach the LLM. Only clear-cut matches
+# are answered here; everything else still goes through the model's own
+# is_unsafe_for_k_12_children check.
+MODERATION_PREFILTER = os.getenv("MODERATION_PREFILTER", "true").lower() == "true"
+MODERATION_TERMS_PATH = os.getenv(
+    "MODERATION_TERMS_PATH", os.path.join(os.path.dirname(__file__), "config", "moderation_terms.txt")
+)
+
+DEFAULT_REPLY = (
+    "That isn't something I can help with, because it isn't appropriate for students. "
+    "I'd be happy to help with something else, like a question about circuits, coding or your lessons!"
+)
+CATEGORY_REPLIES = {
+    "self_harm": (
+        "It sounds like you might be going through something really hard. Please talk to a parent, "
+        "teacher, school counselor or another adult you trust right away. In the US you can also call "
+        "or text 988 any time to talk to someone who can help."
+    ),
+}
+
+ModerationMatch = namedtuple("ModerationMatch", ["term", "category"])
+
+# Look-alike characters commonly used to dodge filters ("s3x", "@ss", "k!ll").
+LOOKALIKES = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "i", "+": "t",
+})
+EDGE_PUNCTUATION = ".,!?;:'\"()[]{}<>*~`"
+WORD_PATTERN = re.compile(r"[a-z]+")
+STRETCHED = re.compile(r"(.)\1{2,}")
+
+
+def deobfuscate(token):
+    """Replace look-alikes in a token that is mostly letters.
+
+    "s3x" and "sh!t" are translated; "53x" (an equation) and "kill!" (after
+    the trailing "!" is stripped) are not.
+    """
+    token = token.strip(EDGE_PUNCTUATION)
+    translated = token.translate(LOOKALIKES)
+    substituted = sum(original != replaced for original, replaced in zip(token, translated))
+    letters = sum(char.isalpha() for char in token)
+    return translated if substituted and letters >= substituted else token
+
+
+def normalize(text, squeeze=False):
+    """Reduce text to lowercase words separated by single spaces.
+
+    Accents are stripped, look-alikes are translated (see deobfuscate), and
+    runs of single letters are joined ("s e x", "s.e.x"). A letter repeated
+    three or more times is cut to two, or to one with squeeze=True
+    ("fuuuck" needs the latter, "baaad" the former). Term lists go through
+    the same function, so both sides agree.
+    """
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold()
+    repeat = r"\1" if squeeze else r"\1\1"
+    words = [
+        STRETCHED.sub(repeat, word)
+        for token in text.split()
+        for word in WORD_PATTERN.findall(deobfuscate(token))
+    ]
+
+    joined = []
+    letters = []
+    for word in words + [""]:
+        if len(word) == 1:
+            letters.append(word)
+            continue
+        if letters:
+            joined.append("".join(letters))
+            letters = []
+        if word:
+            joined.append(word)
+    return " ".join(joined)
+
+
+class AhoCorasick:
+    """Finds every occurrence of a fixed set of patterns in one pass over the text."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.outputs[state].append(pattern)
+
+    def _link(self):
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self.goto[state].items():
+                pending.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find(self, text):
+        """Yield (end_index, pattern) for each match, in order of end_index."""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.outputs[state]:
+                yield index, pattern
+
+
+class ModerationFilter:
+    """Whole-word matching of a term list against normalized messages.
+
+    Terms match on word boundaries, so "ass" does not match "class". A term
+    ending in "*" also matches words that start with it ("kill*" matches
+    "killed" and "killer").
+    """
+
+    def __init__(self, terms):
+        # terms: (category, term) pairs, term as written in the list.
+        self.terms = {}
+        for category, term in terms:
+            prefix = term.endswith("*")
+            normalized = normalize(term.rstrip("*"))
+            if not normalized:
+                continue
+            pattern = " " + normalized + ("" if prefix else " ")
+            self.terms.setdefault(pattern, ModerationMatch(term, category))
+        self.matcher = AhoCorasick(self.terms)
+
+    @classmethod
+    def load(cls, path=MODERATION_TERMS_PATH):
+        with open(path, encoding="utf-8") as terms_file:
+            return cls(parse_terms(terms_file))
+
+    def check(self, message):
+        """Return the first ModerationMatch in message, or None."""
+        variants = [normalize(message)]
+        if STRETCHED.search(message.casefold()):
+            variants.append(normalize(message, squeeze=True))
+        for variant in variants:
+            for _, pattern in self.matcher.find(" " + variant + " "):
+                return self.terms[pattern]
+        return None
+
+
+def parse_terms(lines):
+    """Read "category: term" lines; blank lines and "#" comments are skipped."""
+    terms = []
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        category, separator, term = line.partition(":")
+        if not separator or not term.strip():
+            raise ValueError(f"Line {number}: expected 'category: term', got {line!r}")
+        terms.append((category.strip(), term.strip()))
+    return terms
+
+
+@lru_cache(maxsize=1)
+def get_moderation_filter():
+    return ModerationFilter.load()
+
+
+def check_message(message):
+    """The ModerationMatch for a message that is clearly unsafe, else None."""
+    if not MODERATION_PREFILTER or not message:
+        return None
+    try:
+        return get_moderation_filter().check(message)
+    except OSError as e:
+        logger.warning(f"Moderation term list unavailable, skipping the pre-filter: {e}")
+        return None
+
+
+def reply_for(match):
+    return CATEGORY_REPLIES.get(match.category, DEFAULT_REPLY)
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+
+
+def parse_limit(value, default, maximum):
+    """Parse a ``limit`` query parameter, clamped to ``1..maximum``."""
+    if value in (None, ""):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+
+def parse_seq_cursor(value):
+    """Parse a ``before`` query parameter: a message sequence number, or None when absent."""
+    if value in (None, ""):
+        return None
+    try:
+        seq = int(value)
+    except ValueError:
+        raise ValueError("before must be an integer") from None
+    if seq < 0:
+        raise ValueError("before must not be negative")
+    return seq
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last row of a page as an opaque string."""
+    payload = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by ``encode_cursor`` with ``size`` values."""
+    if not isinstance(cursor, str):
+        raise ValueError("Invalid cursor")
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def decode_time_cursor(cursor):
+    """Decode a (timestamp, id) cursor into a datetime and an int."""
+    timestamp, row_id = decode_cursor(cursor, 2)
+    if not isinstance(timestamp, str) or isinstance(row_id, bool) or not isinstance(row_id, (int, str)):
+        raise ValueError("Invalid cursor")
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
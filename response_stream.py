@@ -0,0 +1,86 @@
+import re
+import json
+
+RESPONSE_KEY = re.compile(r'"response"\s*:\s*"')
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ResponseFieldStream:
+    """Pulls the "response" string out of a JSON reply while it is being generated.
+
+    feed() takes each chunk of raw model output and returns the newly decoded
+    part of the response value. Everything before the key (the
+    is_unsafe_for_k_12_children flag, a ``` fence) is skipped, and an escape
+    sequence split across chunks is held back until it is complete.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = None  # next undecoded character of the value
+        self.done = False
+
+    def feed(self, chunk):
+        if self.done:
+            return ""
+        self.buffer += chunk
+        if self.position is None:
+            match = RESPONSE_KEY.search(self.buffer)
+            if match is None:
+                return ""
+            self.position = match.end()
+
+        buffer, i, decoded = self.buffer, self.position, []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(buffer):
+                break
+            if buffer[i + 1] != "u":
+                decoded.append(ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            text, length = decode_unicode_escape(buffer, i)
+            if text is None:
+                break
+            decoded.append(text)
+            i += length
+        self.position = i
+        return "".join(decoded)
+
+
+def decode_unicode_escape(buffer, i):
+    """Decode the \\uXXXX escape at buffer[i]; (None, 0) if it is not complete yet.
+
+    A high surrogate is decoded together with the low surrogate that follows
+    it, so an emoji is never split across two events.
+    """
+    if i + 6 > len(buffer):
+        return None, 0
+    try:
+        code = int(buffer[i + 2:i + 6], 16)
+    except ValueError:
+        return buffer[i + 2:i + 6], 6
+    if 0xD800 <= code <= 0xDBFF:
+        # Wait for a possible low surrogate, but not past a character that rules one out.
+        if i + 12 > len(buffer) and "\\u".startswith(buffer[i + 6:i + 8]):
+            return None, 0
+        if buffer[i + 6:i + 8] == "\\u":
+            try:
+                low = int(buffer[i + 8:i + 12], 16)
+            except ValueError:
+                low = 0
+            if 0xDC00 <= low <= 0xDFFF:
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return "�", 6
+    return chr(code), 6
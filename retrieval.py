@@ -0,0 +1,202 @@
+import os
+import json
+import logging
+import threading
+from collections import namedtuple
+import numpy as np
+from lexical_index import BM25Index
+
+# Which store answers get_close_vector_text: "chroma" or "faiss". Both are
+# built from the same chunks by create_pdf_vector_store/split-pdf.py.
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+CHROMA_PATH = "vector-store-chroma"
+FAISS_PATH = "vector-store-faiss"
+FAISS_INDEX_FILE = "index.faiss"
+FAISS_CHUNKS_FILE = "chunks.json"
+# Index built by split-pdf.py: "flat" (exact), "ivf" or "hnsw" (approximate).
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "8"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+# Fuse vector results with a BM25 index (built by split-pdf.py) when it exists.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+LEXICAL_PATH = "vector-store-bm25"
+LEXICAL_INDEX_FILE = "index.json"
+# A lexical hit at least this strong (normalized BM25, 0..1) and clearly ahead
+# of the runner-up is answered without embedding the question at all.
+LEXICAL_FAST_PATH_SCORE = float(os.getenv("LEXICAL_FAST_PATH_SCORE", "0.6"))
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "1.5"))
+# Candidates taken from each ranking before fusion, and the RRF constant.
+FUSION_CANDIDATES = 10
+RRF_K = 60
+
+# distance is the squared L2 vector distance (None for chunks found only
+# lexically); lexical_score is the normalized BM25 score (None for chunks
+# found only by vector search).
+Match = namedtuple("Match", ["content", "source", "distance", "lexical_score"])
+
+logger = logging.getLogger(__name__)
+
+
+class ChromaRetriever:
+    """Search over the Chroma store. Distances are squared L2."""
+
+    def __init__(self, embeddings, persist_directory=CHROMA_PATH):
+        from langchain_community.vectorstores import Chroma
+        self.store = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+
+    def search(self, question, k=1, embedding=None):
+        """Return up to k Matches, closest first."""
+        if embedding is None:
+            results = self.store.similarity_search_with_score(question, k=k)
+        else:
+            results = self.store.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+        return [Match(document.page_content, document.metadata["source"], score, None) for document, score in results]
+
+
+class FaissRetriever:
+    """Search over a FAISS index saved by save_faiss_store. Distances are squared L2.
+
+    The index file is memory-mapped where the index type supports it, so
+    every worker on a host shares the same pages.
+    """
+
+    def __init__(self, embeddings, path=FAISS_PATH):
+        self.embeddings = embeddings
+        self.index = load_faiss_index(os.path.join(path, FAISS_INDEX_FILE))
+        with open(os.path.join(path, FAISS_CHUNKS_FILE)) as chunks_file:
+            self.chunks = json.load(chunks_file)
+
+    def search(self, question, k=1, embedding=None):
+        if embedding is None:
+            embedding = self.embeddings.embed_query(question)
+        query = np.asarray([embedding], dtype=np.float32)
+        distances, positions = self.index.search(query, k)
+        return [
+            Match(self.chunks[position]["content"], self.chunks[position]["source"], float(distance), None)
+            for distance, position in zip(distances[0], positions[0])
+            if position != -1
+        ]
+
+
+class HybridRetriever:
+    """Reciprocal rank fusion of a vector retriever and a BM25 index.
+
+    When no embedding is supplied and the lexical ranking has a clear,
+    strong winner, that chunk is returned straight away and the embedding
+    API is never called (see is_lexical_fast_path).
+    """
+
+    def __init__(self, vector_retriever, lexical_index):
+        self.vector_retriever = vector_retriever
+        self.lexical_index = lexical_index
+
+    def search(self, question, k=1, embedding=None):
+        lexical = self.search_lexical(question, max(k, FUSION_CANDIDATES))
+        if embedding is None and is_lexical_fast_path(lexical):
+            return lexical[:k]
+        vector = self.vector_retriever.search(question, k=max(k, FUSION_CANDIDATES), embedding=embedding)
+        return reciprocal_rank_fusion(vector, lexical)[:k]
+
+    def search_lexical(self, question, k):
+        chunks = self.lexical_index.chunks
+        return [
+            Match(chunks[position]["content"], chunks[position]["source"], None, normalized_score)
+            for position, _, normalized_score in self.lexical_index.search(question, k)
+        ]
+
+
+def is_lexical_fast_path(lexical_matches):
+    if not lexical_matches or lexical_matches[0].lexical_score < LEXICAL_FAST_PATH_SCORE:
+        return False
+    if len(lexical_matches) == 1:
+        return True
+    return lexical_matches[0].lexical_score >= LEXICAL_FAST_PATH_MARGIN * lexical_matches[1].lexical_score
+
+
+def reciprocal_rank_fusion(vector_matches, lexical_matches):
+    """Merge two rankings of the same chunks; each Match keeps both scores."""
+    fused = {}
+    for matches in (vector_matches, lexical_matches):
+        for rank, match in enumerate(matches):
+            score, merged = fused.get(match.content, (0.0, match))
+            merged = merged._replace(
+                distance=merged.distance if merged.distance is not None else match.distance,
+                lexical_score=merged.lexical_score if merged.lexical_score is not None else match.lexical_score,
+            )
+            fused[match.content] = (score + 1 / (RRF_K + rank + 1), merged)
+    ranked = sorted(fused.values(), key=lambda item: item[0], reverse=True)
+    return [match for _, match in ranked]
+
+
+def build_faiss_index(vectors, index_type=FAISS_INDEX_TYPE):
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dimension = vectors.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "ivf":
+        # Roughly sqrt(n) lists, with enough training points per list.
+        nlist = max(1, min(int(np.sqrt(len(vectors))), len(vectors) // 39))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, nlist)
+        index.train(vectors)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, 32)
+    else:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+    index.add(vectors)
+    return index
+
+
+def save_faiss_store(index, chunks, path=FAISS_PATH):
+    """Write the index and its chunks; chunks[i] describes vector i."""
+    import faiss
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(index, os.path.join(path, FAISS_INDEX_FILE))
+    with open(os.path.join(path, FAISS_CHUNKS_FILE), "w") as chunks_file:
+        json.dump(chunks, chunks_file)
+
+
+def load_faiss_index(index_path):
+    import faiss
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        logger.info(f"FAISS index cannot be memory-mapped, loading it instead: {e}")
+        index = faiss.read_index(index_path)
+    if hasattr(index, "nprobe"):
+        index.nprobe = FAISS_IVF_NPROBE
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    return index
+
+
+def create_retriever(embeddings, backend=RETRIEVAL_BACKEND, hybrid=HYBRID_RETRIEVAL):
+    if backend == "chroma":
+        retriever = ChromaRetriever(embeddings)
+    elif backend == "faiss":
+        retriever = FaissRetriever(embeddings)
+    else:
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+    lexical_index_path = os.path.join(LEXICAL_PATH, LEXICAL_INDEX_FILE)
+    if hybrid and os.path.exists(lexical_index_path):
+        retriever = HybridRetriever(retriever, BM25Index.load(lexical_index_path))
+    return retriever
+
+
+def save_lexical_index(chunks, path=LEXICAL_PATH):
+    os.makedirs(path, exist_ok=True)
+    BM25Index.build(chunks).save(os.path.join(path, LEXICAL_INDEX_FILE))
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(embeddings, backend=RETRIEVAL_BACKEND):
+    """The process-wide retriever, opened on first use (after gunicorn forks)."""
+    key = (os.getpid(), backend)
+    if key not in _retrievers:
+        with _retrievers_lock:
+            if key not in _retrievers:
+                _retrievers[key] = create_retriever(embeddings, backend)
+    return _retrievers[key]
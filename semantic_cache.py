@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import redis
+from config.redis_config import get_redis_client
+
+# Opt-in cache of answers to first-turn questions, keyed on the question
+# embedding. A new question reuses a cached answer when its cosine similarity
+# to a cached question is at least SEMANTIC_CACHE_THRESHOLD and both were
+# answered from the same retrieved source.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+# Per retrieved source; least recently used entries are evicted beyond this.
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "200"))
+# Embeddings never change once stored, so each process keeps the ones it has
+# seen and only fetches new entries' embeddings from Redis.
+LOCAL_EMBEDDING_CACHE_SIZE = 4096
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCacheStats:
+    """Lookups in this process; /metrics adds up the workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def record(self, hit, saved_ms=0):
+        with self._lock:
+            self._counts["hits" if hit else "misses"] += 1
+            self._counts["saved_seconds"] += saved_ms / 1000
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+stats = SemanticCacheStats()
+
+_local_embeddings = OrderedDict()
+_local_embeddings_lock = threading.Lock()
+
+
+def index_key(namespace, scope):
+    return f"semcache:{namespace}:index:{scope}"
+
+
+def entry_key(namespace, entry_id):
+    return f"semcache:{namespace}:entry:{entry_id}"
+
+
+def embedding_key(namespace, entry_id):
+    return f"semcache:{namespace}:embedding:{entry_id}"
+
+
+def cache_namespace(ingest_version):
+    """Namespace for all keys: changes when the vector store is re-ingested, so
+    answers from an older store are never served; their keys expire."""
+    return str(ingest_version)
+
+
+def encode_embedding(embedding):
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _remember_embedding(entry_id, vector):
+    with _local_embeddings_lock:
+        _local_embeddings[entry_id] = vector
+        _local_embeddings.move_to_end(entry_id)
+        while len(_local_embeddings) > LOCAL_EMBEDDING_CACHE_SIZE:
+            _local_embeddings.popitem(last=False)
+
+
+def _load_embeddings(client, namespace, entry_ids):
+    with _local_embeddings_lock:
+        vectors = {entry_id: _local_embeddings.get(entry_id) for entry_id in entry_ids}
+    missing = [entry_id for entry_id, vector in vectors.items() if vector is None]
+    if missing:
+        for entry_id, raw in zip(missing, client.mget([embedding_key(namespace, entry_id) for entry_id in missing])):
+            if raw is not None:
+                vectors[entry_id] = np.frombuffer(raw, dtype=np.float32)
+                _remember_embedding(entry_id, vectors[entry_id])
+    return {entry_id: vector for entry_id, vector in vectors.items() if vector is not None}
+
+
+def lookup(embedding, scope, ingest_version):
+    """Return the cached answer for the closest earlier question, or None."""
+    client = get_redis_client()
+    try:
+        namespace = cache_namespace(ingest_version)
+        key = index_key(namespace, scope)
+        now = time.time()
+        # Index scores are last-access times; anything older than the TTL has
+        # expired.
+        pipeline = client.pipeline()
+        pipeline.zremrangebyscore(key, "-inf", now - SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.zrevrange(key, 0, SEMANTIC_CACHE_MAX_ENTRIES - 1)
+        _, entry_ids = pipeline.execute()
+        entry_ids = [entry_id.decode("utf-8") for entry_id in entry_ids]
+        vectors = _load_embeddings(client, namespace, entry_ids)
+        if not vectors:
+            stats.record(hit=False)
+            return None
+
+        ids = list(vectors)
+        matrix = np.vstack([vectors[entry_id] for entry_id in ids])
+        query = np.asarray(embedding, dtype=np.float32)
+        similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] < SEMANTIC_CACHE_THRESHOLD:
+            stats.record(hit=False)
+            return None
+
+        best_id = ids[best]
+        raw_entry = client.get(entry_key(namespace, best_id))
+        if raw_entry is None:
+            client.zrem(key, best_id)
+            stats.record(hit=False)
+            return None
+        entry = json.loads(raw_entry)
+
+        pipeline = client.pipeline()
+        pipeline.zadd(key, {best_id: now})
+        pipeline.expire(entry_key(namespace, best_id), SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.expire(embedding_key(namespace, best_id), SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.expire(key, SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.execute()
+        stats.record(hit=True, saved_ms=entry["latency_ms"])
+        logger.debug(f"Semantic cache hit (similarity {similarities[best]:.3f}) for: {entry['question']}")
+        return entry["answer"]
+    except redis.RedisError as e:
+        logger.warning(f"Semantic cache lookup failed: {e}")
+        return None
+
+
+def store(embedding, scope, ingest_version, question, answer, latency_ms):
+    """Cache an answer; evicts the least recently used entries of the scope."""
+    client = get_redis_client()
+    entry_id = uuid.uuid4().hex
+    try:
+        namespace = cache_namespace(ingest_version)
+        key = index_key(namespace, scope)
+        pipeline = client.pipeline()
+        pipeline.set(entry_key(namespace, entry_id),
+                     json.dumps({"question": question, "answer": answer, "latency_ms": latency_ms}),
+                     ex=SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.set(embedding_key(namespace, entry_id), encode_embedding(embedding), ex=SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.zadd(key, {entry_id: time.time()})
+        pipeline.expire(key, SEMANTIC_CACHE_TTL_SECONDS)
+        pipeline.zcard(key)
+        entry_count = pipeline.execute()[-1]
+        if entry_count > SEMANTIC_CACHE_MAX_ENTRIES:
+            evicted = [member for member, _ in client.zpopmin(key, entry_count - SEMANTIC_CACHE_MAX_ENTRIES)]
+            if evicted:
+                evicted = [member.decode("utf-8") for member in evicted]
+                client.delete(*[entry_key(namespace, member) for member in evicted],
+                              *[embedding_key(namespace, member) for member in evicted])
+    except redis.RedisError as e:
+        logger.warning(f"Semantic cache store failed: {e}")
+
+
+def get_semantic_cache_stats():
+    """Hits, misses and the answer latency hits saved, in this process."""
+    return stats.snapshot()
+
+
+def encode_scope(source):
+    # Sources are file paths; keep keys printable and free of separators.
+    return base64.urlsafe_b64encode((source or "none").encode("utf-8")).decode("ascii")
@@ -0,0 +1,230 @@
+import os
+import re
+import math
+import threading
+import unicodedata
+from fractions import Fraction
+
+# Decide clear-cut quiz answers locally: exact and near-exact text, equal
+# numbers (as decimals, fractions, percentages or words), true/false. An answer
+# is only rejected when both sides have an exact form (a number in the same
+# unit, a boolean, "I don't know") and they clearly disagree; anything else,
+# including numbers that differ only by rounding, acronyms, formulas and
+# synonyms, is left to the LLM grader.
+ANSWER_CHECKER_ENABLED = os.getenv("ANSWER_CHECKER_ENABLED", "true").lower() == "true"
+# Token-set (Jaccard) similarity at or above which a text answer is accepted.
+ANSWER_ACCEPT_SIMILARITY = float(os.getenv("ANSWER_ACCEPT_SIMILARITY", "0.9"))
+
+DONT_KNOW = {"", "idk", "i dont know", "i do not know", "dont know", "no idea", "not sure", "i am not sure",
+             "im not sure", "pass", "skip", "no clue"}
+# Only an expected answer that is literally true/false or yes/no is treated as
+# a boolean; "right" or "correct" may well be a direction or a word answer.
+BOOLEAN_ANSWERS = {"true": True, "yes": True, "false": False, "no": False}
+TRUE_WORDS = {"true", "t", "yes", "y"}
+FALSE_WORDS = {"false", "f", "no", "n"}
+# Words that may pad an answer without changing it ("it is Paris").
+FILLER = {"a", "an", "the", "it", "its", "is", "are", "was", "were", "be", "i", "think", "answer", "my", "that",
+          "this", "of", "equals", "equal", "to"}
+# Words that can turn a contained answer around ("not Paris", "Paris or Rome").
+HEDGES = {"not", "no", "never", "or", "isnt", "arent", "wasnt", "nor", "except", "maybe"}
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30,
+    "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100,
+}
+UNIT_ALIASES = {
+    "mm": "mm", "millimeter": "mm", "millimetre": "mm",
+    "cm": "cm", "centimeter": "cm", "centimetre": "cm",
+    "m": "m", "meter": "m", "metre": "m",
+    "km": "km", "kilometer": "km", "kilometre": "km",
+    "in": "in", "inch": "in", "inche": "in", "ft": "ft", "foot": "ft", "feet": "ft",
+    "g": "g", "gram": "g", "kg": "kg", "kilogram": "kg", "lb": "lb", "pound": "lb",
+    "s": "s", "sec": "s", "second": "s", "min": "min", "minute": "min", "h": "h", "hr": "h", "hour": "h",
+    "v": "v", "volt": "v", "a": "a", "amp": "a", "ampere": "a", "ohm": "ohm", "ω": "ohm", "w": "w", "watt": "w",
+    "degree": "deg", "deg": "deg", "°": "deg", "%": "%", "percent": "%",
+    "dollar": "$", "$": "$", "cent": "cent",
+}
+
+NUMBER = re.compile(
+    r"^(?P<sign>[-+−])?\s*(?P<currency>\$)?\s*"
+    r"(?:(?P<whole>\d+)\s+(?P<mixed_num>\d+)\s*/\s*(?P<mixed_den>\d+)"
+    r"|(?P<num>\d+)\s*/\s*(?P<den>\d+)"
+    r"|(?P<decimal>\d*\.\d+|\d+))"
+    r"\s*(?P<unit>[a-zω°%$]*)$"
+)
+PUNCTUATION = re.compile(r"[^\w\s./%$°ω−-]")
+THOUSANDS_SEPARATOR = re.compile(r"(?<=\d),(?=\d{3}\b)")
+
+
+class CheckerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"checked": 0, "accepted": 0, "rejected": 0, "escalated": 0}
+
+    def count(self, decision):
+        key = "escalated" if decision is None else "accepted" if decision else "rejected"
+        with self._lock:
+            self._counts["checked"] += 1
+            self._counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counts)
+        # Every answer decided here is one grading call the LLM did not get.
+        snapshot["llm_calls_avoided"] = snapshot["accepted"] + snapshot["rejected"]
+        return snapshot
+
+
+stats = CheckerStats()
+
+
+def get_answer_checker_stats():
+    return stats.snapshot()
+
+
+def normalize(text):
+    """Lowercase, accent-free, apostrophes dropped, other punctuation turned into spaces."""
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    text = text.replace("'", "").replace("’", "")
+    text = THOUSANDS_SEPARATOR.sub("", text)
+    text = PUNCTUATION.sub(" ", text)
+    return " ".join(text.split()).strip(" .")
+
+
+def parse_number_words(text):
+    """Value of "seven", "twenty one", "forty-two" or "three hundred", else None."""
+    words = text.replace("-", " ").split()
+    if not words or any(word not in NUMBER_WORDS for word in words):
+        return None
+    total = 0
+    for word in words:
+        value = NUMBER_WORDS[word]
+        if value == 100:
+            total = (total or 1) * 100
+        else:
+            total += value
+    return Fraction(total)
+
+
+def parse_number(text):
+    """(value, unit, decimal places) for a normalized answer that is a single quantity, else None.
+
+    Accepts integers, decimals, fractions ("3/4", "1 1/2"), number words,
+    percentages, a leading "$" and a trailing unit. Percentages are scaled by
+    1/100 and keep the unit "%". Decimal places are None for fractions and
+    words.
+    """
+    words = parse_number_words(text)
+    if words is not None:
+        return words, "", None
+    match = NUMBER.match(text)
+    if match is None:
+        return None
+    unit = match.group("unit")
+    unit = UNIT_ALIASES.get(unit, UNIT_ALIASES.get(unit.rstrip("s"), unit)) if unit else ""
+    if match.group("currency"):
+        unit = unit or "$"
+    decimals = None
+    if match.group("whole"):
+        value = int(match.group("whole")) + Fraction(int(match.group("mixed_num")), int(match.group("mixed_den")) or 1)
+    elif match.group("num"):
+        if int(match.group("den")) == 0:
+            return None
+        value = Fraction(int(match.group("num")), int(match.group("den")))
+    else:
+        digits = match.group("decimal")
+        value = Fraction(digits)
+        decimals = len(digits.split(".")[1]) if "." in digits else 0
+    if match.group("sign") in ("-", "−"):
+        value = -value
+    if unit == "%":
+        value /= 100
+        decimals = decimals + 2 if decimals is not None else None
+    return value, unit, decimals
+
+
+def round_half_up(value, decimals):
+    """value rounded to decimals places, halves away from zero (round() on a Fraction rounds them to even)."""
+    scale = 10 ** decimals
+    magnitude = Fraction(math.floor(abs(value) * scale + Fraction(1, 2)), scale)
+    return magnitude if value >= 0 else -magnitude
+
+
+def same_number(student, correct):
+    """True when equal, or when the correct value rounds to the student's answer.
+
+    A student may round an exact answer ("0.33" for 1/3), to two places or
+    more. A more precise answer than the stored one is not accepted here:
+    "2.54" for "2.5" may be a different measurement.
+    """
+    student_value, _, student_decimals = student
+    correct_value, _, _ = correct
+    if student_value == correct_value:
+        return True
+    return bool(student_decimals and student_decimals >= 2
+                and round_half_up(correct_value, student_decimals) == student_value)
+
+
+def near_number(student, correct):
+    """True when the two agree at the coarser precision they were written with ("1.4" and "1.35")."""
+    precisions = [decimals for _, _, decimals in (student, correct) if decimals is not None]
+    if not precisions:
+        return False
+    decimals = min(precisions)
+    return round_half_up(student[0], decimals) == round_half_up(correct[0], decimals)
+
+
+def tokens(text):
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in text.split()}
+
+
+def check_answer(student_answer, correct_answer):
+    """True or False when the answer is clear-cut, None when the LLM should decide."""
+    decision = decide(student_answer, correct_answer)
+    stats.count(decision)
+    return decision
+
+
+def decide(student_answer, correct_answer):
+    student, correct = normalize(student_answer), normalize(correct_answer)
+    if student == correct:
+        return True
+    if student in DONT_KNOW:
+        return False
+
+    if correct in BOOLEAN_ANSWERS:
+        if student in TRUE_WORDS or student in FALSE_WORDS:
+            return (student in TRUE_WORDS) == BOOLEAN_ANSWERS[correct]
+        return None
+
+    correct_number = parse_number(correct)
+    if correct_number is not None:
+        student_number = parse_number(student)
+        if student_number is None:
+            # "12" vs "a dozen", or a worked answer: let the LLM read it.
+            return None
+        if student_number[1] != correct_number[1]:
+            # "0.5" for "50%" is the same number; anything else ("1k" vs
+            # "1000", "5 cm" vs "50 mm") may be the same quantity written
+            # another way.
+            if {student_number[1], correct_number[1]} == {"", "%"} and same_number(student_number, correct_number):
+                return True
+            return None
+        if same_number(student_number, correct_number):
+            return True
+        # Close but not equal: rounding, a precise measurement or a slip.
+        return None if near_number(student_number, correct_number) else False
+
+    student_tokens, correct_tokens = tokens(student), tokens(correct)
+    hedged = bool((student_tokens - correct_tokens) & HEDGES)
+    if not hedged and correct_tokens <= student_tokens and student_tokens - correct_tokens <= FILLER:
+        return True
+    similarity = len(student_tokens & correct_tokens) / len(student_tokens | correct_tokens)
+    if similarity >= ANSWER_ACCEPT_SIMILARITY and not hedged:
+        return True
+    # No word in common proves nothing: "LED" for "light-emitting diode",
+    # "H2O" for "water" or a misspelling may all be right.
+    return None
@@ -0,0 +1,280 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+import redis
+from flask import Blueprint, jsonify, request
+from config.db_config import db_connection
+from config.redis_config import get_redis_client
+from services.flags import parse_date_bound
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+cohort_analytics_bp = Blueprint('cohort_analytics_bp', __name__)
+
+# Score statistics across a grade and/or school, optionally limited to tests
+# in a date window, computed in one SQL statement. Results are cached in Redis
+# under the cohort and its version: the highest test id and the test count of
+# its students, read from studentrollups. A new or rebuilt test changes the
+# version, so a cached result is never served stale; the TTL only bounds how
+# long unused versions linger.
+COHORT_CACHE_TTL_SECONDS = int(os.getenv("COHORT_CACHE_TTL_SECONDS", "3600"))
+COHORT_CACHE_ENABLED = os.getenv("COHORT_CACHE_ENABLED", "true").lower() == "true"
+COHORT_TREND_INTERVALS = ("day", "week", "month")
+# Periods averaged into each point of the trend's moving average.
+COHORT_TREND_WINDOW = 4
+COHORT_HISTOGRAM_BUCKETS = 10
+COHORT_PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+Cohort = namedtuple("Cohort", ["grade", "school", "start", "end"])
+
+
+class CohortCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "errors": 0}
+
+    def count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+cache_stats = CohortCacheStats()
+
+
+def get_cohort_cache_stats():
+    return cache_stats.snapshot()
+
+
+def parse_cohort(args):
+    """The cohort named by ?grade=, ?school=, ?from= and ?to=; raises ValueError."""
+    grade = args.get('grade') or None
+    school = args.get('school') or None
+    if grade is None and school is None:
+        raise ValueError("grade or school is required")
+    return Cohort(grade, school, parse_date_bound(args.get('from')),
+                  parse_date_bound(args.get('to'), end_of_range=True))
+
+
+def members_query(cohort):
+    """SELECT of the cohort's student user ids, and its parameters."""
+    conditions = ["UserID IS NOT NULL"]
+    params = {}
+    if cohort.grade is not None:
+        conditions.append("Grade = %(grade)s")
+        params["grade"] = cohort.grade
+    if cohort.school is not None:
+        conditions.append("School = %(school)s")
+        params["school"] = cohort.school
+    return f"SELECT DISTINCT UserID FROM Students WHERE {' AND '.join(conditions)}", params
+
+
+def tests_query(cohort):
+    """SELECT of the cohort's tests as (UserID, TestDate, percent), and its parameters."""
+    members, params = members_query(cohort)
+    conditions = ["t.TotalQuestions > 0"]
+    if cohort.start:
+        conditions.append("t.TestDate >= %(start)s")
+        params["start"] = cohort.start
+    if cohort.end:
+        conditions.append("t.TestDate < %(end)s")
+        params["end"] = cohort.end
+    query = f"""
+        SELECT t.UserID, t.TestDate, 100.0 * t.Score / t.TotalQuestions AS percent
+        FROM TestScores t
+        JOIN ({members}) m ON m.UserID = t.UserID
+        WHERE {' AND '.join(conditions)}
+    """
+    return query, params
+
+
+def cohort_version(cursor, cohort):
+    """Changes whenever a test of one of the cohort's students is added or rebuilt."""
+    members, params = members_query(cohort)
+    cursor.execute(f"""
+        SELECT MAX(r.last_testid), COALESCE(SUM(r.test_count), 0)
+        FROM studentrollups r
+        WHERE r.UserID IN ({members})
+    """, params)
+    last_testid, test_count = cursor.fetchone()
+    return f"{last_testid or 0}.{test_count}"
+
+
+def score_summary(cursor, cohort, interval="week"):
+    """Percentiles, a histogram and a trend of the cohort's quiz scores, in percent."""
+    if interval not in COHORT_TREND_INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    tests, params = tests_query(cohort)
+    params.update({
+        "percentiles": list(COHORT_PERCENTILES),
+        "buckets": COHORT_HISTOGRAM_BUCKETS,
+        "interval": interval,
+        "window": COHORT_TREND_WINDOW - 1,
+    })
+    cursor.execute(f"""
+        WITH tests AS MATERIALIZED ({tests}),
+        periods AS (
+            SELECT date_trunc(%(interval)s, TestDate) AS period, COUNT(*) AS test_count, SUM(percent) AS percent_sum
+            FROM tests
+            GROUP BY 1
+        ),
+        trend AS (
+            SELECT period, test_count, percent_sum / test_count AS average,
+                   SUM(percent_sum) OVER recent / SUM(test_count) OVER recent AS moving_average
+            FROM periods
+            WINDOW recent AS (ORDER BY period ROWS BETWEEN %(window)s PRECEDING AND CURRENT ROW)
+        ),
+        histogram AS (
+            -- A perfect score lands in the last bucket rather than one past it.
+            SELECT LEAST(width_bucket(percent, 0, 100, %(buckets)s), %(buckets)s) AS bucket, COUNT(*) AS test_count
+            FROM tests
+            GROUP BY 1
+        )
+        SELECT COUNT(*), COUNT(DISTINCT UserID), AVG(percent)::float, STDDEV_POP(percent)::float,
+               MIN(percent)::float, MAX(percent)::float,
+               percentile_cont(%(percentiles)s::float[]) WITHIN GROUP (ORDER BY percent),
+               regr_slope(percent, EXTRACT(EPOCH FROM TestDate) / 86400),
+               (SELECT json_agg(json_build_object('bucket', bucket, 'tests', test_count)) FROM histogram),
+               (SELECT json_agg(json_build_object('period', period, 'tests', test_count, 'average', average::float,
+                                                  'moving_average', moving_average::float) ORDER BY period)
+                FROM trend)
+        FROM tests
+    """, params)
+    (test_count, student_count, mean, stddev, minimum, maximum, percentiles, slope,
+     histogram, trend) = cursor.fetchone()
+
+    bucket_width = 100 / COHORT_HISTOGRAM_BUCKETS
+    bucket_counts = {item['bucket']: item['tests'] for item in histogram or []}
+    return {
+        'tests': test_count,
+        'students': student_count,
+        'mean': round2(mean),
+        'stddev': round2(stddev),
+        'min': round2(minimum),
+        'max': round2(maximum),
+        'percentiles': {
+            f"p{round(fraction * 100)}": round2(value)
+            for fraction, value in zip(COHORT_PERCENTILES, percentiles or [None] * len(COHORT_PERCENTILES))
+        },
+        'distribution': [
+            {
+                'from': round2((bucket - 1) * bucket_width),
+                'to': round2(bucket * bucket_width),
+                'tests': bucket_counts.get(bucket, 0)
+            }
+            for bucket in range(1, COHORT_HISTOGRAM_BUCKETS + 1)
+        ],
+        'trend': {
+            'interval': interval,
+            # Least-squares slope of the score over time, in percentage points per day.
+            'slope_per_day': round2(slope, 4),
+            'points': [
+                {
+                    'period': item['period'],
+                    'tests': item['tests'],
+                    'average': round2(item['average']),
+                    'moving_average': round2(item['moving_average'])
+                }
+                for item in trend or []
+            ]
+        }
+    }
+
+
+def student_standings(cursor, cohort):
+    """Each student's average score and where it ranks in the cohort, best first."""
+    tests, params = tests_query(cohort)
+    cursor.execute(f"""
+        WITH tests AS ({tests})
+        SELECT u.UserID, u.first_name, u.last_name, COUNT(*), AVG(t.percent)::float, MAX(t.TestDate),
+               PERCENT_RANK() OVER (ORDER BY AVG(t.percent))
+        FROM tests t
+        JOIN Users u ON u.UserID = t.UserID
+        GROUP BY u.UserID, u.first_name, u.last_name
+        ORDER BY AVG(t.percent) DESC, u.UserID
+    """, params)
+    return [
+        {
+            'userid': userid,
+            'name': f"{first_name or ''}{' ' if first_name and last_name else ''}{last_name or ''}",
+            'tests': test_count,
+            'average': round2(average),
+            'percentile': round2(percent_rank * 100),
+            'last_test_date': last_test_date.isoformat() if last_test_date else None
+        }
+        for userid, first_name, last_name, test_count, average, last_test_date, percent_rank in cursor.fetchall()
+    ]
+
+
+def round2(value, digits=2):
+    return None if value is None else round(float(value), digits)
+
+
+def cache_key(kind, cohort, version, *extra):
+    cohort_id = json.dumps([cohort.grade, cohort.school, cohort.start, cohort.end, *extra], default=str)
+    digest = hashlib.sha256(cohort_id.encode("utf-8")).hexdigest()[:32]
+    return f"cohort_analytics:{kind}:{digest}:{version}"
+
+
+def cached_analytics(cursor, redis_client, kind, cohort, compute, *extra):
+    """compute(cursor) for the cohort, from the cache when its tests have not changed."""
+    if not COHORT_CACHE_ENABLED:
+        with stage("cohort_query"):
+            return compute(cursor)
+    key = cache_key(kind, cohort, cohort_version(cursor, cohort), *extra)
+    try:
+        cached = redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cohort analytics cache read failed: {e}")
+        cache_stats.count("errors")
+        cached = None
+    if cached is not None:
+        cache_stats.count("hits")
+        return json.loads(cached)
+    cache_stats.count("misses")
+    with stage("cohort_query"):
+        result = compute(cursor)
+    try:
+        redis_client.set(key, json.dumps(result), ex=COHORT_CACHE_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Cohort analytics cache write failed: {e}")
+        cache_stats.count("errors")
+    return result
+
+
+# API for score statistics across a cohort:
+# ?grade=5&school=...&from=2024-09-01&to=2024-12-31&interval=week
+@cohort_analytics_bp.route('/cohorts/summary', methods=['GET'])
+def get_cohort_summary():
+    interval = request.args.get('interval', 'week')
+    try:
+        cohort = parse_cohort(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    if interval not in COHORT_TREND_INTERVALS:
+        return jsonify({'error': f'Invalid interval: {interval}'}), 400
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            summary = cached_analytics(cursor, get_redis_client(), "summary", cohort,
+                                       lambda cursor: score_summary(cursor, cohort, interval), interval)
+    return jsonify(summary)
+
+# API for the students of a cohort ranked by average score, with the same parameters
+@cohort_analytics_bp.route('/cohorts/students', methods=['GET'])
+def get_cohort_students():
+    try:
+        cohort = parse_cohort(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            standings = cached_analytics(cursor, get_redis_client(), "students", cohort,
+                                         lambda cursor: student_standings(cursor, cohort))
+    return jsonify(standings)
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+from config.db_config import db_connection
+from pagination import encode_cursor, decode_time_cursor
+
+FLAGS_PAGE_SIZE = 50
+FLAGS_MAX_PAGE_SIZE = 200
+SEARCH_MODES = ("substring", "fulltext")
+
+
+def parse_date_bound(value, end_of_range=False):
+    """Parse a ``from``/``to`` query value (ISO date or datetime).
+
+    A bare date used as the end of a range covers that whole day.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_flagged_messages(search=None, mode="substring", start=None, end=None,
+                            limit=FLAGS_PAGE_SIZE, cursor=None):
+    """Return one page of flagged messages, newest first, and the next cursor.
+
+    ``substring`` matches the term anywhere in the user id or message using the
+    trigram indexes; ``fulltext`` matches words in the message using the
+    tsvector index. ``start`` is inclusive and ``end`` exclusive.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    conditions = []
+    params = []
+    if search:
+        if mode == "fulltext":
+            conditions.append("message_tsv @@ websearch_to_tsquery('english', %s)")
+            params.append(search)
+        else:
+            pattern = f"%{escape_like(search)}%"
+            conditions.append("(auth0_user_id ILIKE %s OR message ILIKE %s)")
+            params.extend([pattern, pattern])
+    if start:
+        conditions.append("timestamp >= %s")
+        params.append(start)
+    if end:
+        conditions.append("timestamp < %s")
+        params.append(end)
+    if cursor:
+        conditions.append("(timestamp, id) < (%s, %s)")
+        params.extend(decode_time_cursor(cursor))
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT id, auth0_user_id, message, timestamp, source, matched_term, false_positive
+        FROM flags
+        {where_clause}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT %s;
+    """
+    # Fetch one extra row to learn whether another page exists.
+    params.append(limit + 1)
+
+    with db_connection() as connection:
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_id, last_timestamp = rows[-1][0], rows[-1][3]
+        next_cursor = encode_cursor(last_timestamp.isoformat(), last_id)
+    return rows, next_cursor
+
+
+def review_flag(flag_id, false_positive):
+    """Record a reviewer's verdict on a flag; False if the flag does not exist."""
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE flags SET false_positive = %s, reviewed_at = NOW() WHERE id = %s;",
+                (false_positive, flag_id)
+            )
+            found = cursor.rowcount == 1
+        connection.commit()
+    return found
+
+
+def get_flag_stats():
+    """Flag counts and reviewed false positives per source and matched term."""
+    with db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT source, matched_term, COUNT(*),
+                       COUNT(false_positive),
+                       COUNT(*) FILTER (WHERE false_positive)
+                FROM flags
+                GROUP BY source, matched_term
+                ORDER BY source, COUNT(*) DESC;
+                """
+            )
+            rows = cursor.fetchall()
+    return [
+        {
+            "source": source,
+            "matched_term": matched_term,
+            "flags": total,
+            "reviewed": reviewed,
+            "false_positives": false_positives,
+            "false_positive_rate": false_positives / reviewed if reviewed else None,
+        }
+        for source, matched_term, total, reviewed, false_positives in rows
+    ]
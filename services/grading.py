@@ -0,0 +1,187 @@
+import os
+import logging
+import redis
+from langchain_core.prompts import ChatPromptTemplate
+from background_tasks import with_app_context, get_process_executor
+from config.json_schema import GradedAnswers
+from services.answer_checker import check_answer, ANSWER_CHECKER_ENABLED
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# "batch" grades a whole quiz in one structured call and grades only the
+# answers it could not place one by one; "parallel" grades every answer
+# separately, QUIZ_GRADING_CONCURRENCY at a time; "sequential" is one call
+# after another, as before.
+QUIZ_GRADING_MODE = os.getenv("QUIZ_GRADING_MODE", "batch")
+QUIZ_GRADING_CONCURRENCY = int(os.getenv("QUIZ_GRADING_CONCURRENCY", "4"))
+GRADING_MODES = ("batch", "parallel", "sequential")
+# Grade each answer in the background as it is submitted, so finishing a quiz
+# only has to grade the last answer and write the summary.
+QUIZ_INCREMENTAL_GRADING = os.getenv("QUIZ_INCREMENTAL_GRADING", "true").lower() == "true"
+QUIZ_GRADES_TTL_SECONDS = int(os.getenv("QUIZ_GRADES_TTL_SECONDS", "1800"))
+
+single_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are an assistant that evaluates quiz answers."),
+    ("human", "Question: {question}\nStudent's Answer: {student_answer}\nCorrect Answer: {correct_answer}\nIs the student's answer correct? Reply with 'True' or 'False'.")
+])
+
+batch_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are an assistant that evaluates quiz answers and replies in JSON."),
+    ("human", "Grade each of the numbered quiz answers below against its correct answer.\n\n{answers}\n\n"
+              "Reply with only a JSON object of the form "
+              "{{\"grades\": [{{\"number\": 1, \"correct\": true}}, ...]}} "
+              "with one entry for every numbered answer.")
+])
+
+
+def evaluate_answer(question, student_answer, correct_answer, llm):
+    chain = single_prompt | llm
+
+    res = chain.invoke({
+        "question": question,
+        "student_answer": student_answer,
+        "correct_answer": correct_answer
+    })
+
+    ai_response = res.content.strip().lower()
+    return ai_response == 'true'
+
+
+def exact_match(student_answer, correct_answer):
+    return " ".join(str(student_answer).lower().split()) == " ".join(str(correct_answer).lower().split())
+
+
+def check_locally(item):
+    """The answer checker's verdict, or None when the LLM has to grade the answer."""
+    if not ANSWER_CHECKER_ENABLED:
+        return None
+    return check_answer(item['student_answer'], item['correct_answer'])
+
+
+def grade_one(item, llm):
+    """Grade a single answer; falls back to an exact comparison if the LLM call fails."""
+    try:
+        return evaluate_answer(item['question'], item['student_answer'], item['correct_answer'], llm)
+    except Exception as e:
+        logger.warning(f"Grading call failed, comparing the answer to the correct one instead: {e}")
+        return exact_match(item['student_answer'], item['correct_answer'])
+
+
+def format_answers(answers):
+    return "\n\n".join(
+        f"Answer {number}:\nQuestion: {item['question']}\nStudent's Answer: {item['student_answer']}\n"
+        f"Correct Answer: {item['correct_answer']}"
+        for number, item in enumerate(answers, start=1)
+    )
+
+
+def grade_batch(answers, llm):
+    """Grades from one structured call, as a list with None for answers the reply did not cover."""
+    grades = [None] * len(answers)
+    chain = batch_prompt | llm.with_structured_output(GradedAnswers, method="json_mode")
+    try:
+        res = chain.invoke({"answers": format_answers(answers)})
+    except Exception as e:
+        logger.warning(f"Batch grading failed, grading answers one by one: {e}")
+        return grades
+    for grade in res.grades:
+        if 1 <= grade.number <= len(answers) and grades[grade.number - 1] is None:
+            grades[grade.number - 1] = grade.correct
+    return grades
+
+
+def grade_each(items, llm):
+    if len(items) <= 1:
+        return [grade_one(item, llm) for item in items]
+    executor = get_process_executor("grading", QUIZ_GRADING_CONCURRENCY)
+    futures = [executor.submit(with_app_context(grade_one), item, llm) for item in items]
+    return [future.result() for future in futures]
+
+
+def grade_answers(answers, llm, mode=None, known=None):
+    """Return True/False for each answer, in order.
+
+    known holds grades computed earlier (None where there is none yet); only
+    the answers without one are graded. Clear-cut answers are decided by the
+    local answer checker, the rest by the LLM.
+    """
+    mode = mode or QUIZ_GRADING_MODE
+    grades = list(known) if known else [None] * len(answers)
+    some_known = any(grade is not None for grade in grades)
+    for index, grade in enumerate(grades):
+        if grade is None:
+            grades[index] = check_locally(answers[index])
+    missing = [index for index, grade in enumerate(grades) if grade is None]
+    if not missing:
+        return grades
+    with stage("quiz_grading"):
+        # With some grades known, the rest are usually the last answer and
+        # any still being graded in the background; grading them one by one
+        # lets the gateway coalesce those with the calls already in flight.
+        if mode == "batch" and not some_known and len(missing) > 1:
+            batch_grades = grade_batch([answers[index] for index in missing], llm)
+            for index, grade in zip(missing, batch_grades):
+                grades[index] = grade
+            ungraded = [index for index in missing if grades[index] is None]
+            if ungraded and len(ungraded) < len(missing):
+                logger.warning(f"Batch grading left {len(ungraded)} of {len(missing)} answers ungraded")
+            missing = ungraded
+        items = [answers[index] for index in missing]
+        if mode == "sequential":
+            new_grades = [grade_one(item, llm) for item in items]
+        else:
+            new_grades = grade_each(items, llm)
+        for index, grade in zip(missing, new_grades):
+            grades[index] = grade
+        return grades
+
+
+def grades_key(quiz_id):
+    return f"quiz_grades:{quiz_id}"
+
+
+def store_grade(redis_client, quiz_id, index, item, llm):
+    try:
+        correct = check_locally(item)
+        if correct is None:
+            correct = evaluate_answer(item['question'], item['student_answer'], item['correct_answer'], llm)
+    except Exception as e:
+        # Left ungraded; the answer is graded again when the quiz finishes.
+        logger.warning(f"Background grading of answer {index + 1} of quiz {quiz_id} failed: {e}")
+        return
+    try:
+        pipeline = redis_client.pipeline()
+        pipeline.hset(grades_key(quiz_id), str(index), "1" if correct else "0")
+        pipeline.expire(grades_key(quiz_id), QUIZ_GRADES_TTL_SECONDS)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Failed to store grade of answer {index + 1} of quiz {quiz_id}: {e}")
+
+
+def grade_in_background(redis_client, quiz_id, index, item, llm):
+    """Grade one answer off the request thread and keep the result in quiz_grades:{quiz_id}."""
+    executor = get_process_executor("grading", QUIZ_GRADING_CONCURRENCY)
+    executor.submit(with_app_context(store_grade), redis_client, quiz_id, index, item, llm)
+
+
+def load_grades(redis_client, quiz_id, count):
+    """Grades stored so far for a quiz, as a list with None for answers not graded yet."""
+    grades = [None] * count
+    try:
+        stored = redis_client.hgetall(grades_key(quiz_id))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to load grades of quiz {quiz_id}, grading all answers now: {e}")
+        return grades
+    for field, value in stored.items():
+        index = int(field)
+        if 0 <= index < count:
+            grades[index] = value in (b"1", "1")
+    return grades
+
+
+def clear_grades(redis_client, quiz_id):
+    try:
+        redis_client.delete(grades_key(quiz_id))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to delete grades of quiz {quiz_id}: {e}")
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import redis
+from psycopg2.extras import execute_values
+from langchain_core.prompts import ChatPromptTemplate
+from background_tasks import with_app_context, get_process_executor
+from config.db_config import db_connection
+
+logger = logging.getLogger(__name__)
+
+QUIZ_QUESTION_COUNT = int(os.getenv("QUIZ_QUESTION_COUNT", "10"))
+# Questions are sampled from the quizquestions table; a grade whose bank is
+# smaller than the watermark, or whose student had to be given questions seen
+# before, is topped up in the background by QUESTION_BANK_REFILL_BATCHES
+# generations.
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true"
+QUESTION_BANK_LOW_WATERMARK = int(os.getenv("QUESTION_BANK_LOW_WATERMARK", "100"))
+QUESTION_BANK_REFILL_BATCHES = int(os.getenv("QUESTION_BANK_REFILL_BATCHES", "3"))
+# One refill per grade at a time, across all workers.
+QUESTION_BANK_REFILL_LOCK_SECONDS = 300
+
+generation_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful assistant that generates quiz questions."),
+    ("human", "Generate 10 quiz questions with answers for a student in grade {grade}. "
+              "The questions should be appropriate for their difficulty level. "
+              "Provide only the questions and the correct answers in a valid JSON format as a list of dictionaries. "
+              "Do not include any other text or explanations or ``` code blocks. "
+              "Each dictionary should have 'question' and 'answer' keys, and a short 'topic' key.")
+])
+
+CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_questions(ai_response):
+    """The well-formed question/answer pairs in a generation, however many there are."""
+    try:
+        items = json.loads(CODE_FENCE.sub("", ai_response.strip()))
+    except json.JSONDecodeError:
+        logger.error(f"Failed to decode AI response for questions: {ai_response}")
+        return []
+    if not isinstance(items, list):
+        logger.error(f"Expected a list of questions, got: {ai_response}")
+        return []
+    questions = []
+    for item in items:
+        if isinstance(item, dict) and str(item.get("question", "")).strip() and str(item.get("answer", "")).strip():
+            questions.append({
+                "question": str(item["question"]).strip(),
+                "answer": str(item["answer"]).strip(),
+                "topic": str(item.get("topic") or "general").strip()[:100],
+            })
+    if len(questions) != len(items):
+        logger.warning(f"Dropped {len(items) - len(questions)} malformed questions of {len(items)}")
+    return questions
+
+
+def generate_quiz_questions(grade, llm):
+    chain = generation_prompt | llm
+    res = chain.invoke({"grade": grade})
+    return parse_questions(res.content)
+
+
+def question_hash(question):
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def add_questions(grade, questions):
+    """Insert questions into the bank, skipping ones it already has; returns the number added."""
+    rows = {}
+    for item in questions:
+        rows.setdefault(question_hash(item["question"]),
+                        (grade, item.get("topic") or "general", item["question"], item["answer"]))
+    if not rows:
+        return 0
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        inserted = execute_values(cursor, """
+            INSERT INTO quizquestions (grade, topic, question, answer, question_hash)
+            VALUES %s
+            ON CONFLICT (grade, question_hash) DO NOTHING
+            RETURNING id
+            """, [row + (key,) for key, row in rows.items()], fetch=True)
+        connection.commit()
+        cursor.close()
+    return len(inserted)
+
+
+def sample_questions(user_id, grade, count=QUIZ_QUESTION_COUNT):
+    """Pick questions for a new quiz and record them as used, in one statement.
+
+    Returns (questions, needs_refill). Questions the student has not seen come
+    first, least used overall first; once those run out, the ones seen
+    longest ago are reused. Fewer than count come back only when the bank has
+    fewer, so the caller serves every one of them.
+    """
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("""
+            WITH picked AS MATERIALIZED (
+                SELECT q.id, q.question, q.answer, u.used_at IS NOT NULL AS seen,
+                       COUNT(*) OVER () AS bank_size
+                FROM quizquestions q
+                LEFT JOIN quizquestionusage u ON u.questionid = q.id AND u.userid = %(user_id)s
+                WHERE q.grade = %(grade)s
+                ORDER BY u.used_at NULLS FIRST, q.usage_count, random()
+                LIMIT %(count)s
+            ), used AS (
+                INSERT INTO quizquestionusage (userid, questionid)
+                SELECT %(user_id)s, id FROM picked
+                ON CONFLICT (userid, questionid) DO UPDATE SET used_at = CURRENT_TIMESTAMP
+            ), counted AS (
+                UPDATE quizquestions SET usage_count = usage_count + 1
+                WHERE id IN (SELECT id FROM picked)
+            )
+            SELECT question, answer, seen, bank_size FROM picked
+            """, {"user_id": user_id, "grade": grade, "count": count})
+        rows = cursor.fetchall()
+        connection.commit()
+        cursor.close()
+    questions = [{"question": question, "answer": answer} for question, answer, _, _ in rows]
+    bank_size = rows[0][3] if rows else 0
+    needs_refill = bank_size < QUESTION_BANK_LOW_WATERMARK or any(seen for _, _, seen, _ in rows)
+    return questions, needs_refill
+
+
+def record_usage(user_id, grade, questions):
+    """Record banked questions, matched by their text, as given to the student."""
+    hashes = list({question_hash(item["question"]) for item in questions})
+    if not hashes:
+        return
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("""
+            WITH served AS MATERIALIZED (
+                SELECT id FROM quizquestions WHERE grade = %(grade)s AND question_hash = ANY(%(hashes)s)
+            ), used AS (
+                INSERT INTO quizquestionusage (userid, questionid)
+                SELECT %(user_id)s, id FROM served
+                ON CONFLICT (userid, questionid) DO UPDATE SET used_at = CURRENT_TIMESTAMP
+            )
+            UPDATE quizquestions SET usage_count = usage_count + 1
+            WHERE id IN (SELECT id FROM served)
+            """, {"user_id": user_id, "grade": grade, "hashes": hashes})
+        connection.commit()
+        cursor.close()
+
+
+def add_generated_questions(user_id, grade, generated, served):
+    """Bank a generation made for a quiz, and record the questions the quiz used from it."""
+    add_questions(grade, generated)
+    record_usage(user_id, grade, served)
+
+
+def top_up(questions, generated, count=QUIZ_QUESTION_COUNT):
+    """The generated questions that fill questions up to count, skipping ones it already has."""
+    seen = {question_hash(item["question"]) for item in questions}
+    extra = []
+    for item in generated:
+        if len(questions) + len(extra) >= count:
+            break
+        key = question_hash(item["question"])
+        if key not in seen:
+            seen.add(key)
+            extra.append(item)
+    return extra
+
+
+def refill(grade, llm, redis_client):
+    lock_key = f"question_bank_refill:{grade}"
+    try:
+        if not redis_client.set(lock_key, "1", nx=True, ex=QUESTION_BANK_REFILL_LOCK_SECONDS):
+            return
+    except redis.RedisError as e:
+        logger.warning(f"Failed to take the question bank refill lock for grade {grade}: {e}")
+        return
+    try:
+        added = 0
+        for _ in range(QUESTION_BANK_REFILL_BATCHES):
+            added += add_questions(grade, generate_quiz_questions(grade, llm))
+        logger.info(f"Added {added} questions to the grade {grade} question bank")
+    except Exception as e:
+        logger.error(f"Question bank refill for grade {grade} failed: {e}")
+    finally:
+        try:
+            redis_client.delete(lock_key)
+        except redis.RedisError:
+            pass
+
+
+def refill_in_background(grade, llm, redis_client):
+    get_process_executor("question-bank", 1).submit(with_app_context(refill), grade, llm, redis_client)
@@ -1,33 +1,55 @@
 import uuid
 import datetime
-import json
 import logging
-from config.db_config import get_db_connection
+import redis
+from config.db_config import db_connection
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from config.json_schema import Feedback
+from background_tasks import submit_background
+from services.question_bank import (sample_questions, generate_quiz_questions, add_generated_questions, top_up,
+                                    refill_in_background, QUESTION_BANK_ENABLED, QUIZ_QUESTION_COUNT)
+from services.student_rollups import record_test
+from services.quiz_session import create_session, submit_answer, load_session, end_session, reopen_last_answer
+from services.grading import (grade_answers, grade_in_background, load_grades, clear_grades,
+                              QUIZ_INCREMENTAL_GRADING)
 
 logging.basicConfig(level=logging.INFO)
 
 def start_quiz(user_id, grade, llm, redis_client):
-    # Generate 10 questions based on the student's grade
-    questions = generate_quiz_questions(grade, llm)
+    # Questions come from the grade's question bank; generating them here is
+    # the fallback for a grade whose bank has fewer than a quiz needs.
+    questions = []
+    needs_refill = False
+    if QUESTION_BANK_ENABLED:
+        try:
+            questions, needs_refill = sample_questions(user_id, grade)
+        except Exception as e:
+            logging.error(f"Failed to sample questions from the question bank: {e}")
+    if len(questions) < QUIZ_QUESTION_COUNT:
+        # Every banked question sampled is served, and recorded as used by the
+        # sample; generated ones only fill the rest of the quiz.
+        try:
+            generated = generate_quiz_questions(grade, llm)
+        except Exception as e:
+            # A short quiz from the bank beats no quiz.
+            if not questions:
+                raise
+            logging.error(f"Failed to generate quiz questions, using {len(questions)} from the bank: {e}")
+            generated = []
+        extra = top_up(questions, generated)
+        if QUESTION_BANK_ENABLED and generated:
+            submit_background("add quiz questions", add_generated_questions, user_id, grade, generated, extra)
+        questions = questions + extra
+    if needs_refill:
+        refill_in_background(grade, llm, redis_client)
     if not questions:
         return "Sorry, I couldn't generate quiz questions at this time."
+    questions = [{'question': item['question'], 'answer': item['answer']} for item in questions]
     
     quiz_id = str(uuid.uuid4())
-    session_data = {
-        'quiz_id': quiz_id,
-        'questions': questions,
-        'current_question': 0,
-        'answers': [],
-        'grade': grade,
-        'start_time': str(datetime.datetime.now())
-    }
-
     try:
-        # Store session data in Redis with an expiration (e.g., 30 minutes)
-        redis_client.setex(user_id, 1800, json.dumps(session_data))
+        create_session(redis_client, user_id, quiz_id, grade, questions, str(datetime.datetime.now()))
         logging.info(f"Quiz session started for user {user_id} with quiz ID {quiz_id}")
     except Exception as e:
         logging.error(f"Failed to store quiz session in Redis: {e}")
@@ -35,88 +57,88 @@ def start_quiz(user_id, grade, llm, redis_client):
 
     return 'Question 1: ' + questions[0]['question']
 
-def generate_quiz_questions(grade, llm):
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful assistant that generates quiz questions."),
-        ("human", "Generate 10 quiz questions with answers for a student in grade {grade}. "
-                  "The questions should be appropriate for their difficulty level. "
-                  "Provide only the questions and the correct answers in a valid JSON format as a list of dictionaries. "
-                      "Do not include any other text or explanations or ``` code blocks. "
-                  "Each dictionary should have 'question' and 'answer' keys.")
-    ])
-    
-    chain = prompt | llm
-    res = chain.invoke({"grade": grade})
-    ai_response = res.content
-    print("AI Response:", ai_response)
-    
-    try:
-        questions = json.loads(ai_response)
-        if len(questions) != 10:
-            logging.error(f"Expected 10 questions, but received {len(questions)}")
-            return []
-        return questions
-    except json.JSONDecodeError:
-        logging.error("Failed to decode AI response for questions")
-        logging.error(f"AI Response: {ai_response}")
-        return []
-
 def handle_quiz_answer(user_id, answer, llm, redis_client):
+    """Record an answer to the quiz in progress and return the reply, or None if there is no quiz in progress.
+
+    Every chat message comes through here, so when Redis is unavailable the
+    message is treated as ordinary chat rather than failing for everyone.
+    """
     try:
-        session_data = redis_client.get(user_id)
-    except Exception as e:
-        logging.error(f"Failed to retrieve quiz session from Redis: {e}")
-        return "An error occurred while retrieving the quiz session."
+        result = submit_answer(redis_client, user_id, answer)
+    except redis.RedisError as e:
+        logging.error(f"Failed to check for a quiz in progress in Redis: {e}")
+        return None
+
+    if result.status == "missing":
+        return None
+    if result.status == "reopened":
+        return ("Sorry, grading your quiz was interrupted. Please answer the last question again.\n\n"
+                f"Question {result.index + 1}: {result.question['question']}")
+    if result.status == "complete" or (result.status == "duplicate" and result.next_question is None):
+        return "Your quiz is being graded, your results will be ready in a moment."
+    if result.next_question is not None:
+        if QUIZ_INCREMENTAL_GRADING and result.status == "answered":
+            answer_item = {
+                'question': result.question['question'],
+                'student_answer': answer,
+                'correct_answer': result.question['answer']
+            }
+            grade_in_background(redis_client, result.quiz_id, result.index, answer_item, llm)
+        return f"Question {result.index + 2}: {result.next_question['question']}"
+
+    # The last answer: only this request gets here, so the quiz is finished once.
+    try:
+        session = load_session(redis_client, user_id)
+        if session is None:
+            return "Your quiz session has expired or does not exist. Please start a new quiz."
 
-    if not session_data:
-        return "Your quiz session has expired or does not exist. Please start a new quiz."
-    
-    session = json.loads(session_data)
-    current_question_index = session['current_question']
-    current_question = session['questions'][current_question_index]
-    
-    session['answers'].append({
-        'question': current_question['question'],
-        'student_answer': answer,
-        'correct_answer': current_question['answer']
-    })
-    
-    session['current_question'] += 1
+        # Earlier answers were graded as they came in; only the rest are graded now.
+        grades = None
+        if QUIZ_INCREMENTAL_GRADING:
+            grades = load_grades(redis_client, session['quiz_id'], len(session['answers']))
+        score, total_questions, correct_answers, incorrect_answers, feedback = calculate_score_and_feedback(
+            session['answers'], llm, grades=grades)
 
-    if session['current_question'] >= len(session['questions']):
-        score, total_questions, correct_answers, incorrect_answers, feedback = calculate_score_and_feedback(session['answers'], llm)
-        
         store_test_scores(
-            user_id, 
-            session['quiz_id'], 
-            session['start_time'], 
-            score, 
-            total_questions, 
-            correct_answers, 
-            incorrect_answers, 
-            feedback['areas_well_done'], 
+            user_id,
+            session['quiz_id'],
+            session['start_time'],
+            score,
+            total_questions,
+            correct_answers,
+            incorrect_answers,
+            feedback['areas_well_done'],
             feedback['areas_to_improve']
         )
-        try:
-            redis_client.delete(user_id)
-        except Exception as e:
-            logging.error(f"Failed to delete quiz session from Redis: {e}")
+    except Exception as e:
+        logging.error(f"Failed to finish the quiz of user {user_id}: {e}")
+        return reopen_after_failure(user_id, result, redis_client)
+    try:
+        end_session(redis_client, user_id)
+    except Exception as e:
+        logging.error(f"Failed to delete quiz session from Redis: {e}")
+    if QUIZ_INCREMENTAL_GRADING:
+        clear_grades(redis_client, session['quiz_id'])
 
-        return (f"Quiz completed! Your score is {score}/{total_questions}.\n\n"
-                f"Areas well done:\n{feedback['areas_well_done']}\n\n"
-                f"Areas to improve:\n{feedback['areas_to_improve']}")
-    else:
-        try:
-            redis_client.set(user_id, json.dumps(session))
-        except Exception as e:
-            logging.error(f"Failed to update quiz session in Redis: {e}")
-            return "An error occurred while saving your quiz progress."
-        
-        next_question_index = session['current_question']
-        next_question = session['questions'][next_question_index]['question']
-        return f"Question {next_question_index + 1}: {next_question}"
+    return (f"Quiz completed! Your score is {score}/{total_questions}.\n\n"
+            f"Areas well done:\n{feedback['areas_well_done']}\n\n"
+            f"Areas to improve:\n{feedback['areas_to_improve']}")
 
-def calculate_score_and_feedback(answers, llm):
+def reopen_after_failure(user_id, result, redis_client):
+    """Let the student send the last answer again; end the quiz if even that fails."""
+    try:
+        if reopen_last_answer(redis_client, user_id):
+            return ("Sorry, something went wrong while grading your quiz. Please answer the last question again.\n\n"
+                    f"Question {result.index + 1}: {result.question['question']}")
+    except Exception as e:
+        logging.error(f"Failed to reopen the quiz of user {user_id}: {e}")
+    try:
+        end_session(redis_client, user_id)
+    except Exception as e:
+        logging.error(f"Failed to delete quiz session from Redis: {e}")
+    return "Sorry, something went wrong while grading your quiz. Please start a new quiz."
+
+def calculate_score_and_feedback(answers, llm, grading_mode=None, grades=None):
     score = 0
     total_questions = len(answers)
     correct_answers = 0
@@ -124,8 +146,8 @@ def calculate_score_and_feedback(answers, llm):
     correct_questions = []
     incorrect_questions = []
     
-    for item in answers:
-        correctness = evaluate_answer(item['question'], item['student_answer'], item['correct_answer'], llm)
+    grades = grade_answers(answers, llm, grading_mode, known=grades)
+    for item, correctness in zip(answers, grades):
         if correctness:
             score += 1
             correct_answers += 1
@@ -180,42 +202,26 @@ def get_summary_from_llm(correct_questions, incorrect_questions, llm):
             'areas_to_improve': "None"
         }
 
-def evaluate_answer(question, student_answer, correct_answer, llm):
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are an assistant that evaluates quiz answers."),
-        ("human", "Question: {question}\nStudent's Answer: {student_answer}\nCorrect Answer: {correct_answer}\nIs the student's answer correct? Reply with 'True' or 'False'.")
-    ])
-
-    chain = prompt | llm
-
-    res = chain.invoke({
-        "question": question,
-        "student_answer": student_answer,
-        "correct_answer": correct_answer
-    })
-
-    ai_response = res.content.strip().lower()
-    return ai_response == 'true'
-
 def store_test_scores(user_id, quiz_id, start_time, score, total_questions, correct_answers, incorrect_answers, areas_well_done, areas_to_improve):
-    connection = get_db_connection()
-    cursor = connection.cursor()
-
     insert_query = """
     INSERT INTO TestScores (UserID, TestDate, Score, TotalQuestions, CorrectAnswers, IncorrectAnswers, AreasWellDone, AreasToImprove)
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING TestID
     """
-    cursor.execute(insert_query, (
-        user_id,
-        start_time, 
-        score,
-        total_questions,
-        correct_answers,
-        incorrect_answers,
-        areas_well_done,
-        areas_to_improve
-    ))
-    connection.commit()
-    cursor.close()
-    connection.close()
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(insert_query, (
+            user_id,
+            start_time, 
+            score,
+            total_questions,
+            correct_answers,
+            incorrect_answers,
+            areas_well_done,
+            areas_to_improve
+        ))
+        test_id = cursor.fetchone()[0]
+        record_test(cursor, user_id, test_id, start_time, score, correct_answers, incorrect_answers)
+        connection.commit()
+        cursor.close()
     logging.info(f"Stored test score for user {user_id} in database.")
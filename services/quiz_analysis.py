@@ -1,26 +1,78 @@
 from flask import Blueprint, jsonify, request
-from config.db_config import get_db_connection
+from config.db_config import db_connection
 
 quiz_analysis_bp = Blueprint('quiz_analysis_bp', __name__)
 
+DASHBOARD_SECTIONS = (
+    'testscores',
+    'correct_incorrect_totals',
+    'performance_per_test',
+    'correct_incorrect_over_time',
+    'number_of_tests',
+    'scores_over_time',
+)
+
+def build_dashboard(userid, rows, sections):
+    """Every requested section from one pass over the user's tests, oldest first.
+
+    Each section has the same shape as the endpoint of the same name.
+    """
+    dashboard = {section: [] for section in sections if section not in ('correct_incorrect_totals', 'number_of_tests')}
+    correct_total = incorrect_total = 0
+    for testid, score, totalquestions, correctanswers, incorrectanswers, areaswelldone, areastoimprove, testdate in rows:
+        correct_total += correctanswers or 0
+        incorrect_total += incorrectanswers or 0
+        if 'testscores' in dashboard:
+            dashboard['testscores'].append({
+                'testid': testid,
+                'userid': userid,
+                'score': score,
+                'totalquestions': totalquestions,
+                'correctanswers': correctanswers,
+                'incorrectanswers': incorrectanswers,
+                'areaswelldone': areaswelldone,
+                'areastoimprove': areastoimprove,
+                'testdate': testdate
+            })
+        if 'performance_per_test' in dashboard:
+            dashboard['performance_per_test'].append({
+                'testid': testid,
+                'correctanswers': correctanswers,
+                'incorrectanswers': incorrectanswers
+            })
+        if 'correct_incorrect_over_time' in dashboard:
+            dashboard['correct_incorrect_over_time'].append({
+                'testdate': testdate,
+                'correctanswers': correctanswers,
+                'incorrectanswers': incorrectanswers
+            })
+        if 'scores_over_time' in dashboard:
+            dashboard['scores_over_time'].append({
+                'testdate': testdate,
+                'score': score
+            })
+    if 'correct_incorrect_totals' in sections:
+        dashboard['correct_incorrect_totals'] = {'correct': correct_total, 'incorrect': incorrect_total}
+    if 'number_of_tests' in sections:
+        dashboard['number_of_tests'] = {'number_of_tests': len(rows)}
+    return dashboard
+
 @quiz_analysis_bp.route('/users', methods=['GET'])
 def get_users():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT userid, first_name, last_name FROM users')
-    users = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT DISTINCT userid, first_name, last_name FROM users')
+        users = cursor.fetchall()
     user_list = [{'userid': row[0], 'name': f"{row[1] or ''}{' ' if row[1] and row[2] else ''}{row[2] or ''}"} for row in users]
     return jsonify(user_list)
 
 # API to get test scores for a specific user
 @quiz_analysis_bp.route('/users/<int:userid>/testscores', methods=['GET'])
 def get_user_testscores(userid):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM testscores WHERE userid = %s', (userid,))
-    testscores = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM testscores WHERE userid = %s', (userid,))
+        testscores = cursor.fetchall()
     testscores_list = []
     for row in testscores:
         testscores_list.append({
@@ -39,32 +91,30 @@ def get_user_testscores(userid):
 # API for Bar Chart: Number of Correct vs Incorrect Answers
 @quiz_analysis_bp.route('/users/<int:userid>/correct_incorrect_totals', methods=['GET'])
 def get_correct_incorrect_totals(userid):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT SUM(correctanswers), SUM(incorrectanswers)
-        FROM testscores
-        WHERE userid = %s
-    ''', (userid,))
-    result = cursor.fetchone()
-    conn.close()
-    correct_total = result[0] if result[0] else 0
-    incorrect_total = result[1] if result[1] else 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT correct_total, incorrect_total
+            FROM studentrollups
+            WHERE userid = %s
+        ''', (userid,))
+        result = cursor.fetchone()
+    # No rollup row means no tests yet.
+    correct_total, incorrect_total = result if result else (0, 0)
     return jsonify({'correct': correct_total, 'incorrect': incorrect_total})
 
 # API for Stacked Bar Chart: Performance per Test
 @quiz_analysis_bp.route('/users/<int:userid>/performance_per_test', methods=['GET'])
 def get_performance_per_test(userid):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT testid, correctanswers, incorrectanswers
-        FROM testscores
-        WHERE userid = %s
-        ORDER BY testdate ASC
-    ''', (userid,))
-    results = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT testid, correctanswers, incorrectanswers
+            FROM testscores
+            WHERE userid = %s
+            ORDER BY testdate ASC
+        ''', (userid,))
+        results = cursor.fetchall()
     performance_list = []
     for row in results:
         performance_list.append({
@@ -77,16 +127,15 @@ def get_performance_per_test(userid):
 # API for Time-Series Line Chart: Correct vs Incorrect Answers over time
 @quiz_analysis_bp.route('/users/<int:userid>/correct_incorrect_over_time', methods=['GET'])
 def get_correct_incorrect_over_time(userid):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT testdate, correctanswers, incorrectanswers
-        FROM testscores
-        WHERE userid = %s
-        ORDER BY testdate ASC
-    ''', (userid,))
-    results = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT testdate, correctanswers, incorrectanswers
+            FROM testscores
+            WHERE userid = %s
+            ORDER BY testdate ASC
+        ''', (userid,))
+        results = cursor.fetchall()
     data_list = []
     for row in results:
         data_list.append({
@@ -99,35 +148,80 @@ def get_correct_incorrect_over_time(userid):
 # API for Number of Tests Taken
 @quiz_analysis_bp.route('/users/<int:userid>/number_of_tests', methods=['GET'])
 def get_number_of_tests(userid):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT COUNT(*)
-        FROM testscores
-        WHERE userid = %s
-    ''', (userid,))
-    result = cursor.fetchone()
-    conn.close()
-    num_tests = result[0] if result[0] else 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT test_count
+            FROM studentrollups
+            WHERE userid = %s
+        ''', (userid,))
+        result = cursor.fetchone()
+    num_tests = result[0] if result else 0
     return jsonify({'number_of_tests': num_tests})
 
+# API for the summary cards: test count, totals, average/best/worst score, last test
+@quiz_analysis_bp.route('/users/<int:userid>/summary', methods=['GET'])
+def get_summary(userid):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT test_count, correct_total, incorrect_total, score_total, best_score, worst_score, last_test_date
+            FROM studentrollups
+            WHERE userid = %s
+        ''', (userid,))
+        result = cursor.fetchone()
+    if not result:
+        return jsonify({'number_of_tests': 0, 'correct': 0, 'incorrect': 0, 'average_score': None,
+                        'best_score': None, 'worst_score': None, 'last_test_date': None})
+    test_count, correct_total, incorrect_total, score_total, best_score, worst_score, last_test_date = result
+    return jsonify({
+        'number_of_tests': test_count,
+        'correct': correct_total,
+        'incorrect': incorrect_total,
+        'average_score': round(score_total / test_count, 2) if test_count else None,
+        'best_score': best_score,
+        'worst_score': worst_score,
+        'last_test_date': last_test_date
+    })
+
 # API for Line Graph: Score based on Date/Time
 @quiz_analysis_bp.route('/users/<int:userid>/scores_over_time', methods=['GET'])
 def get_scores_over_time(userid):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT testdate, score
-        FROM testscores
-        WHERE userid = %s
-        ORDER BY testdate ASC
-    ''', (userid,))
-    results = cursor.fetchall()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT testdate, score
+            FROM testscores
+            WHERE userid = %s
+            ORDER BY testdate ASC
+        ''', (userid,))
+        results = cursor.fetchall()
     data_list = []
     for row in results:
         data_list.append({
             'testdate': row[0],
             'score': row[1]
         })
-    return jsonify(data_list)
\ No newline at end of file
+    return jsonify(data_list)
+
+# API for the whole dashboard in one request: ?sections=scores_over_time,number_of_tests
+# selects a subset (default: all of DASHBOARD_SECTIONS).
+@quiz_analysis_bp.route('/users/<int:userid>/dashboard', methods=['GET'])
+def get_dashboard(userid):
+    requested = request.args.get('sections')
+    sections = [section.strip() for section in requested.split(',') if section.strip()] if requested else list(DASHBOARD_SECTIONS)
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        return jsonify({'error': f"Unknown sections: {', '.join(unknown)}"}), 400
+    # The free-text areas are only read when the full test list is wanted.
+    areas = 'areaswelldone, areastoimprove' if 'testscores' in sections else 'NULL, NULL'
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT testid, score, totalquestions, correctanswers, incorrectanswers, {areas}, testdate
+            FROM testscores
+            WHERE userid = %s
+            ORDER BY testdate ASC, testid ASC
+        ''', (userid,))
+        rows = cursor.fetchall()
+    return jsonify(build_dashboard(userid, rows, sections))
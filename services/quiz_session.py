@@ -0,0 +1,163 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+# A quiz in progress lives in three keys per user, all expiring together:
+#   quiz_session:{user_id}    hash: quiz_id, grade, start_time, current, last answer
+#   quiz_questions:{user_id}  list: one JSON {"question", "answer"} per question
+#   quiz_answers:{user_id}    list: the student's answers, in order
+# Questions are written once; each answer is one atomic script call.
+QUIZ_SESSION_TTL_SECONDS = int(os.getenv("QUIZ_SESSION_TTL_SECONDS", "1800"))
+# The same answer sent again this soon (a double click or a client retry) is
+# treated as a repeat of the previous request, not as the next answer. Keep it
+# short: a student may well give the same answer to two questions in a row.
+QUIZ_DUPLICATE_WINDOW_MS = int(os.getenv("QUIZ_DUPLICATE_WINDOW_MS", "1500"))
+# A quiz whose last answer arrived longer ago than this and is still not
+# finished was abandoned by the worker grading it (a crash or a restart); the
+# last answer is reopened so the student can send it again.
+QUIZ_FINISH_TIMEOUT_MS = int(os.getenv("QUIZ_FINISH_TIMEOUT_SECONDS", "120")) * 1000
+
+SubmitResult = namedtuple("SubmitResult", ["status", "quiz_id", "index", "question_count", "question", "next_question"])
+
+# Lua that takes back the last answer of a quiz whose finishing failed or was
+# abandoned, so the last question is open again. KEYS as below.
+REOPEN_LAST_ANSWER = """
+local count = redis.call('LLEN', KEYS[2])
+redis.call('RPOP', KEYS[3])
+redis.call('HSET', KEYS[1], 'current', count - 1)
+redis.call('HDEL', KEYS[1], 'last_answer', 'last_answer_ms', 'finished_ms')
+"""
+
+# KEYS: session, questions, answers. ARGV: answer, now in ms, duplicate window
+# in ms, finish timeout in ms. Returns {status, quiz_id, index of the answered
+# (or reopened) question, question count, that question's JSON, next question
+# JSON or nil}.
+SUBMIT_ANSWER_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'current')
+if not current then
+    return {'missing'}
+end
+current = tonumber(current)
+local count = redis.call('LLEN', KEYS[2])
+local last = redis.call('HMGET', KEYS[1], 'last_answer', 'last_answer_ms')
+if current > 0 and last[1] == ARGV[1] and last[2]
+        and tonumber(ARGV[2]) - tonumber(last[2]) < tonumber(ARGV[3]) then
+    return {'duplicate', redis.call('HGET', KEYS[1], 'quiz_id'), current - 1, count,
+            redis.call('LINDEX', KEYS[2], current - 1), redis.call('LINDEX', KEYS[2], current)}
+end
+if current >= count then
+    local finished = redis.call('HGET', KEYS[1], 'finished_ms')
+    if finished and tonumber(ARGV[2]) - tonumber(finished) > tonumber(ARGV[4]) then
+""" + REOPEN_LAST_ANSWER + """
+        return {'reopened', redis.call('HGET', KEYS[1], 'quiz_id'), count - 1, count,
+                redis.call('LINDEX', KEYS[2], count - 1)}
+    end
+    return {'complete'}
+end
+redis.call('RPUSH', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[1], 'current', current + 1, 'last_answer', ARGV[1], 'last_answer_ms', ARGV[2])
+if current + 1 == count then
+    redis.call('HSET', KEYS[1], 'finished_ms', ARGV[2])
+end
+-- The answers list is created by the first RPUSH; give it the session's expiry.
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[3], ttl)
+end
+return {'answered', redis.call('HGET', KEYS[1], 'quiz_id'), current, count,
+        redis.call('LINDEX', KEYS[2], current), redis.call('LINDEX', KEYS[2], current + 1)}
+"""
+
+# KEYS as above. Returns 1, or 0 when no quiz is waiting to be finished.
+REOPEN_SCRIPT = """
+if not redis.call('HGET', KEYS[1], 'finished_ms') then
+    return 0
+end
+""" + REOPEN_LAST_ANSWER + """
+return 1
+"""
+
+
+def session_keys(user_id):
+    return f"quiz_session:{user_id}", f"quiz_questions:{user_id}", f"quiz_answers:{user_id}"
+
+
+def create_session(redis_client, user_id, quiz_id, grade, questions, start_time):
+    """Replace any quiz in progress with a new one, in one transaction."""
+    session_key, questions_key, answers_key = session_keys(user_id)
+    pipeline = redis_client.pipeline()
+    pipeline.delete(session_key, questions_key, answers_key)
+    pipeline.hset(session_key, mapping={"quiz_id": quiz_id, "grade": grade, "start_time": start_time, "current": 0})
+    pipeline.rpush(questions_key, *[json.dumps(question) for question in questions])
+    pipeline.expire(session_key, QUIZ_SESSION_TTL_SECONDS)
+    pipeline.expire(questions_key, QUIZ_SESSION_TTL_SECONDS)
+    pipeline.execute()
+
+
+def has_session(redis_client, user_id):
+    return bool(redis_client.exists(session_keys(user_id)[0]))
+
+
+def decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def submit_answer(redis_client, user_id, answer):
+    """Record the answer to the current question; one round trip.
+
+    status is "missing" (no quiz in progress), "complete" (every question is
+    already answered and the quiz is being finished), "duplicate" (a repeat of
+    the previous answer; nothing recorded), "reopened" (finishing the quiz was
+    abandoned, so its last answer was taken back and question is to be asked
+    again; nothing recorded) or "answered". next_question is None once the
+    last question has been answered.
+    """
+    script = redis_client.register_script(SUBMIT_ANSWER_SCRIPT)
+    result = script(keys=session_keys(user_id),
+                    args=[answer, int(time.time() * 1000), QUIZ_DUPLICATE_WINDOW_MS, QUIZ_FINISH_TIMEOUT_MS])
+    status = decode(result[0])
+    if status in ("missing", "complete"):
+        return SubmitResult(status, None, None, None, None, None)
+    question = json.loads(result[4])
+    next_question = json.loads(result[5]) if len(result) > 5 and result[5] is not None else None
+    return SubmitResult(status, decode(result[1]), int(result[2]), int(result[3]), question, next_question)
+
+
+def reopen_last_answer(redis_client, user_id):
+    """Take back the last answer after finishing the quiz failed; False if there is no finished quiz to reopen."""
+    script = redis_client.register_script(REOPEN_SCRIPT)
+    return bool(script(keys=session_keys(user_id)))
+
+
+def load_session(redis_client, user_id):
+    """The whole session as the dict start_quiz used to store, or None."""
+    session_key, questions_key, answers_key = session_keys(user_id)
+    pipeline = redis_client.pipeline()
+    pipeline.hgetall(session_key)
+    pipeline.lrange(questions_key, 0, -1)
+    pipeline.lrange(answers_key, 0, -1)
+    fields, questions, answers = pipeline.execute()
+    if not fields:
+        return None
+    fields = {decode(key): decode(value) for key, value in fields.items()}
+    questions = [json.loads(question) for question in questions]
+    return {
+        "quiz_id": fields["quiz_id"],
+        "grade": fields["grade"],
+        "start_time": fields["start_time"],
+        "current_question": int(fields["current"]),
+        "questions": questions,
+        "answers": [
+            {
+                "question": question["question"],
+                "student_answer": decode(answer),
+                "correct_answer": question["answer"],
+            }
+            for question, answer in zip(questions, answers)
+        ],
+    }
+
+
+def end_session(redis_client, user_id):
+    redis_client.delete(*session_keys(user_id))
@@ -0,0 +1,104 @@
+import logging
+from config.db_config import db_connection
+
+logger = logging.getLogger(__name__)
+
+# One studentrollups row per student with tests (migrations 0010 and 0011):
+# test count, correct/incorrect/score totals, best and worst score and the
+# latest test date and id. It is updated in the same transaction as every TestScores insert, so
+# the analytics endpoints read it by primary key.
+REBUILD_BATCH_SIZE = 1000
+
+RECORD_TEST_QUERY = """
+    INSERT INTO studentrollups (UserID, test_count, correct_total, incorrect_total, score_total,
+                                best_score, worst_score, last_test_date, last_testid)
+    VALUES (%(user_id)s, 1, COALESCE(%(correct)s, 0), COALESCE(%(incorrect)s, 0), COALESCE(%(score)s, 0),
+            %(score)s, %(score)s, %(test_date)s, %(test_id)s)
+    ON CONFLICT (UserID) DO UPDATE SET
+        test_count = studentrollups.test_count + 1,
+        correct_total = studentrollups.correct_total + EXCLUDED.correct_total,
+        incorrect_total = studentrollups.incorrect_total + EXCLUDED.incorrect_total,
+        score_total = studentrollups.score_total + EXCLUDED.score_total,
+        best_score = GREATEST(studentrollups.best_score, EXCLUDED.best_score),
+        worst_score = LEAST(studentrollups.worst_score, EXCLUDED.worst_score),
+        last_test_date = GREATEST(studentrollups.last_test_date, EXCLUDED.last_test_date),
+        last_testid = GREATEST(studentrollups.last_testid, EXCLUDED.last_testid),
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+REBUILD_QUERY = """
+    WITH totals AS (
+        SELECT UserID, COUNT(*) AS test_count, COALESCE(SUM(CorrectAnswers), 0) AS correct_total,
+               COALESCE(SUM(IncorrectAnswers), 0) AS incorrect_total, COALESCE(SUM(Score), 0) AS score_total,
+               MAX(Score) AS best_score, MIN(Score) AS worst_score, MAX(TestDate) AS last_test_date,
+               MAX(TestID) AS last_testid
+        FROM TestScores
+        WHERE UserID = ANY(%(user_ids)s)
+        GROUP BY UserID
+    ), upserted AS (
+        INSERT INTO studentrollups (UserID, test_count, correct_total, incorrect_total, score_total,
+                                    best_score, worst_score, last_test_date, last_testid)
+        SELECT * FROM totals
+        ON CONFLICT (UserID) DO UPDATE SET
+            test_count = EXCLUDED.test_count,
+            correct_total = EXCLUDED.correct_total,
+            incorrect_total = EXCLUDED.incorrect_total,
+            score_total = EXCLUDED.score_total,
+            best_score = EXCLUDED.best_score,
+            worst_score = EXCLUDED.worst_score,
+            last_test_date = EXCLUDED.last_test_date,
+            last_testid = EXCLUDED.last_testid,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    DELETE FROM studentrollups
+    WHERE UserID = ANY(%(user_ids)s) AND UserID NOT IN (SELECT UserID FROM totals)
+"""
+
+
+def record_test(cursor, user_id, test_id, test_date, score, correct_answers, incorrect_answers):
+    """Add one test to the student's rollup; run it in the transaction that inserts the test."""
+    cursor.execute(RECORD_TEST_QUERY, {
+        "user_id": user_id,
+        "test_id": test_id,
+        "test_date": test_date,
+        "score": score,
+        "correct": correct_answers,
+        "incorrect": incorrect_answers,
+    })
+
+
+def rebuild_users(connection, user_ids):
+    with connection.cursor() as cursor:
+        # Blocks record_test until this transaction commits. Taken before the
+        # rebuild statement reads TestScores, so a test stored concurrently is
+        # either already visible to the rebuild or added on top of it afterwards.
+        cursor.execute("LOCK TABLE studentrollups IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(REBUILD_QUERY, {"user_ids": list(user_ids)})
+    connection.commit()
+
+
+def rebuild(user_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """Recompute rollups from TestScores, for the given students or for everyone.
+
+    Every student is rebuilt in batches of batch_size, one short transaction
+    each. Returns the number of students rebuilt.
+    """
+    if user_ids is not None:
+        with db_connection() as connection:
+            rebuild_users(connection, user_ids)
+        return len(user_ids)
+    rebuilt = 0
+    last_user_id = 0
+    with db_connection() as connection:
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT UserID FROM Users WHERE UserID > %s ORDER BY UserID LIMIT %s",
+                               (last_user_id, batch_size))
+                batch = [row[0] for row in cursor.fetchall()]
+            if not batch:
+                break
+            rebuild_users(connection, batch)
+            rebuilt += len(batch)
+            last_user_id = batch[-1]
+            logger.info(f"Rebuilt rollups for {rebuilt} students")
+    return rebuilt
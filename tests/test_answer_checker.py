@@ -0,0 +1,96 @@
+from fractions import Fraction
+import pytest
+from services.answer_checker import normalize, parse_number, decide, round_half_up
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("  The ANSWER is: Paris! ", "the answer is paris"),
+    ("Café", "cafe"),
+    ("don't know", "dont know"),
+    ("1,000", "1000"),
+    ("3.14.", "3.14"),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, value, unit", [
+    ("42", 42, ""),
+    ("-3/4", -0.75, ""),
+    ("1 1/2", 1.5, ""),
+    ("twenty one", 21, ""),
+    ("50%", 0.5, "%"),
+    ("$5", 5, "$"),
+    ("12 cm", 12, "cm"),
+    ("1k", 1, "k"),
+])
+def test_parse_number(text, value, unit):
+    parsed = parse_number(normalize(text))
+    assert parsed is not None
+    assert float(parsed[0]) == pytest.approx(value)
+    assert parsed[1] == unit
+
+
+@pytest.mark.parametrize("student, correct", [
+    ("Paris", "paris"),
+    ("it is Paris", "Paris"),
+    ("0.5", "1/2"),
+    ("seven", "7"),
+    ("0.5", "50%"),
+    ("50%", "0.5"),
+    ("0.33", "1/3"),
+    ("0.67", "2/3"),
+    ("-0.67", "-2/3"),
+    ("yes", "true"),
+    ("F", "false"),
+])
+def test_accepts_clear_matches(student, correct):
+    assert decide(student, correct) is True
+
+
+@pytest.mark.parametrize("student, correct", [
+    ("8", "7"),
+    ("40%", "50%"),
+    ("I don't know", "Paris"),
+    ("false", "true"),
+    ("yes", "no"),
+    ("2.6", "2.5"),
+    ("0.34", "1/3"),
+])
+def test_rejects_exact_disagreements(student, correct):
+    assert decide(student, correct) is False
+
+
+@pytest.mark.parametrize("student, correct", [
+    ("1k", "1000"),
+    ("50", "50%"),
+    ("5 cm", "50 mm"),
+    ("12", "12 cm"),
+    ("LED", "Light-emitting diode"),
+    ("GND", "Ground"),
+    ("H2O", "water"),
+    ("London", "Paris"),
+    ("photosynthesys", "photosynthesis"),
+    ("yes", "right"),
+    ("correct", "true"),
+    ("not Paris", "Paris"),
+    ("a dozen", "12"),
+    ("2.54", "2.5"),
+    ("0.54", "0.5"),
+    ("1.4", "1.35"),
+    ("3.14159", "3.14"),
+])
+def test_escalates_unclear_answers(student, correct):
+    assert decide(student, correct) is None
+
+
+@pytest.mark.parametrize("value, decimals, expected", [
+    ("2.5", 0, "3"),
+    ("3.5", 0, "4"),
+    ("1.35", 1, "1.4"),
+    ("1.25", 1, "1.3"),
+    ("-1.25", 1, "-1.3"),
+    ("1/3", 2, "0.33"),
+])
+def test_round_half_up(value, decimals, expected):
+    assert round_half_up(Fraction(value), decimals) == Fraction(expected)
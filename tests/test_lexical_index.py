@@ -0,0 +1,122 @@
+import math
+import pytest
+from lexical_index import BM25Index, tokenize
+
+CHUNKS = [
+    {"content": "Ohm's law relates voltage, current and resistance.", "source": "ohm.pdf"},
+    {"content": "A resistor limits current. Resistor colour bands give the resistance.", "source": "resistors.pdf"},
+    {"content": "An LED is a diode that emits light when current flows.", "source": "led.pdf"},
+    {"content": "Capacitors store charge.", "source": "capacitors.pdf"},
+]
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(CHUNKS)
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("What is the V in Ohm's law?") == ["ohm", "law"]
+
+
+def test_build_postings(index):
+    assert index.postings["resistor"] == [(1, 2)]
+    assert sorted(position for position, _ in index.postings["current"]) == [0, 1, 2]
+    assert index.doc_lengths == [len(tokenize(chunk["content"])) for chunk in CHUNKS]
+
+
+def test_rare_terms_weigh_more(index):
+    assert index.idf["capacitors"] > index.idf["current"] > 0
+
+
+def test_search_ranks_best_match_first(index):
+    results = index.search("resistor resistance", k=10)
+    assert [position for position, _, _ in results][:2] == [1, 0]
+    scores = [score for _, score, _ in results]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0 < normalized <= 1 for _, _, normalized in results)
+
+
+def test_search_score_matches_formula(index):
+    (position, score, normalized), = index.search("capacitors")
+    assert position == 3
+    length_norm = 1 - index.b + index.b * index.doc_lengths[3] / index.avg_doc_length
+    expected = index.idf["capacitors"] * (index.k1 + 1) / (1 + index.k1 * length_norm)
+    assert math.isclose(score, expected)
+    assert math.isclose(normalized, expected / (index.idf["capacitors"] * (index.k1 + 1)))
+
+
+def test_search_limits_and_unknown_terms(index):
+    assert len(index.search("current", k=2)) == 2
+    assert index.search("photosynthesis") == []
+    assert index.search("the and of") == []
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    path = tmp_path / "index.json"
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("led diode light") == index.search("led diode light")
+
+
+@pytest.fixture
+def retrieval():
+    pytest.importorskip("numpy")
+    import retrieval
+    return retrieval
+
+
+def match(retrieval, content, distance=None, lexical_score=None):
+    return retrieval.Match(content, content + ".pdf", distance, lexical_score)
+
+
+def test_reciprocal_rank_fusion_merges_both_scores(retrieval):
+    vector = [match(retrieval, "a", distance=0.1), match(retrieval, "b", distance=0.2)]
+    lexical = [match(retrieval, "b", lexical_score=0.9), match(retrieval, "c", lexical_score=0.5)]
+    fused = retrieval.reciprocal_rank_fusion(vector, lexical)
+    # "b" is in both rankings, so it beats "a", first in only one.
+    assert [item.content for item in fused] == ["b", "a", "c"]
+    assert fused[0].distance == 0.2 and fused[0].lexical_score == 0.9
+    assert fused[1].lexical_score is None and fused[2].distance is None
+
+
+def test_reciprocal_rank_fusion_ties_keep_vector_first(retrieval):
+    fused = retrieval.reciprocal_rank_fusion([match(retrieval, "a", distance=0.1)],
+                                             [match(retrieval, "b", lexical_score=0.9)])
+    assert [item.content for item in fused] == ["a", "b"]
+
+
+class FakeVectorRetriever:
+    def __init__(self, matches):
+        self.matches = matches
+        self.calls = 0
+
+    def search(self, question, k=1, embedding=None):
+        self.calls += 1
+        return self.matches[:k]
+
+
+def test_hybrid_search_fuses_rankings(retrieval, index):
+    vector = FakeVectorRetriever([match(retrieval, CHUNKS[2]["content"], distance=0.3),
+                                  match(retrieval, CHUNKS[1]["content"], distance=0.4)])
+    results = retrieval.HybridRetriever(vector, index).search("current", k=2)
+    assert vector.calls == 1
+    assert CHUNKS[2]["content"] in [item.content for item in results]
+
+
+def test_hybrid_search_skips_embedding_on_a_clear_lexical_winner(retrieval, index, monkeypatch):
+    # A term seen once in a short chunk scores about 0.5 of the maximum.
+    monkeypatch.setattr(retrieval, "LEXICAL_FAST_PATH_SCORE", 0.5)
+    vector = FakeVectorRetriever([])
+    results = retrieval.HybridRetriever(vector, index).search("capacitors store charge")
+    assert vector.calls == 0
+    assert [item.content for item in results] == [CHUNKS[3]["content"]]
+
+
+def test_lexical_fast_path_needs_a_margin(retrieval):
+    strong = match(retrieval, "a", lexical_score=0.8)
+    assert retrieval.is_lexical_fast_path([strong])
+    assert retrieval.is_lexical_fast_path([strong, match(retrieval, "b", lexical_score=0.5)])
+    assert not retrieval.is_lexical_fast_path([strong, match(retrieval, "b", lexical_score=0.6)])
+    assert not retrieval.is_lexical_fast_path([match(retrieval, "a", lexical_score=0.3)])
+    assert not retrieval.is_lexical_fast_path([])
@@ -0,0 +1,108 @@
+import pytest
+from moderation import AhoCorasick, ModerationFilter, MODERATION_TERMS_PATH, normalize, parse_terms
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick(["he", "she", "his", "hers"])
+    assert list(matcher.find("ushers")) == [(3, "she"), (3, "he"), (5, "hers")]
+
+
+def test_aho_corasick_follows_failure_links():
+    matcher = AhoCorasick(["abcd", "bc", "c"])
+    assert list(matcher.find("abcx")) == [(2, "bc"), (2, "c")]
+    assert list(matcher.find("xyz")) == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Hello   WORLD", "hello world"),
+    ("Crème brûlée", "creme brulee"),
+    ("s3x", "sex"),
+    ("53x", "x"),
+    ("kill!", "kill"),
+    ("s e x", "sex"),
+    ("s.e.x", "sex"),
+    ("baaaad", "baad"),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+def test_normalize_squeeze():
+    assert normalize("baaaad", squeeze=True) == "bad"
+
+
+TERMS = parse_terms([
+    "# comment",
+    "",
+    "profanity: ass",
+    "violence: kill*",
+    "violence: blow up the school",
+    "self_harm: end my life  # trailing comment",
+])
+
+
+@pytest.fixture
+def moderation_filter():
+    return ModerationFilter(TERMS)
+
+
+@pytest.mark.parametrize("message, term, category", [
+    ("you are an ass", "ass", "profanity"),
+    ("ASS!", "ass", "profanity"),
+    ("@ss", "ass", "profanity"),
+    ("a s s", "ass", "profanity"),
+    ("asssss", "ass", "profanity"),
+    ("I will kill you", "kill*", "violence"),
+    ("he killed it", "kill*", "violence"),
+    ("k!ll", "kill*", "violence"),
+    ("let's blow   up the school", "blow up the school", "violence"),
+    ("I want to end my life", "end my life", "self_harm"),
+])
+def test_check_matches(moderation_filter, message, term, category):
+    match = moderation_filter.check(message)
+    assert match is not None
+    assert (match.term, match.category) == (term, category)
+
+
+@pytest.mark.parametrize("message", [
+    "my class starts at nine",
+    "a bass guitar",
+    "passing grade",
+    "skill tree",
+    "blow up the balloon",
+    "end my lifelong habit",
+    "",
+])
+def test_check_respects_word_boundaries(moderation_filter, message):
+    assert moderation_filter.check(message) is None
+
+
+def test_parse_terms_rejects_malformed_lines():
+    with pytest.raises(ValueError, match="Line 2"):
+        parse_terms(["profanity: ass", "no separator"])
+
+
+@pytest.mark.parametrize("message", [
+    "Why does my circuit get high resistance",
+    "How do I get high scores on the quiz?",
+    "How do I make the LED get high brightness",
+    "Can I hurt myself with a 9V battery?",
+    "I cut myself on a wire, what do I do?",
+    "I keep cutting myself on the stripped wires",
+    "I want to die laughing lol",
+    "what is meth...od",
+    "What is the method for finding resistance?",
+    "Is methane a fuel?",
+])
+def test_shipped_terms_allow_lab_questions(message):
+    assert ModerationFilter.load(MODERATION_TERMS_PATH).check(message) is None
+
+
+@pytest.mark.parametrize("message, category", [
+    ("I want to kill myself", "self_harm"),
+    ("how do I make a bomb", "violence"),
+    ("where can I buy weed", "drugs"),
+])
+def test_shipped_terms_catch_clear_cut_messages(message, category):
+    match = ModerationFilter.load(MODERATION_TERMS_PATH).check(message)
+    assert match is not None and match.category == category
@@ -0,0 +1,96 @@
+import base64
+import json
+from datetime import datetime
+import pytest
+from pagination import parse_limit, parse_seq_cursor, encode_cursor, decode_cursor, decode_time_cursor
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 10),
+    ("", 10),
+    ("5", 5),
+    ("500", 50),
+])
+def test_parse_limit(value, expected):
+    assert parse_limit(value, 10, 50) == expected
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "ten"])
+def test_parse_limit_rejects(value):
+    with pytest.raises(ValueError):
+        parse_limit(value, 10, 50)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("0", 0),
+    ("120", 120),
+])
+def test_parse_seq_cursor(value, expected):
+    assert parse_seq_cursor(value) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "1.5", "-1", "12abc"])
+def test_parse_seq_cursor_rejects(value):
+    with pytest.raises(ValueError, match="before"):
+        parse_seq_cursor(value)
+
+
+@pytest.mark.parametrize("values", [
+    ("2024-05-01T12:30:00.123456", 42),
+    ("ünïcode ✓", None, 1.5),
+    (),
+])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(*values)
+    assert cursor.isascii()
+    assert "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor, len(values)) == list(values)
+
+
+def test_encode_cursor_stringifies_other_types():
+    moment = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(moment, 1), 2) == [str(moment), 1]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "é",
+    raw_cursor("not json"),
+    raw_cursor('{"a": 1}'),
+    raw_cursor("[1]"),
+    raw_cursor("[1, 2, 3]"),
+    raw_cursor('"12"'),
+    None,
+    42,
+    ["2024-05-01", 1],
+    b"WzEsMl0=",
+])
+def test_decode_cursor_rejects_invalid(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, 2)
+
+
+def test_decode_time_cursor():
+    cursor = encode_cursor(datetime(2024, 5, 1, 12, 30).isoformat(), 42)
+    assert decode_time_cursor(cursor) == (datetime(2024, 5, 1, 12, 30), 42)
+    assert decode_time_cursor(encode_cursor("2024-05-01", "7")) == (datetime(2024, 5, 1), 7)
+
+
+@pytest.mark.parametrize("values", [
+    (1, 2),
+    ("yesterday", 1),
+    ("2024-05-01", "seven"),
+    ("2024-05-01", None),
+    ("2024-05-01", [1]),
+    ("2024-05-01", True),
+    (None, 1),
+])
+def test_decode_time_cursor_rejects_invalid(values):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_time_cursor(raw_cursor(json.dumps(list(values))))
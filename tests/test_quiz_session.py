@@ -0,0 +1,98 @@
+import pytest
+from services import quiz_session
+from services.quiz_session import create_session, submit_answer, reopen_last_answer, load_session, end_session
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+QUESTIONS = [{"question": f"What is {n} + {n}?", "answer": str(2 * n)} for n in range(1, 4)]
+
+
+@pytest.fixture
+def redis_client():
+    client = fakeredis.FakeStrictRedis()
+    create_session(client, 7, "quiz-1", "5", QUESTIONS, "2026-01-01 10:00:00")
+    return client
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(quiz_session.time, "time", lambda: now[0])
+    return now
+
+
+def test_answers_advance_through_the_questions(redis_client, clock):
+    first = submit_answer(redis_client, 7, "2")
+    assert (first.status, first.quiz_id, first.index, first.question_count) == ("answered", "quiz-1", 0, 3)
+    assert first.question == QUESTIONS[0]
+    assert first.next_question == QUESTIONS[1]
+    clock[0] += 10
+    second = submit_answer(redis_client, 7, "4")
+    assert (second.status, second.index, second.next_question) == ("answered", 1, QUESTIONS[2])
+
+
+def test_missing_session(clock):
+    assert submit_answer(fakeredis.FakeStrictRedis(), 7, "2").status == "missing"
+
+
+def test_repeat_within_window_is_a_duplicate(redis_client, clock):
+    submit_answer(redis_client, 7, "2")
+    clock[0] += quiz_session.QUIZ_DUPLICATE_WINDOW_MS / 2000
+    repeat = submit_answer(redis_client, 7, "2")
+    assert (repeat.status, repeat.index, repeat.next_question) == ("duplicate", 0, QUESTIONS[1])
+    assert [item["student_answer"] for item in load_session(redis_client, 7)["answers"]] == ["2"]
+
+
+def test_same_answer_after_window_is_the_next_answer(redis_client, clock):
+    submit_answer(redis_client, 7, "2")
+    clock[0] += quiz_session.QUIZ_DUPLICATE_WINDOW_MS / 1000 + 1
+    assert submit_answer(redis_client, 7, "2").status == "answered"
+    assert load_session(redis_client, 7)["current_question"] == 2
+
+
+def answer_all(redis_client, clock):
+    for index in range(len(QUESTIONS)):
+        result = submit_answer(redis_client, 7, f"answer {index}")
+        clock[0] += 10
+    return result
+
+
+def test_last_answer_then_complete(redis_client, clock):
+    last = answer_all(redis_client, clock)
+    assert (last.status, last.index, last.next_question) == ("answered", 2, None)
+    assert submit_answer(redis_client, 7, "hello").status == "complete"
+    assert len(load_session(redis_client, 7)["answers"]) == 3
+
+
+def test_duplicate_of_last_answer_has_no_next_question(redis_client, clock):
+    answer_all(redis_client, clock)
+    clock[0] -= 10
+    repeat = submit_answer(redis_client, 7, "answer 2")
+    assert (repeat.status, repeat.next_question) == ("duplicate", None)
+
+
+def test_abandoned_finish_is_reopened(redis_client, clock):
+    answer_all(redis_client, clock)
+    clock[0] += quiz_session.QUIZ_FINISH_TIMEOUT_MS / 1000 + 1
+    reopened = submit_answer(redis_client, 7, "hello")
+    assert (reopened.status, reopened.index, reopened.question) == ("reopened", 2, QUESTIONS[2])
+    session = load_session(redis_client, 7)
+    assert session["current_question"] == 2
+    assert len(session["answers"]) == 2
+    again = submit_answer(redis_client, 7, "6")
+    assert (again.status, again.index, again.next_question) == ("answered", 2, None)
+
+
+def test_reopen_last_answer_after_failed_finish(redis_client, clock):
+    assert reopen_last_answer(redis_client, 7) is False
+    answer_all(redis_client, clock)
+    assert reopen_last_answer(redis_client, 7) is True
+    assert load_session(redis_client, 7)["current_question"] == 2
+    assert submit_answer(redis_client, 7, "6").status == "answered"
+
+
+def test_end_session_removes_every_key(redis_client, clock):
+    submit_answer(redis_client, 7, "2")
+    end_session(redis_client, 7)
+    assert redis_client.keys("*") == []
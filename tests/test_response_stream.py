@@ -0,0 +1,75 @@
+import json
+import pytest
+from response_stream import ResponseFieldStream, format_sse
+
+
+def stream(chunks):
+    parser = ResponseFieldStream()
+    return "".join(parser.feed(chunk) for chunk in chunks), parser.done
+
+
+RESPONSES = [
+    "Ohm's law: V = I * R.",
+    'She said "hi"\\ back\nthen left\t.',
+    "Path: a/b, bell\b, form\f, return\r.",
+    "Café ☕ and a rocket 🚀!",
+    "",
+]
+
+
+def reply(response, prefix='{"is_unsafe_for_k_12_children": false, ', ensure_ascii=True):
+    return prefix + '"response": ' + json.dumps(response, ensure_ascii=ensure_ascii) + "}"
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("response", RESPONSES)
+def test_every_split_point(response, ensure_ascii):
+    raw = reply(response, ensure_ascii=ensure_ascii)
+    for split in range(len(raw) + 1):
+        assert stream([raw[:split], raw[split:]]) == (response, True)
+
+
+@pytest.mark.parametrize("response", RESPONSES)
+def test_one_character_at_a_time(response):
+    raw = reply(response)
+    assert stream(list(raw)) == (response, True)
+
+
+def test_code_fence_and_spacing_before_the_key():
+    raw = '```json\n{"is_unsafe_for_k_12_children": true,\n  "response"  :  "No."}\n```'
+    assert stream([raw[:12], raw[12:30], raw[30:]]) == ("No.", True)
+
+
+def test_escape_is_held_back_until_complete():
+    parser = ResponseFieldStream()
+    assert parser.feed('{"response": "a\\') == "a"
+    assert parser.feed("u00") == ""
+    assert parser.feed("e9b") == "éb"
+
+
+def test_surrogate_pair_is_not_split():
+    parser = ResponseFieldStream()
+    assert parser.feed('{"response": "\\ud83d') == ""
+    assert parser.feed("\\ude80") == "🚀"
+
+
+def test_lone_high_surrogate_does_not_stall():
+    assert stream(['{"response": "a\\ud83d', '"}']) == ("a\ufffd", True)
+    assert stream(['{"response": "a\\ud83d', "\\n", 'b"}']) == ("a\ufffd\nb", True)
+
+
+def test_nothing_after_the_closing_quote():
+    parser = ResponseFieldStream()
+    assert parser.feed('{"response": "done", "extra": "ignored"') == "done"
+    assert parser.done
+    assert parser.feed('"more"}') == ""
+
+
+def test_no_response_key_yet():
+    parser = ResponseFieldStream()
+    assert parser.feed('{"is_unsafe_for_k_12_children": false, "resp') == ""
+    assert not parser.done
+
+
+def test_format_sse():
+    assert format_sse("token", {"text": "a\nb"}) == 'event: token\ndata: {"text": "a\\nb"}\n\n'